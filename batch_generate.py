@@ -0,0 +1,151 @@
+"""
+离线批量生成：不连接 Minecraft 服务器，把一批指令交给大模型生成代码，
+逐条做安全检查和静态方块量估算，结果写成 JSONL，通过检查的代码同时写入指令缓存。
+
+用途：
+- 夜间预热常用建筑的缓存，玩家第一次输入时也能直接命中
+- 用同一批指令对比不同服务商 / 模型的耗时、token 用量和通过率
+
+用法（在项目根目录）：
+    python batch_generate.py instructions.txt
+    python batch_generate.py instructions.txt -o results.jsonl -j 8 --refresh --model qwen-plus
+
+指令文件每行一条，空行和以 # 开头的行会被忽略。
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from core.config_loader import CONFIG
+
+
+def read_instructions(path: Path) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def evaluate(instruction: str, refresh: bool, include_code: bool) -> dict:
+    """生成一条指令的代码并检查，返回一行结果"""
+    from core.code_generator import generate_minecraft_code, plan_mode
+    from core.code_safety import CodeSafetyChecker
+    from core.geometry import PlanError, parse_plan, plan_to_ops
+    from core.token_budget import token_ledger
+
+    token_ledger.take_last()
+    started = time.perf_counter()
+    try:
+        code = generate_minecraft_code(instruction, use_cache=not refresh)
+        error = None
+    except Exception as e:
+        code, error = "", f"{type(e).__name__}: {e}"
+    latency = time.perf_counter() - started
+    usage = token_ledger.take_last()
+
+    result = {
+        "instruction": instruction,
+        "ok": False,
+        "reason": error or ("未生成有效代码" if not code else ""),
+        # 没有发出请求却拿到了代码：命中了指令缓存，或与进行中的相同请求共享了结果
+        "cache_hit": bool(code) and usage is None,
+        "latency": round(latency, 3),
+        "prompt_tokens": usage["prompt"] if usage else 0,
+        "cached_tokens": usage["cached"] if usage else 0,
+        "completion_tokens": usage["completion"] if usage else 0,
+        "blocks": None,
+        "calls": None,
+        "unbounded": [],
+    }
+    if not code:
+        return result
+
+    if plan_mode():
+        try:
+            ops = plan_to_ops(parse_plan(code), (0, 0, 0))
+            result.update(ok=True, reason="安全", blocks=ops.volume(), calls=len(ops))
+        except PlanError as e:
+            result["reason"] = f"建造计划无效: {e}"
+    else:
+        is_safe, reason = CodeSafetyChecker.is_safe(code)
+        result.update(ok=is_safe, reason=reason)
+        try:
+            cost = CodeSafetyChecker.estimate_cost(code)
+            result.update(blocks=cost.blocks, calls=cost.calls, unbounded=cost.unbounded)
+        except (SyntaxError, RecursionError):
+            pass
+
+    if include_code:
+        result["code"] = code
+    return result
+
+
+def summarize(results: list) -> dict:
+    latencies = [r["latency"] for r in results if not r["cache_hit"]]
+    return {
+        "total": len(results),
+        "passed": sum(r["ok"] for r in results),
+        "cache_hits": sum(r["cache_hit"] for r in results),
+        "latency_p50": float(np.percentile(latencies, 50)) if latencies else None,
+        "latency_p99": float(np.percentile(latencies, 99)) if latencies else None,
+        "prompt_tokens": sum(r["prompt_tokens"] for r in results),
+        "cached_tokens": sum(r["cached_tokens"] for r in results),
+        "completion_tokens": sum(r["completion_tokens"] for r in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gpt-mc-builder 离线批量生成")
+    parser.add_argument("input", type=Path, help="指令文件，每行一条")
+    parser.add_argument("-o", "--output", type=Path, help="结果 JSONL 路径（默认 batch-<时间>.jsonl）")
+    parser.add_argument("-j", "--concurrency", type=int, default=CONFIG['system']['generation_workers'],
+                        help="同时进行的大模型请求数")
+    parser.add_argument("--refresh", action="store_true", help="忽略已有缓存，全部重新生成（结果仍写入缓存）")
+    parser.add_argument("--provider", help="临时覆盖 ai.provider")
+    parser.add_argument("--model", help="临时覆盖 ai.model")
+    parser.add_argument("--plan", action="store_true", help="使用 JSON 建造计划输出模式")
+    parser.add_argument("--include-code", action="store_true", help="结果中附带生成的代码")
+    args = parser.parse_args()
+
+    # 在导入 core.code_generator（创建 AIClient）之前改写配置
+    if args.provider:
+        CONFIG['ai']['provider'] = args.provider
+    if args.model:
+        CONFIG['ai']['model'] = args.model
+    if args.plan:
+        CONFIG['prompt']['output_mode'] = "plan"
+    CONFIG['ai']['stream'] = False
+
+    instructions = read_instructions(args.input)
+    if not instructions:
+        print("⚠️ 指令文件为空。")
+        sys.exit(1)
+    output = args.output or Path(f"batch-{datetime.now():%Y%m%d-%H%M%S}.jsonl")
+    print(f"🚀 共 {len(instructions)} 条指令，并发 {args.concurrency}，模型 {CONFIG['ai']['model']}")
+
+    results = []
+    with open(output, "w", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = {pool.submit(evaluate, text, args.refresh, args.include_code): i
+                   for i, text in enumerate(instructions)}
+        for future in as_completed(futures):
+            result = {"index": futures[future], "provider": CONFIG['ai']['provider'],
+                      "model": CONFIG['ai']['model'], "output_mode": CONFIG['prompt']['output_mode'],
+                      **future.result()}
+            results.append(result)
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            mark = "✅" if result["ok"] else "❌"
+            print(f"{mark} [{len(results)}/{len(instructions)}] {result['instruction']} "
+                  f"({result['latency']:.2f}s) {'' if result['ok'] else result['reason']}")
+
+    print(json.dumps(summarize(results), ensure_ascii=False, indent=2))
+    print(f"💾 结果已保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
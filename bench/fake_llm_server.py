@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+# 默认回复：7×5×7 小屋，与提示词里的模板结构一致
+CABIN_CODE = """cx = pos.x + 3
+cy = pos.y
+cz = pos.z
+width = 7
+height = 5
+depth = 7
+mc.setBlocks(cx - 3, cy - 1, cz - 3, cx + 3, cy - 1, cz + 3, 4)
+mc.setBlocks(cx - 3, cy, cz - 3, cx + 3, cy + height - 1, cz + 3, 17)
+mc.setBlocks(cx - 2, cy, cz - 2, cx + 2, cy + height - 1, cz + 2, 0)
+for i in range(-4, 5):
+    mc.setBlocks(cx - 4 + abs(i), cy + height + abs(i) // 2, cz + i, cx + 4 - abs(i), cy + height + abs(i) // 2, cz + i, 45)
+mc.setBlocks(cx, cy, cz - 3, cx, cy + 1, cz - 3, 0)
+mc.setBlock(cx - 3, cy + 2, cz, 20)
+mc.setBlock(cx + 3, cy + 2, cz, 20)
+"""
+
+PLATFORM_CODE = """for i in range(-2, 3):
+    for j in range(-2, 3):
+        mc.setBlock(pos.x + i, pos.y - 1, pos.z + j, 1)
+"""
+
+TOWER_CODE = """cx = pos.x + 5
+cy = pos.y
+cz = pos.z
+for y in range(12):
+    for i in range(-3, 4):
+        for j in range(-3, 4):
+            if i * i + j * j <= 9 and i * i + j * j >= 4:
+                mc.setBlock(cx + i, cy + y, cz + j, 1)
+"""
+
+# 建造计划模式下的回复（与上面的代码结构相近）
+CABIN_PLAN = """{"shapes": [
+  {"type": "box", "from": [0, -1, -3], "to": [6, -1, 3], "block": 4},
+  {"type": "hollow_box", "from": [0, 0, -3], "to": [6, 4, 3], "block": 17, "open_top": true},
+  {"type": "pyramid_roof", "from": [-1, 5, -4], "to": [7, 5, 4], "block": 45},
+  {"type": "opening", "from": [3, 0, -3], "to": [3, 1, -3]},
+  {"type": "box", "from": [0, 2, 0], "to": [0, 2, 0], "block": 20},
+  {"type": "box", "from": [6, 2, 0], "to": [6, 2, 0], "block": 20}
+]}
+"""
+
+PLATFORM_PLAN = """{"shapes": [{"type": "box", "from": [-2, -1, -2], "to": [2, -1, 2], "block": 1}]}
+"""
+
+TOWER_PLAN = """{"shapes": [{"type": "cylinder", "center": [5, 0, 0], "radius": 3, "height": 12, "block": 1, "hollow": true}]}
+"""
+
+DEFAULT_RESPONSES = {
+    "平台": PLATFORM_CODE,
+    "塔": TOWER_CODE,
+    "小屋": CABIN_CODE,
+}
+
+DEFAULT_PLAN_RESPONSES = {
+    "平台": PLATFORM_PLAN,
+    "塔": TOWER_PLAN,
+    "小屋": CABIN_PLAN,
+}
+
+
+class FakeLLMServer:
+    """
+    OpenAI 兼容的 /chat/completions 替身：
+    - 按提示词中出现的关键字返回预置代码（包在 ```python 代码块里），没有匹配时返回小屋；
+      系统提示词要求输出建造计划（含 "shapes"）时改为返回 ```json 计划
+    - latency 秒后才返回；流式请求按 chunk_chars 切片、平均分摊延迟，模拟逐 token 输出
+    - 统计请求次数和收到的提示词字符数
+    - usage 模拟服务商的前缀缓存：同样的 system 消息第二次出现时计入 cached_tokens
+    """
+
+    def __init__(self, latency: float = 0.5, responses: Dict[str, str] = None,
+                 chunk_chars: int = 16, host: str = "127.0.0.1", port: int = 0,
+                 plan_responses: Dict[str, str] = None):
+        self.latency = latency
+        self.responses = responses or DEFAULT_RESPONSES
+        self.plan_responses = plan_responses or DEFAULT_PLAN_RESPONSES
+        self.chunk_chars = chunk_chars
+        self.calls = 0
+        self.prompt_chars = 0
+        self.requests: List[dict] = []
+        self._seen_prefixes = set()
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                usage = server._record(body)
+                text = server.reply_for(body)
+                usage["completion_tokens"] = len(text) // 3
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                if body.get("stream"):
+                    self._stream(text, usage)
+                else:
+                    self._complete(text, usage)
+
+            def _complete(self, text: str, usage: dict):
+                time.sleep(server.latency)
+                payload = json.dumps({
+                    "choices": [{"message": {"role": "assistant", "content": text}}],
+                    "usage": usage,
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, text: str, usage: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                pieces = [text[i:i + server.chunk_chars] for i in range(0, len(text), server.chunk_chars)]
+                delay = server.latency / max(1, len(pieces))
+                for piece in pieces:
+                    time.sleep(delay)
+                    self._chunk(f"data: {json.dumps({'choices': [{'delta': {'content': piece}}]})}\n\n")
+                self._chunk(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n")
+                self._chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, text: str):
+                data = text.encode("utf-8")
+                self.wfile.write(b"%x\r\n" % len(data) + data + b"\r\n")
+                self.wfile.flush()
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}/v1/chat/completions"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self) -> "FakeLLMServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _record(self, body: dict) -> dict:
+        """记录一次请求，返回按字符数粗算的输入 usage"""
+        messages = body.get("messages", [])
+        prefix = "".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += sum(len(m.get("content", "")) for m in messages)
+            self.requests.append(body)
+            cached = len(prefix) // 2 if prefix in self._seen_prefixes else 0
+            if prefix:
+                self._seen_prefixes.add(prefix)
+        prompt = sum(len(m.get("content", "")) for m in messages) // 2
+        return {"prompt_tokens": prompt, "prompt_tokens_details": {"cached_tokens": cached}}
+
+    def reply_for(self, body: dict) -> str:
+        # 只看用户指令部分，提示词里的示例不参与匹配
+        messages = body.get("messages", [{}])
+        prompt = messages[-1].get("content", "")
+        instruction = prompt.rsplit("用户指令：", 1)[-1]
+        if any('"shapes"' in m.get("content", "") for m in messages if m.get("role") == "system"):
+            responses, fence, default = self.plan_responses, "json", CABIN_PLAN
+        else:
+            responses, fence, default = self.responses, "python", CABIN_CODE
+        for keyword, text in responses.items():
+            if keyword in instruction:
+                return f"```{fence}\n{text}```"
+        return f"```{fence}\n{default}```"
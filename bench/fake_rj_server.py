@@ -0,0 +1,148 @@
+import socketserver
+import threading
+import time
+from collections import Counter, deque
+from typing import List, Tuple
+import numpy as np
+
+# 内存世界的范围：x、z ∈ [-HALF, HALF)，y ∈ [0, HEIGHT)
+HALF = 128
+HEIGHT = 256
+GROUND_Y = 63
+
+WRITE_COMMANDS = {"world.setBlock", "world.setBlocks"}
+
+
+class FakeRaspberryJuice:
+    """
+    离线的 RaspberryJuice 替身：
+    - 世界是一块 NumPy 数组（y, x, z），GROUND_Y 及以下是草方块
+    - 支持本项目用到的命令：setBlock(s)、getBlock(s)、getBlockWithData、getHeight、
+      player.getPos、chat.post、events.chat.posts、getPlayerEntityIds、entity.getName
+    - 统计每种命令的次数和收到的字节数，记录聊天栏消息及时间，供基准测试计算延迟
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.ids = np.zeros((HEIGHT, 2 * HALF, 2 * HALF), dtype=np.uint16)
+        self.data = np.zeros(self.ids.shape, dtype=np.uint8)
+        self.ids[:GROUND_Y + 1] = 2
+
+        self.commands = Counter()
+        self.bytes_received = 0
+        self.blocks_written = 0
+        self.chat_log: List[Tuple[float, str]] = []
+        self.players = {1: "Steve"}
+
+        self._pending_chat = deque()
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    reply = server.dispatch(line)
+                    if reply is not None:
+                        self.wfile.write(reply.encode("utf-8") + b"\n")
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self) -> "FakeRaspberryJuice":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # ---------- 基准脚本使用 ----------
+
+    def post_chat(self, entity_id: int, message: str):
+        """模拟玩家在聊天栏发言，下一次 events.chat.posts 会返回"""
+        with self._lock:
+            self._pending_chat.append(f"{entity_id},{message}")
+
+    def chat_since(self, index: int) -> List[Tuple[float, str]]:
+        with self._lock:
+            return self.chat_log[index:]
+
+    def write_commands(self) -> int:
+        return sum(self.commands[c] for c in WRITE_COMMANDS)
+
+    # ---------- 协议处理 ----------
+
+    @staticmethod
+    def _index(x: int, y: int, z: int):
+        return y, x + HALF, z + HALF
+
+    def _slices(self, args: List[int]):
+        x0, y0, z0, x1, y1, z1 = args[:6]
+        lo = self._index(min(x0, x1), min(y0, y1), min(z0, z1))
+        hi = self._index(max(x0, x1), max(y0, y1), max(z0, z1))
+        return tuple(slice(max(0, a), max(0, b + 1)) for a, b in zip(lo, hi))
+
+    def dispatch(self, raw: bytes):
+        line = raw.decode("utf-8").rstrip("\n")
+        name, _, rest = line.partition("(")
+        args = rest[:-1]
+
+        with self._lock:
+            self.commands[name] += 1
+            self.bytes_received += len(raw)
+
+            if name == "chat.post":
+                self.chat_log.append((time.monotonic(), args))
+                return None
+
+            if name == "events.chat.posts":
+                events = "|".join(self._pending_chat)
+                self._pending_chat.clear()
+                return events
+
+            if name == "player.getPos":
+                return "0.5,64.0,0.5"
+
+            if name == "world.getPlayerEntityIds":
+                return "|".join(str(i) for i in self.players)
+
+            if name == "entity.getName":
+                return self.players.get(int(args), "")
+
+            values = [int(float(v)) for v in args.split(",")] if args else []
+
+            if name == "world.setBlock":
+                x, y, z, block_id = values[:4]
+                cell = self._index(x, y, z)
+                if 0 <= cell[0] < HEIGHT and 0 <= cell[1] < 2 * HALF and 0 <= cell[2] < 2 * HALF:
+                    self.ids[cell] = block_id
+                    self.data[cell] = values[4] if len(values) > 4 else 0
+                self.blocks_written += 1
+                return None
+
+            if name == "world.setBlocks":
+                sl = self._slices(values)
+                self.ids[sl] = values[6]
+                self.data[sl] = values[7] if len(values) > 7 else 0
+                x0, y0, z0, x1, y1, z1 = values[:6]
+                self.blocks_written += (abs(x1 - x0) + 1) * (abs(y1 - y0) + 1) * (abs(z1 - z0) + 1)
+                return None
+
+            if name == "world.getBlock":
+                return str(int(self.ids[self._index(*values[:3])]))
+
+            if name == "world.getBlockWithData":
+                cell = self._index(*values[:3])
+                return f"{int(self.ids[cell])},{int(self.data[cell])}"
+
+            if name == "world.getBlocks":
+                return ",".join(map(str, self.ids[self._slices(values)].ravel().tolist()))
+
+            if name == "world.getHeight":
+                x, z = values[:2]
+                column = np.flatnonzero(self.ids[:, x + HALF, z + HALF])
+                return str(int(column[-1]) if column.size else 0)
+
+            return "Fail"
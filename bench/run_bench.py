@@ -0,0 +1,203 @@
+"""
+离线端到端基准测试：本地 RaspberryJuice 替身 + OpenAI 兼容替身 + 真实的 start_event_loop。
+
+用法（在项目根目录）：
+    python -m bench.run_bench
+    python -m bench.run_bench --scenario mixed --repeat 3 --llm-latency 1.0 --stream
+
+结果写入 bench/results/<场景与参数>-<时间>.json，并与参数相同的上一次结果对比。
+"""
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bench.fake_llm_server import FakeLLMServer
+from bench.fake_rj_server import FakeRaspberryJuice
+from core.config_loader import CONFIG
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+SCENARIOS = {
+    "cabin": ["建一个小屋"],
+    "mixed": ["建一个小屋", "以我为中心建一个 5x5 的石头平台", "建一座圆塔"],
+    "repeat": ["建一个小屋", "建一个小屋", "帮我建个小屋"],
+}
+
+# 出现这些聊天消息说明一条指令处理完毕
+DONE_MARKERS = ("执行成功", "执行失败", "安全拒绝", "未能生成", "未生成有效代码", "建造已取消", "无法获取玩家位置")
+
+# 对比上一次结果时关注的指标
+COMPARED = ("latency_p50", "latency_p99", "blocks_per_second", "wire_commands_per_build", "llm_calls_per_command",
+            "llm_prompt_tokens", "llm_completion_tokens")
+
+
+def configure(rj: FakeRaspberryJuice, llm: FakeLLMServer, args, workdir: Path):
+    """在导入 core 中的单例之前改写配置，让助手连接到本地替身"""
+    CONFIG['minecraft']['host'], CONFIG['minecraft']['port'] = rj.address
+    CONFIG['minecraft']['write_connections'] = args.write_connections
+    CONFIG['ai'].update(provider="openai", api_key="bench", model="bench-model",
+                        base_url=llm.url, stream=args.stream)
+    CONFIG['prompt']['output_mode'] = "plan" if args.plan else "python"
+    CONFIG['cache']['enabled'] = not args.no_cache
+    CONFIG['cache']['path'] = str(workdir / "code_cache.db")
+    CONFIG['snapshot']['path'] = str(workdir / "snapshots")
+    CONFIG['metrics'].update(enabled=args.metrics, port=0)
+
+
+def wait_for_done(rj: FakeRaspberryJuice, since: int, timeout: float):
+    """等待 since 之后出现完成消息，返回 (完成时间, 消息)；超时返回 None"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for at, message in rj.chat_since(since):
+            if any(marker in message for marker in DONE_MARKERS):
+                return at, message
+        time.sleep(0.005)
+    return None
+
+
+def run(args) -> dict:
+    rj = FakeRaspberryJuice().start()
+    llm = FakeLLMServer(latency=args.llm_latency).start()
+    workdir = Path(tempfile.mkdtemp(prefix="mc-bench-"))
+    configure(rj, llm, args, workdir)
+
+    from core.event_handler import start_event_loop
+    from core.mc_connection import create_minecraft_connection
+
+    mc = create_minecraft_connection()
+    stop = threading.Event()
+    loop = threading.Thread(target=start_event_loop, args=(mc, stop), daemon=True)
+    loop.start()
+    time.sleep(0.2)
+
+    instructions = SCENARIOS[args.scenario] * args.repeat
+    latencies, failures = [], []
+    start_writes, start_blocks = rj.write_commands(), rj.blocks_written
+    started = time.monotonic()
+
+    for instruction in instructions:
+        since = len(rj.chat_log)
+        sent_at = time.monotonic()
+        rj.post_chat(1, f"{CONFIG['system']['command_prefix']} {instruction}")
+        done = wait_for_done(rj, since, args.timeout)
+        if done is None:
+            failures.append(f"{instruction}: 超时")
+            continue
+        latencies.append(done[0] - sent_at)
+        if "执行成功" not in done[1]:
+            failures.append(f"{instruction}: {done[1]}")
+
+    elapsed = time.monotonic() - started
+    stop.set()
+    loop.join(timeout=5)
+    rj.stop()
+    llm.stop()
+
+    from core.token_budget import token_ledger
+    tokens = token_ledger.stats()
+
+    stages = {}
+    if args.metrics:
+        from core.metrics import metrics
+        stages = metrics.snapshot()["stages"]
+
+    builds = len(instructions)
+    writes = rj.write_commands() - start_writes
+    blocks = rj.blocks_written - start_blocks
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "scenario": args.scenario,
+        "repeat": args.repeat,
+        "llm_latency": args.llm_latency,
+        "stream": args.stream,
+        "plan": args.plan,
+        "cache": not args.no_cache,
+        "write_connections": args.write_connections,
+        "commands": builds,
+        "failures": failures,
+        "latency_p50": float(np.percentile(latencies, 50)) if latencies else None,
+        "latency_p99": float(np.percentile(latencies, 99)) if latencies else None,
+        "blocks_written": blocks,
+        "blocks_per_second": blocks / elapsed if elapsed else 0.0,
+        "wire_commands_per_build": writes / builds if builds else 0.0,
+        "total_wire_commands": sum(rj.commands.values()),
+        "wire_bytes": rj.bytes_received,
+        "llm_calls_per_command": llm.calls / builds if builds else 0.0,
+        "llm_prompt_chars": llm.prompt_chars,
+        "llm_prompt_tokens": tokens["prompt_tokens"],
+        "llm_cached_tokens": tokens["cached_tokens"],
+        "llm_completion_tokens": tokens["completion_tokens"],
+        "command_counts": dict(rj.commands),
+        "stages": stages,
+    }
+
+
+def result_key(result: dict) -> str:
+    """场景 + 输出模式和各项开关；只有这些都相同的两次结果才有可比性"""
+    return "-".join([
+        result["scenario"],
+        "plan" if result["plan"] else "python",
+        "stream" if result["stream"] else "batch",
+        "cache" if result["cache"] else "nocache",
+        f"w{result['write_connections']}",
+        f"llm{result['llm_latency']:g}s",
+    ])
+
+
+def compare(result: dict):
+    """与场景、模式和开关都相同的上一次结果对比"""
+    previous = sorted(RESULTS_DIR.glob(f"{result_key(result)}-*.json"))
+    if not previous:
+        return
+    with open(previous[-1], "r", encoding="utf-8") as f:
+        last = json.load(f)
+
+    print(f"\n📊 与 {previous[-1].name} 对比:")
+    for key in COMPARED:
+        old, new = last.get(key), result.get(key)
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"   {key:<26} {old:>10.3f} → {new:>10.3f}  ({change})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gpt-mc-builder 离线基准测试")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--repeat", type=int, default=3, help="场景重复次数")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="模拟大模型响应耗时（秒）")
+    parser.add_argument("--stream", action="store_true", help="开启流式生成")
+    parser.add_argument("--plan", action="store_true", help="使用 JSON 建造计划输出模式")
+    parser.add_argument("--no-cache", action="store_true", help="关闭指令缓存")
+    parser.add_argument("--write-connections", type=int, default=CONFIG['minecraft']['write_connections'])
+    parser.add_argument("--metrics", action="store_true", help="记录各阶段耗时并写入结果")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单条指令超时（秒）")
+    args = parser.parse_args()
+
+    result = run(args)
+    print(json.dumps({k: v for k, v in result.items() if k not in ("command_counts", "stages")},
+                     ensure_ascii=False, indent=2))
+    for stage, summary in sorted(result["stages"].items()):
+        print(f"   {stage:<20} n={summary['count']:<5} mean={summary['mean'] * 1000:8.2f} ms")
+    compare(result)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    path = RESULTS_DIR / f"{result_key(result)}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"💾 结果已保存: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,96 +1,144 @@
-import requests
-import time
-from typing import Optional
+import json
+from typing import Iterator, Optional
+from .code_cache import hash_text
 from .config_loader import CONFIG
+from .http_transport import RETRYABLE_STATUS, get_transport
+from .metrics import metrics
+from .providers import create_adapter
+from .singleflight import SingleFlight
+from .token_budget import estimate_messages, token_ledger
+
+# 不可重试的常见错误给出更明确的提示
+ERROR_HINTS = {
+    401: "授权失败：API Key 错误",
+    404: "接口未找到：检查 URL 是否正确",
+}
 
 
 class AIClient:
+    """
+    统一的大模型客户端：请求格式由 providers 中注册的适配器决定，
+    连接复用、退避重试、熔断由传输层负责；相同的并发请求只发一次，结果共享。
+    """
+
     def __init__(self):
         self.provider = CONFIG["ai"]["provider"]
-        self.api_key = CONFIG["ai"]["api_key"]
         self.model = CONFIG["ai"]["model"]
         self.base_url = CONFIG["ai"]["base_url"]
-        self.max_retries = CONFIG["system"]["max_retries"]
-        self.retry_delay = CONFIG["system"]["retry_delay"]
-
-    def _build_headers(self):
-        """构造请求头（兼容所有 OpenAI 格式 API，包括 DashScope）"""
-
-        # 所有 OpenAI 兼容模式都使用相同的请求头
-        if self.provider in ["openai", "deepseek", "moonshot", "fastgpt", "dashscope"]:
-            return {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-        # 百度千帆
-        if self.provider == "qianfan":
-            return {
-                "Content-Type": "application/json"
-            }
-
-        return {"Content-Type": "application/json"}
-
-    def _build_payload(self, prompt: str):
-        """构造请求体（DashScope 兼容模式必须使用 messages）"""
-
-        # OpenAI / DeepSeek / Moonshot / FastGPT / DashScope（兼容模式）
-        if self.provider in ["openai", "deepseek", "moonshot", "fastgpt", "dashscope"]:
-            return {
-                "model": self.model,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "stream": False
-            }
-
-        # 百度千帆
-        if self.provider == "qianfan":
-            return {
-                "model": self.model,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ]
-            }
-
-        return {}
-
-    def ask(self, prompt: str) -> Optional[str]:
-        """统一的 AI 调用接口"""
-
-        headers = self._build_headers()
-        payload = self._build_payload(prompt)
-
-        for i in range(self.max_retries):
-            try:
-                print(f"📤 发送请求 (第 {i+1} 次): {prompt[:50]}...")
-
-                response = requests.post(
-                    self.base_url,
-                    json=payload,
-                    headers=headers,
-                    timeout=20
-                )
-
-                print(f"📥 响应状态码: {response.status_code}")
-
-                if response.status_code == 200:
-                    data = response.json()
-
-                    # 所有兼容模式（包括 DashScope）都走 OpenAI 格式
-                    if self.provider in ["openai", "deepseek", "moonshot", "fastgpt", "dashscope"]:
-                        return data["choices"][0]["message"]["content"].strip()
-
-                    # 百度千帆
-                    if self.provider == "qianfan":
-                        return data["result"].strip()
-
-                else:
-                    print(f"❌ 错误 {response.status_code}: {response.text[:200]}")
-
-            except Exception as e:
-                print(f"⚠️ 请求异常: {e}")
-
-            time.sleep(self.retry_delay)
-
-        return None
\ No newline at end of file
+        self.adapter = create_adapter(self.provider, CONFIG["ai"])
+        self.transport = get_transport(self.provider)
+        self.coalesce = CONFIG["ai"]["coalesce_requests"]
+        self._flight = SingleFlight()
+
+    @staticmethod
+    def _build_messages(prompt: str, system: Optional[str]):
+        """固定的系统提示词放在最前面，服务商可以复用已缓存的前缀"""
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def _request_key(self, payload: dict) -> str:
+        return hash_text(f"{self.provider}\n{self.base_url}\n{json.dumps(payload, sort_keys=True, ensure_ascii=False)}")
+
+    @staticmethod
+    def _report_error(response):
+        # 可重试的错误传输层已经逐次打印过
+        if response is not None and response.status_code not in RETRYABLE_STATUS:
+            hint = ERROR_HINTS.get(response.status_code, response.text[:200])
+            print(f"❌ 错误 {response.status_code}: {hint}")
+
+    def ask(self, prompt: str, system: Optional[str] = None) -> Optional[str]:
+        """统一的 AI 调用接口；system 为系统提示词。与进行中的请求完全相同时等待并共享其结果"""
+        payload = self.adapter.payload(self._build_messages(prompt, system))
+        if not self.coalesce:
+            return self._ask(prompt, payload, estimate_messages(system, prompt))
+
+        content, shared = self._flight.do(self._request_key(payload), self._ask,
+                                          prompt, payload, estimate_messages(system, prompt))
+        if shared:
+            print(f"🔗 合并相同请求: {prompt[:50]}...")
+            metrics.inc("llm_coalesced")
+        return content
+
+    def _ask(self, prompt: str, payload: dict, estimated: int) -> Optional[str]:
+        print(f"📤 AI 请求: {prompt[:50]}...")
+        try:
+            # 包含传输层的全部重试和退避等待
+            with metrics.span("llm_request"):
+                response = self.transport.post(self.base_url, payload, self.adapter.headers())
+        except Exception as e:
+            print(f"⚠️ 请求异常: {e}")
+            return None
+
+        if response is None or response.status_code != 200:
+            self._report_error(response)
+            return None
+
+        try:
+            data = response.json()
+            content = self.adapter.parse(data)
+        except Exception as e:
+            print(f"⚠️ 响应解析失败: {e}")
+            return None
+
+        token_ledger.record(estimated, self.adapter.usage(data), content)
+        return content
+
+    def ask_stream(self, prompt: str, system: Optional[str] = None) -> Iterator[str]:
+        """
+        流式调用：按 SSE（data: {...}）逐段返回增量文本。
+        不支持流式的服务商退回到 ask()，一次性返回全部内容。
+        与进行中的流式请求完全相同时，从头共享同一路增量文本。
+        """
+        if not self.adapter.supports_stream:
+            raw = self.ask(prompt, system)
+            if raw:
+                yield raw
+            return
+
+        payload = self.adapter.payload(self._build_messages(prompt, system), stream=True)
+        estimated = estimate_messages(system, prompt)
+        if not self.coalesce:
+            yield from self._ask_stream(prompt, payload, estimated)
+            return
+
+        parts, shared = self._flight.stream(self._request_key(payload), self._ask_stream,
+                                            prompt, payload, estimated)
+        if shared:
+            print(f"🔗 合并相同流式请求: {prompt[:50]}...")
+            metrics.inc("llm_coalesced")
+        yield from parts
+
+    def _ask_stream(self, prompt: str, payload: dict, estimated: int) -> Iterator[str]:
+        print(f"📤 AI 流式请求: {prompt[:50]}...")
+        try:
+            response = self.transport.post(self.base_url, payload, self.adapter.headers(), stream=True)
+        except Exception as e:
+            print(f"⚠️ 请求异常: {e}")
+            return
+
+        if response is None or response.status_code != 200:
+            self._report_error(response)
+            return
+
+        # SSE 通常不声明字符集，requests 会按 ISO-8859-1 解码，导致中文乱码
+        response.encoding = "utf-8"
+        usage, parts = None, []
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                    usage = self.adapter.usage(chunk) or usage
+                    delta = self.adapter.parse_chunk(chunk)
+                except (ValueError, KeyError, IndexError, AttributeError) as e:
+                    print(f"⚠️ 流式数据解析失败: {e}")
+                    continue
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        token_ledger.record(estimated, usage, "".join(parts))
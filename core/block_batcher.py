@@ -0,0 +1,98 @@
+import threading
+from typing import Any, List, Optional
+from mcpi.block import Block
+from mcpi.minecraft import intFloor
+from .block_writer import block_writer
+from .config_loader import CONFIG
+from .voxel_model import Cuboid, VoxelRegion
+
+
+class BlockRecorder:
+    """
+    替代 exec 环境中的 mc 对象：
+    - setBlock / setBlocks 只写入内存 NumPy 体素模型（后写覆盖先写）
+    - getBlock / getBlockWithData 优先返回尚未发送的方块
+    - 其余属性（player、postToChat、getHeight 等）直接转发给真实 mc
+    - flush() 时与世界现状比对，只把有变化的格子合并成最少的 setBlocks，交给限速写入器发送
+    """
+
+    def __init__(self, mc: Any, max_blocks: int = None, player_name: str = "玩家",
+                 cancel: Optional[threading.Event] = None):
+        self._mc = mc
+        self.player_name = player_name
+        self.cancel = cancel
+        self._max_blocks = max_blocks or CONFIG['builder']['max_buffered_blocks']
+        self._region = VoxelRegion(self._max_blocks)
+        self._passthrough = False
+        self.recorded_calls = 0
+
+    def __getattr__(self, name: str):
+        return getattr(self._mc, name)
+
+    def setBlock(self, *args):
+        self.recorded_calls += 1
+        values = intFloor(args)
+        x, y, z, block_id = values[:4]
+        data = values[4] if len(values) > 4 else 0
+        if self._passthrough or not self._region.fill(x, y, z, x, y, z, block_id, data):
+            self._send_direct((x, y, z, x, y, z, block_id, data))
+
+    def setBlocks(self, *args):
+        self.recorded_calls += 1
+        values = intFloor(args)
+        x0, y0, z0, x1, y1, z1, block_id = values[:7]
+        data = values[7] if len(values) > 7 else 0
+        if self._passthrough or not self._region.fill(x0, y0, z0, x1, y1, z1, block_id, data):
+            self._send_direct((min(x0, x1), min(y0, y1), min(z0, z1),
+                               max(x0, x1), max(y0, y1), max(z0, z1), block_id, data))
+
+    def _send_direct(self, cuboid: Cuboid):
+        if not self._passthrough:
+            # 区域过大时不再缓冲，先把已记录的发出去以保证顺序
+            self._start_passthrough()
+        # 同样经过限速写入器，受速率限制和任务取消控制
+        block_writer.write(self._mc, [cuboid], self.player_name, cancel=self.cancel)
+
+    def getBlock(self, *args):
+        state = self._region.get(*intFloor(args))
+        if state is not None:
+            return state[0]
+        return self._mc.getBlock(*args)
+
+    def getBlockWithData(self, *args):
+        state = self._region.get(*intFloor(args))
+        if state is not None:
+            return Block(*state)
+        return self._mc.getBlockWithData(*args)
+
+    def _start_passthrough(self):
+        print(f"⚠️ 缓冲区域超过 {self._max_blocks} 格，改为直接发送")
+        self.flush()
+        self._passthrough = True
+
+    def plan(self) -> List[Cuboid]:
+        """计算需要发送的长方体（开启 diff_writes 时先与世界比对）"""
+        region = self._region
+        if region.origin is None:
+            return []
+
+        required = None
+        if CONFIG['builder']['diff_writes']:
+            try:
+                required = region.diff_mask(self._mc)
+            except Exception as e:
+                print(f"⚠️ 读取区域失败，改为全量写入: {e}")
+
+        return region.to_cuboids(required)
+
+    def flush(self) -> int:
+        """发送所有缓冲的方块，返回实际发送的命令数；被玩家取消时抛出 WriteCancelled"""
+        written = self._region.written
+        if not written:
+            return 0
+
+        cuboids = self.plan()
+        self._region.clear()
+        sent = block_writer.write(self._mc, cuboids, self.player_name, disjoint=True, cancel=self.cancel)
+        print(f"📦 合并写入: {written} 个方块 → {sent} 条命令")
+        return sent
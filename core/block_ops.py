@@ -0,0 +1,142 @@
+from typing import Any, Iterator, Optional, Tuple
+import numpy as np
+from .voxel_model import Cuboid
+
+
+class BlockOps:
+    """
+    方块操作 IR：按执行顺序记录生成代码的写操作，数据全部放在 NumPy 数组里。
+    第 i 条操作把 lo[i]..hi[i]（含两端，轴顺序 x, y, z）的长方体填成 (ids[i], data[i])，
+    setBlock 记为 1×1×1 的长方体。
+    逐条追加的操作先放在 Python 列表里，读取数组前再一次性写入，避免每条操作都做 NumPy 赋值。
+    IR 可以在发送前统计体积、平移、查询，最后交给 BlockRecorder 或真实 mc 发送。
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.lo = np.empty((capacity, 3), dtype=np.int32)
+        self.hi = np.empty((capacity, 3), dtype=np.int32)
+        self.ids = np.empty(capacity, dtype=np.int32)
+        self.data = np.empty(capacity, dtype=np.uint8)
+        self._n = 0
+        self._pending = []
+
+    def __len__(self) -> int:
+        return self._n + len(self._pending)
+
+    def _grow(self):
+        capacity = max(256, len(self.ids) * 2)
+        for name in ("lo", "hi", "ids", "data"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def append(self, x0: int, y0: int, z0: int, x1: int, y1: int, z1: int,
+               block_id: int, data: int = 0):
+        self._pending.append((x0, y0, z0, x1, y1, z1, block_id, data))
+
+    def _sync(self):
+        """把列表中的操作写入数组"""
+        if not self._pending:
+            return
+        rows = np.array(self._pending, dtype=np.int64).reshape(-1, 8)
+        self._pending = []
+        while len(self.ids) < self._n + len(rows):
+            self._grow()
+        i, j = self._n, self._n + len(rows)
+        self.lo[i:j] = np.minimum(rows[:, 0:3], rows[:, 3:6])
+        self.hi[i:j] = np.maximum(rows[:, 0:3], rows[:, 3:6])
+        self.ids[i:j] = rows[:, 6]
+        self.data[i:j] = rows[:, 7]
+        self._n = j
+
+    def extend_rows(self, rows: np.ndarray):
+        """追加 (n, 8) 的操作数组，每行为 x0, y0, z0, x1, y1, z1, id, data（已规范化为 lo <= hi）"""
+        self._sync()
+        while len(self.ids) < self._n + len(rows):
+            self._grow()
+        i, j = self._n, self._n + len(rows)
+        self.lo[i:j] = rows[:, 0:3]
+        self.hi[i:j] = rows[:, 3:6]
+        self.ids[i:j] = rows[:, 6]
+        self.data[i:j] = rows[:, 7]
+        self._n = j
+
+    def rows(self, start: int = 0) -> np.ndarray:
+        """第 start 条之后的操作，(n, 8) int64 数组，与 extend_rows 对应"""
+        self._sync()
+        n = self._n
+        return np.column_stack((self.lo[start:n], self.hi[start:n], self.ids[start:n], self.data[start:n])).astype(np.int64)
+
+    def extend(self, other: "BlockOps"):
+        self._sync()
+        other._sync()
+        while len(self.ids) < self._n + len(other):
+            self._grow()
+        i, j = self._n, self._n + len(other)
+        self.lo[i:j] = other.lo[:len(other)]
+        self.hi[i:j] = other.hi[:len(other)]
+        self.ids[i:j] = other.ids[:len(other)]
+        self.data[i:j] = other.data[:len(other)]
+        self._n = j
+
+    def volumes(self) -> np.ndarray:
+        """每条操作覆盖的方块数"""
+        self._sync()
+        n = self._n
+        return np.prod(self.hi[:n].astype(np.int64) - self.lo[:n] + 1, axis=1)
+
+    def volume(self) -> int:
+        """所有操作覆盖的方块数之和（重叠部分重复计算）"""
+        return int(self.volumes().sum())
+
+    def bounds(self) -> Optional[Tuple[int, int, int, int, int, int]]:
+        """(x0, y0, z0, x1, y1, z1)，没有操作时为 None"""
+        self._sync()
+        if not self._n:
+            return None
+        lo = self.lo[:self._n].min(axis=0)
+        hi = self.hi[:self._n].max(axis=0)
+        return (*map(int, lo), *map(int, hi))
+
+    def lookup(self, x: int, y: int, z: int) -> Optional[Tuple[int, int]]:
+        """返回最后一次写入 (x, y, z) 的 (id, data)，没有写过时返回 None"""
+        self._sync()
+        n = self._n
+        if not n:
+            return None
+        point = np.array((x, y, z), dtype=np.int32)
+        inside = np.all((self.lo[:n] <= point) & (point <= self.hi[:n]), axis=1)
+        hits = np.flatnonzero(inside)
+        if not hits.size:
+            return None
+        i = hits[-1]
+        return int(self.ids[i]), int(self.data[i])
+
+    def translate(self, dx: int, dy: int, dz: int) -> "BlockOps":
+        """返回整体平移后的副本"""
+        self._sync()
+        moved = BlockOps(max(1, self._n))
+        moved.extend(self)
+        offset = np.array((dx, dy, dz), dtype=np.int32)
+        moved.lo[:self._n] += offset
+        moved.hi[:self._n] += offset
+        return moved
+
+    def __iter__(self) -> Iterator[Cuboid]:
+        self._sync()
+        n = self._n
+        rows = np.column_stack((self.lo[:n], self.hi[:n], self.ids[:n], self.data[:n]))
+        for row in rows.tolist():
+            yield tuple(row)
+
+    def apply(self, target: Any) -> int:
+        """按顺序把操作发给 target（BlockRecorder 或 mc），返回命令数"""
+        for x0, y0, z0, x1, y1, z1, block_id, data in self:
+            # data 为 0 时省略，减少报文长度
+            block = (block_id, data) if data else (block_id,)
+            if (x0, y0, z0) == (x1, y1, z1):
+                target.setBlock(x0, y0, z0, *block)
+            else:
+                target.setBlocks(x0, y0, z0, x1, y1, z1, *block)
+        return len(self)
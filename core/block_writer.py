@@ -0,0 +1,253 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from .chat_poller import chat_poller
+from .chunk_cache import WORLD_CACHE
+from .config_loader import CONFIG
+from .connection_pool import get_write_pool, reset_write_pool
+from .metrics import metrics
+from .rj_connection import write_batch
+from .voxel_model import Cuboid
+
+
+class WriteCancelled(Exception):
+    """玩家取消了正在进行的建造"""
+    pass
+
+
+def cuboid_volume(c: Cuboid) -> int:
+    return (c[3] - c[0] + 1) * (c[4] - c[1] + 1) * (c[5] - c[2] + 1)
+
+
+def order_by_chunk(cuboids: Sequence[Cuboid]) -> List[Cuboid]:
+    """
+    按 16×16 区块列分组发送，区块之间蛇形遍历，服务器不必在多个区块间来回加载。
+    区块内仍然空气优先、自下而上，与 VoxelRegion.to_cuboids 的顺序一致。
+    """
+    def key(c: Cuboid):
+        cx, cz = c[0] >> 4, c[2] >> 4
+        return cx, cz if cx % 2 == 0 else -cz, c[6] != 0, c[1]
+    return sorted(cuboids, key=key)
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶，令牌单位是方块。
+    一次取用超过桶容量时只等到桶满，差额记为欠账，由后续请求偿还。
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float, cancel: threading.Event) -> bool:
+        """取用 amount 个令牌；等待期间被取消时返回 False"""
+        need = min(amount, self.burst)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= need:
+                    self._tokens -= amount
+                    return True
+                wait = (need - self._tokens) / self.rate
+            if cancel.wait(wait):
+                return False
+
+
+class ThrottledWriter:
+    """
+    限速写入：所有建造共用一个每秒方块数预算，避免大建筑拖慢整个服务器。
+    - 互不重叠的长方体按区块顺序分批发送，可能重叠的按原顺序发送，每批受令牌桶限速
+    - 互不重叠的长方体按区块分到多条写连接并行发送（minecraft.write_connections）
+    - 每批之后在用到的连接上各做一次往返测量服务器延迟：
+      超过目标就降速，明显低于目标再慢慢提速；主连接上的测量顺带拉取聊天消息
+    - 建造较大时定期在聊天栏报告进度
+    - 写入可以带一个取消事件（任务的取消标记），设置后在下一批之前停止；
+      cancel(player) 让该玩家所有正在进行的写入停止
+    """
+
+    def __init__(self):
+        self.enabled = CONFIG['writer']['enabled']
+        self.max_rate = CONFIG['writer']['blocks_per_second']
+        self.min_rate = CONFIG['writer']['min_blocks_per_second']
+        self.batch_blocks = CONFIG['writer']['batch_blocks']
+        self.target_rtt = CONFIG['writer']['target_rtt_ms'] / 1000
+        self.progress_interval = CONFIG['writer']['progress_interval']
+
+        self.bucket = TokenBucket(self.max_rate, CONFIG['writer']['burst_blocks'])
+        self.rtt = None
+
+        self._jobs: Dict[str, List[threading.Event]] = {}
+        # 每个进行中的写入：取消事件 -> (已写入, 总数)
+        self._progress: Dict[threading.Event, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def cancel(self, player: str) -> int:
+        """取消玩家所有正在进行的写入，返回被取消的数量"""
+        with self._lock:
+            events = self._jobs.get(player, [])
+            for event in events:
+                event.set()
+            return len(events)
+
+    def progress(self, player: str) -> Optional[Tuple[int, int]]:
+        """玩家正在进行的写入的 (已写入, 总数) 方块数，没有时返回 None"""
+        with self._lock:
+            parts = [self._progress[event] for event in self._jobs.get(player, []) if event in self._progress]
+        if not parts:
+            return None
+        return sum(p[0] for p in parts), sum(p[1] for p in parts)
+
+    def _register(self, player: str, event: Optional[threading.Event]) -> threading.Event:
+        event = event if event is not None else threading.Event()
+        with self._lock:
+            self._jobs.setdefault(player, []).append(event)
+        return event
+
+    def _unregister(self, player: str, event: threading.Event):
+        with self._lock:
+            events = self._jobs.get(player, [])
+            self._progress.pop(event, None)
+            if event in events:
+                events.remove(event)
+            if not events:
+                self._jobs.pop(player, None)
+
+    def _adapt(self, sample: float):
+        """根据一次往返延迟调整速率（AIMD）"""
+        self.rtt = sample if self.rtt is None else 0.7 * self.rtt + 0.3 * sample
+
+        rate = self.bucket.rate
+        if self.rtt > self.target_rtt:
+            rate = max(self.min_rate, rate * 0.7)
+        elif self.rtt < self.target_rtt / 2:
+            rate = min(self.max_rate, rate + self.max_rate * 0.1)
+        if rate != self.bucket.rate:
+            self.bucket.set_rate(rate)
+
+    def _send_shard(self, mc: Any, cuboids: Sequence[Cuboid], probe: bool,
+                    control: bool = False) -> Optional[float]:
+        """
+        在一条连接上流水线发送，probe 时返回随后一次往返的耗时。
+        control 表示这是主连接，测量用 events.chat.posts 代替 getHeight，省下聊天轮询的一次往返。
+        """
+        with write_batch(mc):
+            for cuboid in cuboids:
+                self._send(mc, cuboid)
+        if not probe:
+            return None
+
+        start = time.monotonic()
+        try:
+            if control:
+                chat_poller.piggyback(mc)
+            else:
+                mc.getHeight(cuboids[-1][0], cuboids[-1][2])
+        except Exception as e:
+            print(f"⚠️ 测量延迟失败: {e}")
+            return None
+        return time.monotonic() - start
+
+    def _send_batch(self, mc: Any, batch: Sequence[Cuboid], parallel: bool, probe: bool) -> Optional[float]:
+        """发送一批长方体，返回测得的最大往返延迟"""
+        pool = get_write_pool() if parallel else None
+        if pool is None:
+            return self._send_shard(mc, batch, probe, control=True)
+
+        shards = pool.shard(batch)
+        futures = [(part, pool.executor.submit(self._send_shard, conn, part, probe)) for conn, part in shards]
+        samples, failed = [], []
+        for part, future in futures:
+            try:
+                samples.append(future.result())
+            except Exception as e:
+                print(f"⚠️ 写连接出错，改用主连接: {e}")
+                failed.append(part)
+
+        if failed:
+            reset_write_pool()
+            for part in failed:
+                samples.append(self._send_shard(mc, part, probe, control=True))
+
+        samples = [s for s in samples if s is not None]
+        return max(samples) if samples else None
+
+    def write(self, mc: Any, cuboids: Sequence[Cuboid], player: str = "玩家",
+              disjoint: bool = False, cancel: Optional[threading.Event] = None) -> int:
+        """
+        发送长方体，返回发送的命令数；被取消时抛出 WriteCancelled。
+        disjoint 表示长方体互不重叠、发送顺序无关，只有这种情况才会按区块重排并分到多条连接并行发送；
+        否则按给定顺序在主连接上发送，重叠部分后写覆盖先写。
+        cancel 为所属任务的取消事件，\ai cancel <编号> 只停止这个任务的写入。
+        """
+        if not cuboids:
+            return 0
+
+        if not self.enabled:
+            with write_batch(mc):
+                for cuboid in cuboids:
+                    self._send(mc, cuboid)
+            WORLD_CACHE.record_writes(cuboids)
+            return len(cuboids)
+
+        ordered = order_by_chunk(cuboids) if disjoint else list(cuboids)
+        total = sum(cuboid_volume(c) for c in ordered)
+        cancel = self._register(player, cancel)
+        done = sent = 0
+        last_report = time.monotonic()
+
+        try:
+            while sent < len(ordered):
+                batch_end, volume = sent, 0
+                while batch_end < len(ordered) and (volume == 0 or volume < self.batch_blocks):
+                    volume += cuboid_volume(ordered[batch_end])
+                    batch_end += 1
+
+                if cancel.is_set() or not self.bucket.acquire(volume, cancel):
+                    raise WriteCancelled(f"已写入 {done}/{total} 个方块")
+
+                probe = total > self.batch_blocks
+                with metrics.span("write_batch"):
+                    sample = self._send_batch(mc, ordered[sent:batch_end], disjoint, probe)
+                metrics.inc("blocks_written", volume)
+                metrics.inc("write_commands", batch_end - sent)
+                WORLD_CACHE.record_writes(ordered[sent:batch_end])
+                sent, done = batch_end, done + volume
+                self._progress[cancel] = (done, total)
+
+                if probe:
+                    if sample is not None:
+                        self._adapt(sample)
+                    if sent < len(ordered) and time.monotonic() - last_report >= self.progress_interval:
+                        last_report = time.monotonic()
+                        mc.postToChat(f"🚧 建造进度 {done * 100 // total}%（{done}/{total} 方块）")
+        finally:
+            self._unregister(player, cancel)
+
+        return sent
+
+    @staticmethod
+    def _send(mc: Any, cuboid: Cuboid):
+        x0, y0, z0, x1, y1, z1, block_id, data = cuboid
+        # data 为 0 时省略，减少报文长度
+        block = (block_id, data) if data else (block_id,)
+        if (x0, y0, z0) == (x1, y1, z1):
+            mc.setBlock(x0, y0, z0, *block)
+        else:
+            mc.setBlocks(x0, y0, z0, x1, y1, z1, *block)
+
+
+block_writer = ThrottledWriter()
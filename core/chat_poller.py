@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+from .config_loader import CONFIG
+from .metrics import metrics
+
+
+class ChatPoller:
+    """
+    自适应的聊天栏轮询：
+    - 有新消息或有指令在处理时按 poll_interval 轮询；空闲时每次空轮询把间隔乘以 poll_backoff，
+      最长 max_poll_interval
+    - 限速写入在主连接上测延迟时顺带执行 events.chat.posts（piggyback），
+      取到的消息放进队列并立即唤醒主循环，这段时间内主循环不必再单独轮询
+    - 按 entityId 用 entity.getName 解析发言的玩家名并缓存，主连接重连时清空
+    """
+
+    def __init__(self):
+        self.min_interval = CONFIG['system']['poll_interval']
+        self.max_interval = CONFIG['system']['max_poll_interval']
+        self.backoff = CONFIG['system']['poll_backoff']
+
+        self.interval = self.min_interval
+        self._last_poll = 0.0
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self._names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """主连接重连后调用：丢弃缓存的玩家名，恢复最短间隔"""
+        with self._lock:
+            self._names.clear()
+            self._pending.clear()
+        self.interval = self.min_interval
+
+    def piggyback(self, mc: Any):
+        """在主连接上顺带拉取聊天消息（同时作为一次往返测量），供限速写入调用"""
+        events = mc.events.pollChatPosts()
+        with self._lock:
+            self._last_poll = time.monotonic()
+            if events:
+                self._pending.extend(events)
+        if events:
+            metrics.inc("chat_piggyback_events", len(events))
+            self._wakeup.set()
+
+    def poll(self, mc: Any, active: bool = False) -> List[Any]:
+        """
+        返回新的聊天事件：先取 piggyback 队列里的，距上次轮询不足当前间隔时不再访问服务器。
+        active 表示还有指令在处理，此时保持最短间隔。
+        """
+        with self._lock:
+            events = list(self._pending)
+            self._pending.clear()
+            due = time.monotonic() - self._last_poll >= self.interval
+        self._wakeup.clear()
+
+        if due:
+            with metrics.span("chat_poll"):
+                polled = mc.events.pollChatPosts()
+            with self._lock:
+                self._last_poll = time.monotonic()
+            events.extend(polled)
+
+        if events or active:
+            self.interval = self.min_interval
+        elif due:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return events
+
+    def wait(self, stop_event: Optional[threading.Event] = None):
+        """睡到下一次该轮询的时刻；piggyback 取到消息时提前醒来"""
+        with self._lock:
+            delay = self._last_poll + self.interval - time.monotonic()
+        if delay <= 0:
+            return
+        if stop_event is not None and stop_event.is_set():
+            return
+        self._wakeup.wait(delay)
+
+    def sender_name(self, mc: Any, entity_id: int) -> str:
+        """玩家名；解析失败（如控制台发言）时返回 "玩家" """
+        with self._lock:
+            name = self._names.get(entity_id)
+        if name is not None:
+            return name
+
+        try:
+            name = mc.entity.getName(entity_id).strip() or "玩家"
+        except Exception as e:
+            print(f"⚠️ 获取玩家名失败 (entityId={entity_id}): {e}")
+            return "玩家"
+
+        with self._lock:
+            self._names[entity_id] = name
+        return name
+
+
+chat_poller = ChatPoller()
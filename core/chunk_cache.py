@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, Tuple
+import numpy as np
+from mcpi.block import Block
+from .config_loader import CONFIG
+from .voxel_model import Cuboid, read_region
+
+SECTION = 16
+
+
+def _section_range(lo: int, hi: int) -> range:
+    return range(lo // SECTION, hi // SECTION + 1)
+
+
+class WorldCache:
+    """
+    生成代码读取世界时的本地缓存（getBlock / getBlockWithData / getHeight）：
+    - 按 16×16×16 的区块段缓存方块 ID，未命中时用一次 world.getBlocks 读取整段
+    - data 值 getBlocks 读不到，第一次 getBlockWithData 时逐格读取并记在同一段里
+    - getHeight 按 (x, z) 列缓存
+    - 本程序自己发出的写入会同步更新缓存；条目超过 ttl_seconds 后重新读取，
+      主连接重连时整体清空
+    """
+
+    def __init__(self):
+        self.enabled = CONFIG['world_cache']['enabled']
+        self.ttl = CONFIG['world_cache']['ttl_seconds']
+        self.max_sections = CONFIG['world_cache']['max_sections']
+        self.max_columns = CONFIG['world_cache']['max_columns']
+
+        self.hits = 0
+        self.misses = 0
+
+        # (sx, sy, sz) -> [ids (y, x, z) uint16, data (y, x, z) int16（-1 表示未读取）, 读取时间]
+        self._sections: "OrderedDict[Tuple[int, int, int], list]" = OrderedDict()
+        # (x, z) -> (高度, 读取时间)
+        self._heights: "OrderedDict[Tuple[int, int], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._sections.clear()
+            self._heights.clear()
+
+    def _section(self, mc: Any, x: int, y: int, z: int) -> list:
+        key = (x // SECTION, y // SECTION, z // SECTION)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sections.get(key)
+            if entry is not None and now - entry[2] <= self.ttl:
+                self._sections.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        # 网络读取放在锁外，不阻塞其他线程的命中
+        ox, oy, oz = key[0] * SECTION, key[1] * SECTION, key[2] * SECTION
+        ids = read_region(mc, ox, oy, oz, ox + SECTION - 1, oy + SECTION - 1, oz + SECTION - 1)
+        entry = [ids, np.full(ids.shape, -1, dtype=np.int16), now]
+
+        with self._lock:
+            self.misses += 1
+            self._sections[key] = entry
+            while len(self._sections) > self.max_sections:
+                self._sections.popitem(last=False)
+        return entry
+
+    def get_block(self, mc: Any, x: int, y: int, z: int) -> int:
+        if not self.enabled:
+            return mc.getBlock(x, y, z)
+        ids = self._section(mc, x, y, z)[0]
+        return int(ids[y % SECTION, x % SECTION, z % SECTION])
+
+    def get_block_with_data(self, mc: Any, x: int, y: int, z: int) -> Block:
+        if not self.enabled:
+            return mc.getBlockWithData(x, y, z)
+
+        entry = self._section(mc, x, y, z)
+        cell = (y % SECTION, x % SECTION, z % SECTION)
+        with self._lock:
+            data = int(entry[1][cell])
+            if data >= 0:
+                return Block(int(entry[0][cell]), data)
+
+        block = mc.getBlockWithData(x, y, z)
+        with self._lock:
+            entry[0][cell] = block.id
+            entry[1][cell] = block.data
+        return block
+
+    def get_height(self, mc: Any, x: int, z: int) -> int:
+        if not self.enabled:
+            return mc.getHeight(x, z)
+
+        key = (x, z)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._heights.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._heights.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        height = mc.getHeight(x, z)
+        with self._lock:
+            self.misses += 1
+            self._heights[key] = (height, now)
+            while len(self._heights) > self.max_columns:
+                self._heights.popitem(last=False)
+        return height
+
+    def record_writes(self, cuboids: Iterable[Cuboid]):
+        """把已发送的写入同步到缓存：更新已缓存的区块段和受影响列的高度"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            for x0, y0, z0, x1, y1, z1, block_id, data in cuboids:
+                x0, x1 = min(x0, x1), max(x0, x1)
+                y0, y1 = min(y0, y1), max(y0, y1)
+                z0, z1 = min(z0, z1), max(z0, z1)
+
+                for key in self._overlapping_sections(x0, y0, z0, x1, y1, z1):
+                    ids, datas, _ = self._sections[key]
+                    ox, oy, oz = key[0] * SECTION, key[1] * SECTION, key[2] * SECTION
+                    sl = (
+                        slice(max(y0, oy) - oy, min(y1, oy + SECTION - 1) - oy + 1),
+                        slice(max(x0, ox) - ox, min(x1, ox + SECTION - 1) - ox + 1),
+                        slice(max(z0, oz) - oz, min(z1, oz + SECTION - 1) - oz + 1),
+                    )
+                    ids[sl] = block_id
+                    datas[sl] = data
+
+                columns = (x1 - x0 + 1) * (z1 - z0 + 1)
+                if columns <= len(self._heights):
+                    keys = [(x, z) for x in range(x0, x1 + 1) for z in range(z0, z1 + 1) if (x, z) in self._heights]
+                else:
+                    keys = [k for k in self._heights if x0 <= k[0] <= x1 and z0 <= k[1] <= z1]
+                for key in keys:
+                    height, read_at = self._heights[key]
+                    if block_id != 0:
+                        # 放下非空气方块只可能抬高地表
+                        self._heights[key] = (max(height, y1), read_at)
+                    elif y0 <= height <= y1:
+                        # 挖掉了最高的方块，新的高度需要重新读取
+                        del self._heights[key]
+
+    def _overlapping_sections(self, x0, y0, z0, x1, y1, z1) -> Iterator[Tuple[int, int, int]]:
+        xs, ys, zs = _section_range(x0, x1), _section_range(y0, y1), _section_range(z0, z1)
+        if len(xs) * len(ys) * len(zs) <= len(self._sections):
+            for sx in xs:
+                for sy in ys:
+                    for sz in zs:
+                        if (sx, sy, sz) in self._sections:
+                            yield sx, sy, sz
+        else:
+            for key in list(self._sections):
+                if key[0] in xs and key[1] in ys and key[2] in zs:
+                    yield key
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "sections": len(self._sections),
+            "columns": len(self._heights),
+        }
+
+
+WORLD_CACHE = WorldCache()
@@ -0,0 +1,169 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+from .config_loader import CONFIG
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+
+
+def normalize_instruction(instruction: str) -> str:
+    """
+    归一化玩家指令，让写法不同但含义相同的指令得到同一个缓存键：
+    全角转半角、英文小写、去掉空白和标点
+    """
+    text = unicodedata.normalize("NFKC", instruction).lower()
+    return "".join(
+        ch for ch in text
+        if not ch.isspace() and not unicodedata.category(ch).startswith("P")
+    )
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CodeCache:
+    """
+    指令 → 代码 两级缓存：
+    1. 进程内 LRU（OrderedDict）
+    2. 磁盘 SQLite，重启后仍然有效
+    缓存键 = 归一化指令 + 模型名 + 提示词模板哈希，修改模板后旧条目自动失效。
+    内存命中的使用时间先记在 _touched 里，下次访问 SQLite 时批量写回，淘汰前一定已经写回。
+    生成的代码都基于 pos 的相对坐标，因此可以在任意位置重放。
+    """
+
+    def __init__(self):
+        self.enabled = CONFIG['cache']['enabled']
+        self.model = CONFIG['ai']['model']
+        self.ttl = CONFIG['cache']['ttl_seconds']
+        self.max_entries = CONFIG['cache']['max_entries']
+        self.memory_entries = CONFIG['cache']['memory_entries']
+
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        # 内存命中但尚未写回 SQLite 的 key -> last_used
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if self.enabled:
+            self._db = self._open(BASE_DIR / CONFIG['cache']['path'])
+
+    @staticmethod
+    def _open(path: Path) -> sqlite3.Connection:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(str(path), check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS code_cache ("
+            " key TEXT PRIMARY KEY,"
+            " instruction TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " code TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_code_cache_last_used ON code_cache(last_used)")
+        db.commit()
+        return db
+
+    def make_key(self, instruction: str, template: str) -> str:
+        return hash_text(f"{self.model}\0{hash_text(template)}\0{normalize_instruction(instruction)}")
+
+    def get(self, instruction: str, template: str) -> Optional[str]:
+        """查找缓存，未命中或已过期时返回 None"""
+        if not self.enabled:
+            return None
+
+        key = self.make_key(instruction, template)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._memory.move_to_end(key)
+                self._touched[key] = now
+                self.hits += 1
+                return entry[0]
+
+            self._flush_touched()
+            row = self._db.execute(
+                "SELECT code, created_at FROM code_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM code_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                self._memory.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._db.execute("UPDATE code_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            return row[0]
+
+    def put(self, instruction: str, template: str, code: str):
+        """写入缓存，超过容量时淘汰最久未使用的条目"""
+        if not self.enabled or not code:
+            return
+
+        key = self.make_key(instruction, template)
+        now = time.time()
+
+        with self._lock:
+            self._flush_touched()
+            self._db.execute(
+                "INSERT OR REPLACE INTO code_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalize_instruction(instruction), self.model, code, now, now)
+            )
+            self._db.execute(
+                "DELETE FROM code_cache WHERE key IN ("
+                " SELECT key FROM code_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._db.commit()
+            self._remember(key, code, now)
+
+    def instructions(self) -> List[str]:
+        """当前模型下所有未过期条目的归一化指令（用于构建相似度索引）"""
+        if not self.enabled:
+            return []
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT instruction FROM code_cache WHERE model = ? AND created_at >= ?",
+                (self.model, time.time() - self.ttl)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _flush_touched(self):
+        """把内存命中的使用时间批量写回 SQLite（调用方持有锁）"""
+        if not self._touched:
+            return
+        self._db.executemany(
+            "UPDATE code_cache SET last_used = MAX(last_used, ?) WHERE key = ?",
+            [(used, key) for key, used in self._touched.items()]
+        )
+        self._db.commit()
+        self._touched.clear()
+
+    def _remember(self, key: str, code: str, created_at: float):
+        self._memory[key] = (code, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
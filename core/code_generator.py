@@ -1,11 +1,25 @@
 import re
 from pathlib import Path
 from .ai_client import AIClient
+from .code_cache import CodeCache, normalize_instruction
+from .code_safety import CodeSafetyChecker
+from .config_loader import CONFIG
+from .fuzzy_index import FuzzyIndex
+from .geometry import PlanError, parse_plan
+from .metrics import metrics
+from .token_budget import is_simple_instruction
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 PROMPT_PATH = BASE_DIR / "prompts" / "minecraft_prompt.txt"
+COMPACT_PROMPT_PATH = BASE_DIR / "prompts" / "minecraft_prompt_compact.txt"
+PLAN_PROMPT_PATH = BASE_DIR / "prompts" / "minecraft_plan_prompt.txt"
 
 ai = AIClient()
+code_cache = CodeCache()
+fuzzy_index = FuzzyIndex(CONFIG['cache']['fuzzy_threshold'])
+if CONFIG['cache']['fuzzy_enabled']:
+    for text in code_cache.instructions():
+        fuzzy_index.add(text)
 
 
 def extract_python_code(text: str) -> str:
@@ -25,27 +39,115 @@ def extract_python_code(text: str) -> str:
 
     return text.strip()
 
-def load_prompt_template() -> str:
+
+def extract_plan_json(text: str) -> str:
+    """
+    从大模型返回的文本中提取 JSON 建造计划：
+    1. 优先匹配 ```json ... ```
+    2. 其次匹配 ``` ... ```
+    3. 否则取第一个 { 到最后一个 } 之间的内容
+    """
+    match = re.search(r"```(?:json)?\n?(.*?)\n?```", text, re.DOTALL)
+    if match:
+        return match.group(1).strip()
+
+    start, end = text.find("{"), text.rfind("}")
+    if 0 <= start < end:
+        return text[start:end + 1]
+    return text.strip()
+
+
+def plan_mode() -> bool:
+    """prompt.output_mode 为 plan 时让大模型输出 JSON 建造计划，而不是 Python 代码"""
+    return CONFIG['prompt']['output_mode'] == "plan"
+
+
+def is_valid_output(code: str) -> bool:
+    """按当前输出模式检查生成结果，只有通过的结果才写入缓存"""
+    if not plan_mode():
+        return CodeSafetyChecker.is_safe(code)[0]
+    try:
+        parse_plan(code)
+    except PlanError:
+        return False
+    return True
+
+
+def load_prompt_template(compact: bool = False) -> str:
     """
-    从 prompts/minecraft_prompt.txt 读取提示词模板。
-    模板里包含 {instruction} 占位符，用来插入用户指令。
+    读取系统提示词：完整版 prompts/minecraft_prompt.txt，
+    compact 时读取简单指令用的精简版 prompts/minecraft_prompt_compact.txt，
+    建造计划模式读取 prompts/minecraft_plan_prompt.txt。
+    系统提示词不含用户指令，每次请求都相同，服务商可以缓存这段前缀。
     """
-    with open(PROMPT_PATH, "r", encoding="utf-8") as f:
+    path = PLAN_PROMPT_PATH if plan_mode() else COMPACT_PROMPT_PATH if compact else PROMPT_PATH
+    with open(path, "r", encoding="utf-8") as f:
         return f.read()
-def generate_minecraft_code(instruction: str) -> str:
+
+
+def select_prompt(instruction: str) -> str:
+    """按输出模式和指令复杂度选择系统提示词"""
+    if plan_mode():
+        metrics.inc("prompt_variant", variant="plan")
+        return load_prompt_template()
+    compact = is_simple_instruction(instruction)
+    metrics.inc("prompt_variant", variant="compact" if compact else "full")
+    return load_prompt_template(compact)
+
+
+def build_user_message(instruction: str) -> str:
+    return f"用户指令：{instruction}"
+
+
+def lookup_cached_code(instruction: str, template: str) -> str:
+    """先查精确缓存，未命中时再查相似指令；都未命中返回空字符串"""
+    cached = code_cache.get(instruction, template)
+    if cached:
+        print(f"⚡ 命中缓存: {instruction}")
+        metrics.inc("code_cache", result="hit")
+        return cached
+
+    if CONFIG['cache']['fuzzy_enabled']:
+        match = fuzzy_index.lookup(normalize_instruction(instruction))
+        if match:
+            cached = code_cache.get(match[0], template)
+            if cached:
+                print(f"⚡ 命中相似指令: {instruction} ≈ {match[0]} ({match[1]:.2f})")
+                metrics.inc("code_cache", result="fuzzy_hit")
+                return cached
+    metrics.inc("code_cache", result="miss")
+    return ""
+
+
+def remember_code(instruction: str, template: str, code: str):
+    """通过检查的代码（或建造计划）写入缓存和相似度索引"""
+    if is_valid_output(code):
+        code_cache.put(instruction, template, code)
+        fuzzy_index.add(normalize_instruction(instruction))
+
+
+def generate_minecraft_code(instruction: str, use_cache: bool = True) -> str:
     """
     核心函数：
-    1. 读取提示词模板
-    2. 把用户指令填充进模板
-    3. 调用通用 AI 客户端（AIClient）
-    4. 从返回内容中提取 Python 代码
+    1. 按指令复杂度选择系统提示词（完整版或精简版）
+    2. 查询指令缓存，未命中时再查相似指令，命中则直接返回（use_cache 为 False 时跳过，结果仍会写入缓存）
+    3. 系统提示词作为固定前缀，用户指令单独作为 user 消息
+    4. 调用通用 AI 客户端（AIClient）
+    5. 从返回内容中提取 Python 代码（建造计划模式下提取 JSON），通过检查的结果写入缓存
     """
-    template = load_prompt_template()
+    with metrics.span("prompt_build"):
+        template = select_prompt(instruction)
 
-    prompt = template.format(instruction=instruction)
+    cached = lookup_cached_code(instruction, template) if use_cache else ""
+    if cached:
+        return cached
 
-    raw = ai.ask(prompt)
+    raw = ai.ask(build_user_message(instruction), system=template)
 
     if not raw:
         return ""
-    return extract_python_code(raw)
+    with metrics.span("code_extract"):
+        code = extract_plan_json(raw) if plan_mode() else extract_python_code(raw)
+
+    remember_code(instruction, template, code)
+    return code
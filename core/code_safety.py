@@ -1,5 +1,8 @@
 import ast
-from typing import Tuple
+from typing import Tuple, Union
+from .config_loader import CONFIG
+from .cost_estimator import CostEstimate, estimate_cost
+from .primitives import PRIMITIVES
 
 class CodeSafetyChecker:
     """
@@ -9,6 +12,8 @@ class CodeSafetyChecker:
     - 严格限制对象访问（只允许 mc 和 pos）
     - 禁止 import / exec / eval / open / os / sys
     - 禁止函数定义 / 类定义
+    - 只允许调用少量内置函数和 fill_sphere 等形状函数
+    - 静态估算方块量，超出单次请求预算的代码在执行前拒绝
     """
 
     ALLOWED_NODES = {
@@ -50,6 +55,8 @@ class CodeSafetyChecker:
 
     ALLOWED_POS_ATTRS = {'x', 'y', 'z'}
 
+    ALLOWED_FUNCTIONS = {'range', 'len', 'abs', 'min', 'max', 'sum', 'print'} | set(PRIMITIVES)
+
     @staticmethod
     def is_safe(code_str: str) -> Tuple[bool, str]:
         code_str = code_str.strip()
@@ -98,10 +105,34 @@ class CodeSafetyChecker:
                 if isinstance(node.func, ast.Name):
                     if node.func.id in ["eval", "exec", "open", "compile"]:
                         return False, f"禁止函数: {node.func.id}"
+                    if node.func.id not in CodeSafetyChecker.ALLOWED_FUNCTIONS:
+                        return False, f"未知函数: {node.func.id}"
 
                 if isinstance(node.func, ast.Attribute):
                     if isinstance(node.func.value, ast.Name):
                         if node.func.value.id in ["os", "sys"]:
                             return False, f"禁止模块调用: {node.func.value.id}"
 
+        return CodeSafetyChecker.check_budget(tree)
+
+    @staticmethod
+    def estimate_cost(code: Union[str, ast.AST]) -> CostEstimate:
+        """静态估算代码会写入的方块数和写命令数（上界）"""
+        return estimate_cost(code)
+
+    @staticmethod
+    def check_budget(code: Union[str, ast.AST]) -> Tuple[bool, str]:
+        """按 budget 配置检查方块量和调用次数"""
+        budget = CONFIG['budget']
+        try:
+            cost = estimate_cost(code)
+        except RecursionError:
+            return False, "代码嵌套过深，无法估算"
+
+        if cost.blocks > budget['max_blocks']:
+            return False, f"方块数超出预算: 约 {cost.blocks} > {budget['max_blocks']}"
+        if cost.calls > budget['max_calls']:
+            return False, f"写命令数超出预算: 约 {cost.calls} > {budget['max_calls']}"
+        if cost.unbounded and budget['reject_unbounded']:
+            return False, f"无法估算方块量: {cost.unbounded[0]}"
         return True, "安全"
\ No newline at end of file
@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Sequence, Tuple
+from .config_loader import CONFIG
+from .rj_connection import BufferedConnection
+from .voxel_model import Cuboid
+
+
+class WriteConnectionPool:
+    """
+    到同一服务器的多条写连接，只用于发送方块：
+    - RaspberryJuice 为每条连接维护独立的命令队列，多条连接可以在同一 tick 内并行处理
+    - 长方体按所在区块分配到固定连接，同一区块的写入始终走同一条连接、保持顺序
+    - 聊天、坐标查询等仍使用主连接（控制连接）
+    """
+
+    def __init__(self, host: str, port: int, size: int):
+        from mcpi.minecraft import Minecraft
+        self.size = size
+        self.connections = [Minecraft(BufferedConnection(host, port)) for _ in range(size)]
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="mc-write")
+
+    def connection_for(self, cuboid: Cuboid) -> Any:
+        cx, cz = cuboid[0] >> 4, cuboid[2] >> 4
+        return self.connections[(cx * 31 + cz) % self.size]
+
+    def shard(self, cuboids: Sequence[Cuboid]) -> List[Tuple[Any, List[Cuboid]]]:
+        """按区块把长方体分到各连接，返回 [(连接, 长方体列表)]，保持原有顺序"""
+        groups = {}
+        for cuboid in cuboids:
+            conn = self.connection_for(cuboid)
+            groups.setdefault(id(conn), (conn, []))[1].append(cuboid)
+        return list(groups.values())
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        for mc in self.connections:
+            try:
+                mc.conn.close()
+            except Exception:
+                pass
+
+
+_pool: Optional[WriteConnectionPool] = None
+_pool_failed = False
+_pool_lock = threading.Lock()
+
+
+def get_write_pool() -> Optional[WriteConnectionPool]:
+    """
+    返回共享的写连接池；minecraft.write_connections 不大于 1 或连接失败时返回 None，
+    调用方改用主连接发送
+    """
+    global _pool, _pool_failed
+    size = CONFIG['minecraft']['write_connections']
+    if size <= 1:
+        return None
+
+    with _pool_lock:
+        if _pool is None and not _pool_failed:
+            try:
+                _pool = WriteConnectionPool(CONFIG['minecraft']['host'], CONFIG['minecraft']['port'], size)
+                print(f"🔌 已建立 {size} 条写连接")
+            except Exception as e:
+                # 连接失败后不再反复尝试，直到 reset_write_pool
+                _pool_failed = True
+                print(f"⚠️ 建立写连接失败，改用主连接: {e}")
+        return _pool
+
+
+def reset_write_pool():
+    """关闭写连接池，下次使用时重新连接（主连接重连或某条写连接出错时调用）"""
+    global _pool, _pool_failed
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+        _pool_failed = False
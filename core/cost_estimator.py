@@ -0,0 +1,347 @@
+import ast
+import itertools
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+from .primitives import PRIMITIVES, bind_args, estimate_volume
+
+
+class Affine:
+    """
+    符号化的线性表达式：const + Σ coeff * symbol。
+    pos.x、循环变量等未知量作为符号保留，这样 (cx+20) - (cx-20) 仍能算出常数 40。
+    """
+
+    __slots__ = ("const", "terms")
+
+    def __init__(self, const: float = 0.0, terms: Dict[str, float] = None):
+        self.const = const
+        self.terms = terms or {}
+
+    @staticmethod
+    def symbol(name: str) -> "Affine":
+        return Affine(0.0, {name: 1.0})
+
+    @property
+    def is_const(self) -> bool:
+        return not self.terms
+
+    def __add__(self, other: "Affine") -> "Affine":
+        terms = dict(self.terms)
+        for name, coeff in other.terms.items():
+            terms[name] = terms.get(name, 0.0) + coeff
+            if terms[name] == 0:
+                del terms[name]
+        return Affine(self.const + other.const, terms)
+
+    def scale(self, k: float) -> "Affine":
+        if k == 0:
+            return Affine(0.0)
+        return Affine(self.const * k, {n: c * k for n, c in self.terms.items()})
+
+    def __sub__(self, other: "Affine") -> "Affine":
+        return self + other.scale(-1)
+
+
+Value = Optional[Affine]
+
+
+@dataclass
+class CostEstimate:
+    """静态估算结果：blocks / calls 是上界，unbounded 记录无法估算的位置"""
+    blocks: int = 0
+    calls: int = 0
+    unbounded: List[str] = field(default_factory=list)
+
+    def add(self, other: "CostEstimate", times: int = 1):
+        self.blocks += other.blocks * times
+        self.calls += other.calls * times
+        self.unbounded.extend(other.unbounded)
+
+
+WRITE_CALLS = {"setBlock", "setBlocks"}
+
+
+class CostEstimator:
+    """
+    对生成代码做 AST 级的方块量估算：
+    - 表达式按线性符号求值，能常量折叠的部分得到确切数值
+    - for 循环的迭代次数来自 range() 参数（或字面量列表长度）；
+      循环变量表示为 start + k * step，k ∈ [0, 次数-1]，体积按区间取最大值
+    - if 两个分支取较大者
+    - mc.setBlocks 的体积 = 三个方向坐标差的乘积；setBlock 计 1 个方块
+    - fill_sphere 等形状函数按包围盒体积计
+    """
+
+    def __init__(self):
+        self._fresh = itertools.count()
+        # 有取值范围的符号（循环计数器），用于估算随循环变量变化的 setBlocks 体积
+        self._bounds: Dict[str, tuple] = {}
+
+    def estimate(self, tree: Union[ast.AST, str]) -> CostEstimate:
+        if isinstance(tree, str):
+            tree = ast.parse(tree)
+        return self._block(tree.body, {})
+
+    def _new_symbol(self, name: str) -> Affine:
+        return Affine.symbol(f"{name}#{next(self._fresh)}")
+
+    # ---------- 语句 ----------
+
+    def _block(self, body: List[ast.stmt], env: Dict[str, Value]) -> CostEstimate:
+        cost = CostEstimate()
+        for stmt in body:
+            cost.add(self._stmt(stmt, env))
+        return cost
+
+    def _stmt(self, stmt: ast.stmt, env: Dict[str, Value]) -> CostEstimate:
+        if isinstance(stmt, ast.Assign):
+            value = self._expr(stmt.value, env)
+            for target in stmt.targets:
+                for name in self._target_names(target):
+                    env[name] = value if isinstance(target, ast.Name) else None
+            return self._calls_in(stmt.value, env)
+
+        if isinstance(stmt, ast.Expr):
+            return self._calls_in(stmt.value, env)
+
+        if isinstance(stmt, ast.For):
+            return self._for(stmt, env)
+
+        if isinstance(stmt, ast.If):
+            cost = self._calls_in(stmt.test, env)
+            body_env, else_env = dict(env), dict(env)
+            body = self._block(stmt.body, body_env)
+            orelse = self._block(stmt.orelse, else_env)
+            cost.blocks += max(body.blocks, orelse.blocks)
+            cost.calls += max(body.calls, orelse.calls)
+            cost.unbounded.extend(body.unbounded + orelse.unbounded)
+            for name in set(body_env) | set(else_env):
+                if body_env.get(name) is not env.get(name) or else_env.get(name) is not env.get(name):
+                    env[name] = self._new_symbol(name)
+            return cost
+
+        return CostEstimate()
+
+    def _for(self, stmt: ast.For, env: Dict[str, Value]) -> CostEstimate:
+        trips, start, step = self._range(stmt.iter, env)
+
+        # 循环体内被赋值的变量每轮都可能不同，进入循环前换成新符号
+        assigned = {name for node in ast.walk(stmt) for name in self._assigned_names(node)}
+        for name in assigned:
+            env[name] = self._new_symbol(name)
+
+        if trips and start is not None and isinstance(stmt.target, ast.Name):
+            counter = self._new_symbol("k")
+            self._bounds[next(iter(counter.terms))] = (0, trips - 1)
+            env[stmt.target.id] = start + counter.scale(step)
+
+        body = self._block(stmt.body, env)
+        for name in assigned:
+            env[name] = self._new_symbol(name)
+
+        cost = self._calls_in(stmt.iter, env)
+        if trips is None:
+            cost.unbounded.append(f"第 {stmt.lineno} 行循环次数无法确定")
+            cost.unbounded.extend(body.unbounded)
+            return cost
+        cost.add(body, trips)
+        return cost
+
+    def _range(self, node: ast.expr, env: Dict[str, Value]) -> tuple:
+        """返回 (迭代次数, 起始值, 步长)；无法确定的部分为 None"""
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return len(node.elts), None, None
+
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "range"):
+            return None, None, None
+
+        args = [self._expr(a, env) for a in node.args]
+        if any(a is None for a in args) or not 1 <= len(args) <= 3:
+            return None, None, None
+
+        start, stop, step = Affine(0.0), args[0], Affine(1.0)
+        if len(args) >= 2:
+            start, stop = args[0], args[1]
+        if len(args) == 3:
+            step = args[2]
+
+        span = stop - start
+        if not span.is_const or not step.is_const or int(step.const) == 0:
+            return None, None, None
+        return max(0, -(-int(span.const) // int(step.const))), start, step.const
+
+    @staticmethod
+    def _target_names(target: ast.expr) -> List[str]:
+        return [n.id for n in ast.walk(target) if isinstance(n, ast.Name)]
+
+    def _assigned_names(self, node: ast.AST) -> List[str]:
+        if isinstance(node, ast.Assign):
+            return [name for t in node.targets for name in self._target_names(t)]
+        if isinstance(node, ast.For):
+            return self._target_names(node.target)
+        return []
+
+    # ---------- 调用 ----------
+
+    def _calls_in(self, node: ast.expr, env: Dict[str, Value]) -> CostEstimate:
+        cost = CostEstimate()
+        for call in ast.walk(node):
+            if isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and call.func.id in PRIMITIVES:
+                cost.add(self._primitive(call, env))
+                continue
+            if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Attribute):
+                continue
+            if not (isinstance(call.func.value, ast.Name) and call.func.value.id == "mc"):
+                continue
+            if call.func.attr not in WRITE_CALLS:
+                continue
+
+            cost.calls += 1
+            if call.func.attr == "setBlock":
+                cost.blocks += 1
+                continue
+
+            volume = self._volume(call.args, env)
+            if volume is None:
+                cost.unbounded.append(f"第 {call.lineno} 行 setBlocks 体积无法确定")
+            else:
+                cost.blocks += volume
+        return cost
+
+    def _primitive(self, call: ast.Call, env: Dict[str, Value]) -> CostEstimate:
+        cost = CostEstimate(calls=1)
+        name = call.func.id
+        try:
+            if any(isinstance(a, ast.Starred) for a in call.args) or any(k.arg is None for k in call.keywords):
+                raise TypeError("参数无法展开")
+            args = bind_args(name, tuple(call.args), {k.arg: k.value for k in call.keywords})
+        except TypeError:
+            cost.unbounded.append(f"第 {call.lineno} 行 {name} 参数无法确定")
+            return cost
+
+        def value(param: str) -> Value:
+            node = args[param]
+            return self._expr(node, env) if isinstance(node, ast.expr) else Affine(float(node))
+
+        def span(a: str, b: str) -> Optional[float]:
+            lo, hi = value(a), value(b)
+            return None if lo is None or hi is None else self._max_abs(hi - lo)
+
+        def size(param: str) -> Optional[float]:
+            v = value(param)
+            return None if v is None else self._max_abs(v)
+
+        volume = estimate_volume(name, span, size)
+        if volume is None:
+            cost.unbounded.append(f"第 {call.lineno} 行 {name} 尺寸无法确定")
+        else:
+            cost.blocks += volume
+        return cost
+
+    def _volume(self, args: List[ast.expr], env: Dict[str, Value]) -> Optional[int]:
+        if len(args) < 7 or any(isinstance(a, ast.Starred) for a in args):
+            return None
+        coords = [self._expr(a, env) for a in args[:6]]
+        volume = 1
+        for lo, hi in zip(coords[:3], coords[3:]):
+            if lo is None or hi is None:
+                return None
+            span = self._max_abs(hi - lo)
+            if span is None:
+                return None
+            volume *= int(span) + 1
+        return volume
+
+    def _max_abs(self, value: Affine) -> Optional[float]:
+        """线性表达式在各符号取值范围内的最大绝对值；有无界符号时返回 None"""
+        lo = hi = value.const
+        for name, coeff in value.terms.items():
+            bounds = self._bounds.get(name)
+            if bounds is None:
+                return None
+            a, b = coeff * bounds[0], coeff * bounds[1]
+            lo += min(a, b)
+            hi += max(a, b)
+        return max(abs(lo), abs(hi))
+
+    # ---------- 表达式 ----------
+
+    def _expr(self, node: ast.expr, env: Dict[str, Value]) -> Value:
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                return None
+            return Affine(float(node.value))
+
+        if isinstance(node, ast.Name):
+            if node.id not in env:
+                env[node.id] = self._new_symbol(node.id)
+            return env[node.id]
+
+        if isinstance(node, ast.Attribute):
+            if isinstance(node.value, ast.Name) and node.value.id == "pos":
+                return Affine.symbol(f"pos.{node.attr}")
+            return None
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._expr(node.operand, env)
+            if operand is None:
+                return None
+            if isinstance(node.op, ast.USub):
+                return operand.scale(-1)
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            return None
+
+        if isinstance(node, ast.BinOp):
+            return self._binop(node, env)
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            if node.func.id in ("min", "max", "abs") and node.args:
+                args = [self._expr(a, env) for a in node.args]
+                if all(a is not None and a.is_const for a in args):
+                    values = [a.const for a in args]
+                    return Affine(float({"min": min, "max": max, "abs": abs}[node.func.id](*values)))
+            return None
+
+        return None
+
+    def _binop(self, node: ast.BinOp, env: Dict[str, Value]) -> Value:
+        left = self._expr(node.left, env)
+        right = self._expr(node.right, env)
+        if left is None or right is None:
+            return None
+
+        op = node.op
+        if isinstance(op, ast.Add):
+            return left + right
+        if isinstance(op, ast.Sub):
+            return left - right
+        if isinstance(op, ast.Mult):
+            if left.is_const:
+                return right.scale(left.const)
+            if right.is_const:
+                return left.scale(right.const)
+            return None
+
+        if not right.is_const or right.const == 0:
+            return None
+        if isinstance(op, ast.Div):
+            return left.scale(1 / right.const)
+        if isinstance(op, ast.FloorDiv):
+            if left.is_const:
+                return Affine(float(left.const // right.const))
+            # 整除只带来不超过 1 的误差，按普通除法近似
+            return left.scale(1 / right.const)
+        if left.is_const:
+            try:
+                if isinstance(op, ast.Mod):
+                    return Affine(float(left.const % right.const))
+                if isinstance(op, ast.Pow) and abs(right.const) <= 64:
+                    return Affine(float(left.const ** right.const))
+            except (OverflowError, ZeroDivisionError):
+                return None
+        return None
+
+
+def estimate_cost(code: Union[ast.AST, str]) -> CostEstimate:
+    return CostEstimator().estimate(code)
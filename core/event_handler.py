@@ -1,8 +1,16 @@
 import time
 import socket
+import threading
+from functools import partial
+from .chat_poller import chat_poller
+from .chunk_cache import WORLD_CACHE
 from .config_loader import CONFIG
-from .code_generator import generate_minecraft_code
-from .executor import execute_code_safely
+from .connection_pool import reset_write_pool
+from .metrics import metrics, start_metrics_server
+from .sandbox import get_sandbox_pool, shutdown_sandbox_pool
+from .schematic import SchematicError, parse_paste_options, paste_schematic, save_last_build, schematics
+from .snapshot import undo_last_build
+from .worker_pool import CommandDispatcher
 
 HELP_MESSAGE = (
     "🤖 AI Minecraft 助手\n"
@@ -11,29 +19,36 @@ HELP_MESSAGE = (
     "   \\ai 在我面前放一个钻石块\n"
     "   \\ai 以我为中心建一个 5x5 的石头平台\n"
     "   \\ai 显示我的坐标\n"
+    "📋 输入 \"\\ai status\" 查看自己的任务和排队情况\n"
+    "🛑 输入 \"\\ai cancel\" 取消自己的所有任务，\"\\ai cancel <编号>\" 取消单个任务\n"
+    "⏪ 输入 \"\\ai undo\" 撤销上一次建造\n"
+    "💾 输入 \"\\ai save <名字>\" 把上一次建造存为蓝图，\"\\ai paste <名字> [90|180|270] [mirror x|z]\" 在脚下粘贴\n"
     "🔒 安全机制：所有代码经过严格检查\n"
     f"🔧 当前模型: {CONFIG['ai']['model']}\n"
     "ℹ️ 输入 \"\\ai help\" 查看帮助"
 )
 
-def start_event_loop(mc):
+def start_event_loop(mc, stop_event: threading.Event = None):
+    """轮询聊天栏并分发指令；传入 stop_event 时在其被设置后退出（基准测试使用）"""
     print("🚀 AI Minecraft 助手已启动，等待指令...")
     print(HELP_MESSAGE)
     mc.postToChat("✅ AI 助手已就绪，输入 \\ai help 查看帮助。")
+    start_metrics_server()
+    # 启动时预先创建沙箱进程，第一条指令不必等待进程启动
+    get_sandbox_pool()
 
-    last_command_time = {}
+    # 生成和执行都在线程池中进行，轮询不会被一次慢请求卡住
+    dispatcher = CommandDispatcher()
 
-    while True:
+    while stop_event is None or not stop_event.is_set():
         try:
-            events = mc.events.pollChatPosts()
-            current_time = time.time()
+            events = chat_poller.poll(mc, active=dispatcher.busy())
 
             for event in events:
                 msg = event.message.strip()
-                sender_name = "玩家"
-
                 if not msg.startswith(CONFIG['system']['command_prefix']):
                     continue
+                sender_name = chat_poller.sender_name(mc, event.entityId)
 
                 command = msg[len(CONFIG['system']['command_prefix']):].strip()
                 if not command:
@@ -44,27 +59,71 @@ def start_event_loop(mc):
                     mc.postToChat(HELP_MESSAGE)
                     continue
 
-                if sender_name in last_command_time:
-                    if current_time - last_command_time[sender_name] < CONFIG['system']['debounce_time']:
-                        mc.postToChat("⏳ 请稍等，正在处理上一个请求...")
+                words = command.split()
+                if words[0].lower() == "cancel" and len(words) <= 2:
+                    target = words[1].lstrip("#") if len(words) == 2 else None
+                    if target is not None and not target.isdigit():
+                        mc.postToChat("📌 用法：\\ai cancel 或 \\ai cancel <任务编号>")
+                        continue
+                    cancelled = dispatcher.cancel(sender_name, int(target) if target else None)
+                    if cancelled:
+                        mc.postToChat(f"🛑 正在取消任务 {', '.join(f'#{job.id}' for job in cancelled)}...")
+                    else:
+                        mc.postToChat("ℹ️ 没有可以取消的任务。")
+                    continue
+
+                if command.lower() == "status":
+                    for line in dispatcher.scheduler.status(sender_name):
+                        mc.postToChat(line)
+                    continue
+
+                if command.lower() == "undo":
+                    if dispatcher.submit_task(mc, sender_name, "撤销", undo_last_build) is None:
+                        mc.postToChat("⏳ 你排队的任务已达上限，请稍后再撤销。")
+                    continue
+
+                if words[0].lower() == "save" and len(words) == 2:
+                    name = words[1]
+                    job = dispatcher.submit_task(mc, sender_name, f"保存蓝图 {name}",
+                                                 partial(save_last_build, name=name))
+                    if job is None:
+                        mc.postToChat("⏳ 你排队的任务已达上限，请稍后再保存。")
+                    continue
+
+                if words[0].lower() == "paste":
+                    if len(words) == 1:
+                        names = schematics.names()
+                        mc.postToChat(f"📚 已保存的蓝图: {', '.join(names)}" if names else "ℹ️ 还没有保存的蓝图。")
+                        continue
+                    try:
+                        rotation, mirror = parse_paste_options(words[2:])
+                    except SchematicError as e:
+                        mc.postToChat(f"📌 {e}。用法：\\ai paste <名字> [90|180|270] [mirror x|z]")
                         continue
-                last_command_time[sender_name] = current_time
+                    name = words[1]
+                    job = dispatcher.submit_task(mc, sender_name, f"粘贴蓝图 {name}",
+                                                 partial(paste_schematic, name=name, rotation=rotation, mirror=mirror))
+                    if job is None:
+                        mc.postToChat("⏳ 你排队的任务已达上限，请稍后再粘贴。")
+                    continue
 
                 if len(command) > CONFIG['system']['max_prompt_length']:
                     mc.postToChat("⚠️ 指令过长，请简化。")
                     continue
 
-                mc.postToChat(f"🧠 正在处理: {command}")
-                print(f"👤 用户请求: {command}")
-
-                code = generate_minecraft_code(command)
-                if code:
-                    execute_code_safely(code, mc, sender_name)
-                else:
-                    mc.postToChat("未能生成有效代码，请重试。")
+                print(f"👤 {sender_name} 请求: {command}")
+                metrics.inc("commands")
+                job = dispatcher.submit(mc, sender_name, command)
+                if job is None:
+                    mc.postToChat(f"⏳ 你已有 {CONFIG['scheduler']['max_queued_per_player']} 个任务在排队，请稍后再试。")
+                elif job.started is None:
+                    mc.postToChat(f"🕒 已排队: {command}（任务 #{job.id}，输入 \\ai status 查看进度）")
 
         except socket.error as e:
             print(f"Minecraft 连接中断: {e}")
+            reset_write_pool()
+            WORLD_CACHE.clear()
+            chat_poller.reset()
             from .mc_connection import create_minecraft_connection
             mc = create_minecraft_connection()
             if mc is None:
@@ -76,4 +135,7 @@ def start_event_loop(mc):
             print(f"⚠主循环异常: {e}")
             time.sleep(1)
 
-        time.sleep(CONFIG['system']['poll_interval'])
+        chat_poller.wait(stop_event)
+
+    dispatcher.shutdown()
+    shutdown_sandbox_pool()
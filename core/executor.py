@@ -1,13 +1,39 @@
+import threading
 from typing import Any
+from mcpi.minecraft import intFloor
+from .block_batcher import BlockRecorder
+from .block_ops import BlockOps
+from .block_writer import WriteCancelled, block_writer
 from .code_safety import CodeSafetyChecker
+from .config_loader import CONFIG
+from .geometry import PlanError, parse_plan, plan_to_ops
+from .metrics import metrics
+from .sandbox import SandboxError, create_interpreter
+from .schematic import schematics
+from .snapshot import snapshots
 
-def execute_code_safely(code: str, mc: Any, player_name: str = "玩家"):
+
+def send_ops(ops: BlockOps, mc: Any, player_name: str = "玩家", cancel: threading.Event = None) -> int:
+    """把 IR 发送到世界：开启 coalesce_writes 时先合并、比对，再交给限速写入器；cancel 为任务的取消事件"""
+    if not len(ops):
+        return 0
+    if not CONFIG['builder']['coalesce_writes']:
+        return block_writer.write(mc, list(ops), player_name, cancel=cancel)
+
+    recorder = BlockRecorder(mc, player_name=player_name, cancel=cancel)
+    ops.apply(recorder)
+    return recorder.flush()
+
+
+def execute_code_safely(code: str, mc: Any, player_name: str = "玩家", cancel: threading.Event = None):
     if not code.strip():
         mc.postToChat("⚠️ 未生成有效代码。")
         return
 
-    is_safe, reason = CodeSafetyChecker.is_safe(code)
+    with metrics.span("safety_check"):
+        is_safe, reason = CodeSafetyChecker.is_safe(code)
     if not is_safe:
+        metrics.inc("safety_rejections")
         mc.postToChat(f"🚫 安全拒绝: {reason}")
         print(f"🚫 拒绝执行: {reason}")
         return
@@ -17,29 +43,102 @@ def execute_code_safely(code: str, mc: Any, player_name: str = "玩家"):
     print(code)
 
     try:
-        pos = mc.player.getPos()
+        with metrics.span("position_fetch"):
+            pos = mc.player.getPos()
     except Exception as e:
         mc.postToChat("❌ 无法获取玩家位置，请稍后再试。")
         print(f"获取位置失败: {e}")
         return
 
-    safe_globals = {
-        "mc": mc,
-        "pos": pos,
-        "range": range,
-        "len": len,
-        "abs": abs,
-        "min": min,
-        "max": max,
-        "sum": sum,
-        "print": lambda x: mc.postToChat(f" {x}")
-    }
-
+    # 代码先在解释器里运行成方块操作列表，不经过 exec，也不直接访问网络；
+    # 开启 sandbox 时解释器在独立进程中运行，超时或超内存会被直接终止
     try:
-        exec(code, safe_globals)
-        mc.postToChat("执行成功！")
-        print("执行成功")
+        interpreter = create_interpreter(mc, pos)
+    except SandboxError as e:
+        mc.postToChat(f"❌ {e}，请稍后再试。")
+        print(f"创建沙箱会话失败: {e}")
+        return
+    error = None
+    try:
+        with metrics.span("interpret"):
+            interpreter.run(code)
     except Exception as e:
         error = f"执行失败: {type(e).__name__}: {e}"
+    finally:
+        interpreter.close()
+
+    commit_ops(interpreter.ops, mc, player_name, error, tuple(intFloor(pos.x, pos.y, pos.z)), cancel)
+
+
+def execute_plan_safely(plan_text: str, mc: Any, player_name: str = "玩家", cancel: threading.Event = None):
+    """JSON 建造计划模式：校验计划，按玩家位置光栅化成长方体后发送"""
+    if not plan_text.strip():
+        mc.postToChat("⚠️ 未生成有效代码。")
+        return
+
+    with metrics.span("safety_check"):
+        try:
+            shapes = parse_plan(plan_text)
+        except PlanError as e:
+            metrics.inc("safety_rejections")
+            mc.postToChat(f"🚫 安全拒绝: 建造计划无效: {e}")
+            print(f"🚫 拒绝执行: {e}")
+            return
+
+    mc.postToChat("⚙️ 正在执行...")
+    print(f"⚙️ 执行建造计划: {len(shapes)} 个形状")
+
+    try:
+        with metrics.span("position_fetch"):
+            pos = mc.player.getPos()
+    except Exception as e:
+        mc.postToChat("❌ 无法获取玩家位置，请稍后再试。")
+        print(f"获取位置失败: {e}")
+        return
+
+    origin = tuple(intFloor(pos.x, pos.y, pos.z))
+    try:
+        with metrics.span("rasterize"):
+            ops = plan_to_ops(shapes, origin)
+    except PlanError as e:
+        mc.postToChat(f"🚫 安全拒绝: {e}")
+        print(f"🚫 拒绝写入: {e}")
+        return
+
+    commit_ops(ops, mc, player_name, origin=origin, cancel=cancel)
+
+
+def commit_ops(ops: BlockOps, mc: Any, player_name: str = "玩家", error: str = None, origin: tuple = None,
+               cancel: threading.Event = None):
+    """
+    按预算兜底检查、保存快照并发送方块；error 为生成代码运行时的错误，在发送后报告。
+    传入 origin（玩家所在方块）时记下这次建造，供 \\ai save 保存为蓝图。
+    """
+    max_blocks = CONFIG['budget']['max_blocks']
+    if ops.volume() > max_blocks:
+        # 静态估算无法确定的代码，在这里按实际方块数兜底
+        mc.postToChat(f"🚫 安全拒绝: 方块数超出预算: {ops.volume()} > {max_blocks}")
+        print(f"🚫 拒绝写入: {len(ops)} 条操作，{ops.volume()} 个方块")
+        return
+
+    # 写入前保存受影响区域，供 \ai undo 恢复
+    with metrics.span("snapshot"):
+        snapshots.capture(mc, ops.bounds(), player_name)
+
+    # 与直接执行保持一致：出错前已经放下的方块仍然生效
+    try:
+        with metrics.span("send_blocks"):
+            send_ops(ops, mc, player_name, cancel)
+    except WriteCancelled as e:
+        mc.postToChat(f"🛑 建造已取消，{e}")
+        print(f"🛑 建造已取消: {e}")
+        return
+    if origin is not None:
+        schematics.remember(player_name, ops, origin)
+
+    if error:
         mc.postToChat(error)
         print(error)
+        return
+    mc.postToChat("执行成功！")
+    print("执行成功")
@@ -0,0 +1,188 @@
+import math
+import re
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+NGRAM_SIZES = (1, 2, 3)
+# 生成候选文档时最多展开的倒排表长度，其余 n-gram 只对候选做二分查找
+CANDIDATE_BUDGET = 500
+
+# 不影响生成结果的客套话和位置描述（代码本来就基于玩家位置）
+FILLER_WORDS = (
+    "请", "帮我", "给我", "一下", "在我面前", "在我前面", "我面前", "我前面",
+    "吧", "啊", "呀", "哦", "呢", "嘛",
+)
+FILLER_NUMERAL = re.compile(r"一(?=[个座块栋间排根条面])")
+
+
+def canonicalize(text: str) -> str:
+    """去掉填充词，让 “放一个金块” 和 “请在我面前放个金块” 落到同一文本"""
+    for word in FILLER_WORDS:
+        text = text.replace(word, "")
+    return FILLER_NUMERAL.sub("", text)
+
+
+def char_ngrams(text: str) -> set:
+    grams = set()
+    for n in NGRAM_SIZES:
+        for i in range(len(text) - n + 1):
+            grams.add(text[i:i + n])
+    return grams
+
+
+class FuzzyIndex:
+    """
+    本地指令相似度索引（无外部服务）：
+    - 文档向量：去掉填充词后的字符 1~3-gram TF-IDF（二值词频）
+    - 倒排表：每个 n-gram 对应一个有序 int32 数组
+    - 查询：用最稀有的几个 n-gram 生成候选文档，再一次性取出候选文档的全部 n-gram，
+      与查询 n-gram 做向量化二分匹配并按文档分段求和；耗时只与候选数有关，和索引总量基本无关
+    - 指令中的数字必须完全一致，避免把 “5x5 平台” 匹配成 “7x7 平台”
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.hits = 0
+
+        self._lock = threading.Lock()
+        self._docs: List[str] = []
+        self._originals: List[str] = []
+        self._doc_ids: Dict[str, int] = {}
+        self._digits: List[Tuple[str, ...]] = []
+
+        self._vocab: Dict[str, int] = {}
+        self._postings: List[array] = []
+        self._df = array("i")
+
+        # 按文档顺序排列的 (文档, n-gram) 对（CSR），用来向量化计算范数和候选得分
+        self._pair_docs = array("i")
+        self._pair_grams = array("i")
+        self._doc_start = array("i")
+        self._doc_len = array("i")
+        # 以 n-gram 编号为下标的查询权重表，查询结束后清零复用
+        self._query_weights = np.zeros(0)
+        self._norms = np.zeros(0)
+        self._norms_size = 0
+        self._norm_pairs = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, text: str):
+        """加入一条（已归一化的）指令，去掉填充词后重复的会被忽略"""
+        original, text = text, canonicalize(text)
+        if not text:
+            return
+        with self._lock:
+            if text in self._doc_ids:
+                return
+            doc = len(self._docs)
+            self._docs.append(text)
+            self._originals.append(original)
+            self._doc_ids[text] = doc
+            self._digits.append(tuple(re.findall(r"\d+", text)))
+            self._doc_start.append(len(self._pair_docs))
+            grams = char_ngrams(text)
+            self._doc_len.append(len(grams))
+
+            for gram in grams:
+                gid = self._vocab.get(gram)
+                if gid is None:
+                    gid = len(self._postings)
+                    self._vocab[gram] = gid
+                    self._postings.append(array("i"))
+                    self._df.append(0)
+                self._postings[gid].append(doc)
+                self._df[gid] += 1
+                self._pair_docs.append(doc)
+                self._pair_grams.append(gid)
+
+    def _idf(self, df: np.ndarray, n: int) -> np.ndarray:
+        return np.log1p(n / df)
+
+    def _refresh_norms(self, n: int):
+        """
+        补齐文档范数：新增文档按当前 IDF 计算；
+        文档数比上次全量计算时增长超过 10% 时，按新的 IDF 全部重算
+        """
+        df = np.frombuffer(self._df, dtype=np.int32).astype(np.float64)
+        idf2 = self._idf(df, n) ** 2
+        docs = np.frombuffer(self._pair_docs, dtype=np.int32)
+        grams = np.frombuffer(self._pair_grams, dtype=np.int32)
+
+        if self._norms_size and n <= self._norms_size * 1.1:
+            done = len(self._norms)
+            start = self._norm_pairs
+            tail = np.bincount(docs[start:] - done, weights=idf2[grams[start:]], minlength=n - done)
+            self._norms = np.concatenate([self._norms, np.sqrt(tail)])
+        else:
+            self._norms = np.sqrt(np.bincount(docs, weights=idf2[grams], minlength=n))
+            self._norms_size = n
+        self._norm_pairs = len(docs)
+
+    def lookup(self, text: str) -> Optional[Tuple[str, float]]:
+        """返回最相似的已有指令（加入时的原文）及余弦相似度；低于阈值时返回 None"""
+        text = canonicalize(text)
+        with self._lock:
+            n = len(self._docs)
+            if not text or n == 0:
+                return None
+
+            exact = self._doc_ids.get(text)
+            if exact is not None:
+                self.hits += 1
+                return self._originals[exact], 1.0
+
+            if len(self._norms) != n:
+                self._refresh_norms(n)
+
+            known, q_norm2 = [], 0.0
+            for gram in char_ngrams(text):
+                gid = self._vocab.get(gram)
+                df = self._df[gid] if gid is not None else 1
+                w = math.log1p(n / df) ** 2
+                q_norm2 += w
+                if gid is not None:
+                    known.append((df, w, gid))
+            if not known:
+                return None
+
+            # 1. 最稀有的 n-gram 生成候选
+            known.sort()
+            seeds, budget = [], 0
+            for df, _, gid in known:
+                if seeds and budget + df > CANDIDATE_BUDGET:
+                    break
+                seeds.append(np.frombuffer(self._postings[gid], dtype=np.int32))
+                budget += df
+            candidates = np.unique(np.concatenate(seeds))
+
+            # 2. 取出候选文档的全部 n-gram，查权重表后按文档分段求和
+            if len(self._query_weights) < len(self._postings):
+                self._query_weights = np.zeros(len(self._postings) * 2)
+            q_grams = [gid for _, _, gid in known]
+            self._query_weights[q_grams] = [w for _, w, _ in known]
+
+            starts = np.frombuffer(self._doc_start, dtype=np.int32)[candidates]
+            lengths = np.frombuffer(self._doc_len, dtype=np.int32)[candidates]
+            offsets = np.cumsum(lengths) - lengths
+            entries = np.repeat(starts - offsets, lengths) + np.arange(int(offsets[-1] + lengths[-1]))
+            grams = np.frombuffer(self._pair_grams, dtype=np.int32)[entries]
+            scores = np.add.reduceat(self._query_weights[grams], offsets)
+            self._query_weights[q_grams] = 0.0
+            scores /= self._norms[candidates] * math.sqrt(q_norm2) + 1e-12
+
+            digits = tuple(re.findall(r"\d+", text))
+            k = min(5, len(scores))
+            top = np.argpartition(scores, -k)[-k:]
+            for i in top[np.argsort(scores[top])[::-1]]:
+                score = float(scores[i])
+                if score < self.threshold:
+                    break
+                doc = int(candidates[i])
+                if self._digits[doc] == digits:
+                    self.hits += 1
+                    return self._originals[doc], score
+            return None
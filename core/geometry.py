@@ -0,0 +1,239 @@
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from .block_ops import BlockOps
+from .config_loader import CONFIG
+from .voxel_model import Cuboid, VoxelRegion
+
+
+class PlanError(ValueError):
+    """建造计划格式错误或超出限制"""
+    pass
+
+
+Shape = Dict[str, Any]
+Box = Tuple[int, int, int, int, int, int]
+
+
+def _grid(box: Box):
+    """包围盒内各格子相对 (x0, y0, z0) 的坐标，按 (y, x, z) 广播"""
+    x0, y0, z0, x1, y1, z1 = box
+    return np.ogrid[0:y1 - y0 + 1, 0:x1 - x0 + 1, 0:z1 - z0 + 1]
+
+
+def _disk(dx: np.ndarray, dz: np.ndarray, radius: int) -> np.ndarray:
+    # 半径放宽半格，和游戏里常见的像素圆一致，不会出现单个尖角
+    return dx * dx + dz * dz <= radius * radius + radius
+
+
+def _ball(dx: np.ndarray, dy: np.ndarray, dz: np.ndarray, radius: int) -> np.ndarray:
+    return dx * dx + dy * dy + dz * dz <= radius * radius + radius
+
+
+# ---------- 各基本形状：返回 [(包围盒, 掩码, 方块 ID, data)]，按顺序写入，后写覆盖先写 ----------
+
+def _box(s: Shape) -> list:
+    box = _corners(s)
+    return [(box, np.ones(_shape(box), dtype=bool), s["block"], s["data"])]
+
+
+def _hollow_box(s: Shape) -> list:
+    """外壳为方块、内部为空气；open_top 时不封顶（屋顶另行生成）"""
+    box = _corners(s)
+    y, x, z = _grid(box)
+    ny, nx, nz = _shape(box)
+    inner = (x > 0) & (x < nx - 1) & (z > 0) & (z < nz - 1) & (y > 0)
+    if not s.get("open_top"):
+        inner = inner & (y < ny - 1)
+    inner = np.broadcast_to(inner, (ny, nx, nz))
+    return [(box, ~inner, s["block"], s["data"]), (box, inner, 0, 0)]
+
+
+def _wall_ring(s: Shape) -> list:
+    """只有四面墙，不动内部和顶底"""
+    box = _corners(s)
+    _, x, z = _grid(box)
+    ny, nx, nz = _shape(box)
+    ring = (x == 0) | (x == nx - 1) | (z == 0) | (z == nz - 1)
+    return [(box, np.broadcast_to(ring, (ny, nx, nz)), s["block"], s["data"])]
+
+
+def _cylinder(s: Shape) -> list:
+    """竖直圆柱，center 为底面圆心；hollow 时只保留一格厚的外壁，内部为空气"""
+    cx, cy, cz = s["center"]
+    r, h = s["radius"], s["height"]
+    box = (cx - r, cy, cz - r, cx + r, cy + h - 1, cz + r)
+    _, x, z = _grid(box)
+    ny, nx, nz = _shape(box)
+    disk = np.broadcast_to(_disk(x - r, z - r, r), (ny, nx, nz))
+    if not s.get("hollow") or r < 1:
+        return [(box, disk, s["block"], s["data"])]
+    inner = np.broadcast_to(_disk(x - r, z - r, r - 1), (ny, nx, nz))
+    return [(box, disk & ~inner, s["block"], s["data"]), (box, inner, 0, 0)]
+
+
+def _sphere(s: Shape) -> list:
+    cx, cy, cz = s["center"]
+    r = s["radius"]
+    box = (cx - r, cy - r, cz - r, cx + r, cy + r, cz + r)
+    y, x, z = _grid(box)
+    ball = _ball(x - r, y - r, z - r, r)
+    if not s.get("hollow") or r < 1:
+        return [(box, ball, s["block"], s["data"])]
+    inner = _ball(x - r, y - r, z - r, r - 1)
+    return [(box, ball & ~inner, s["block"], s["data"]), (box, inner, 0, 0)]
+
+
+def _dome(s: Shape) -> list:
+    """半球穹顶，center 为底面圆心，外壳一格厚，内部为空气"""
+    cx, cy, cz = s["center"]
+    r = s["radius"]
+    box = (cx - r, cy, cz - r, cx + r, cy + r, cz + r)
+    y, x, z = _grid(box)
+    ball = _ball(x - r, y, z - r, r)
+    if r < 1:
+        return [(box, ball, s["block"], s["data"])]
+    inner = _ball(x - r, y, z - r, r - 1)
+    return [(box, ball & ~inner, s["block"], s["data"]), (box, inner, 0, 0)]
+
+
+def _pyramid_roof(s: Shape) -> list:
+    """四坡屋顶：from/to 给出底层范围（y 取 from 的 y），每升一层四边各收一格"""
+    x0, y0, z0, x1, _, z1 = _corners(s)
+    levels = (min(x1 - x0, z1 - z0) + 2) // 2
+    box = (x0, y0, z0, x1, y0 + levels - 1, z1)
+    y, x, z = _grid(box)
+    nx, nz = x1 - x0 + 1, z1 - z0 + 1
+    mask = (x >= y) & (x <= nx - 1 - y) & (z >= y) & (z <= nz - 1 - y)
+    return [(box, mask, s["block"], s["data"])]
+
+
+def _opening(s: Shape) -> list:
+    """门窗洞口：整块填空气"""
+    box = _corners(s)
+    return [(box, np.ones(_shape(box), dtype=bool), 0, 0)]
+
+
+SHAPES: Dict[str, Tuple[Tuple[str, ...], Callable[[Shape], list]]] = {
+    # 类型: (必需字段, 光栅化函数)
+    "box": (("from", "to", "block"), _box),
+    "hollow_box": (("from", "to", "block"), _hollow_box),
+    "wall_ring": (("from", "to", "block"), _wall_ring),
+    "cylinder": (("center", "radius", "height", "block"), _cylinder),
+    "sphere": (("center", "radius", "block"), _sphere),
+    "dome": (("center", "radius", "block"), _dome),
+    "pyramid_roof": (("from", "to", "block"), _pyramid_roof),
+    "opening": (("from", "to"), _opening),
+}
+
+
+def _corners(s: Shape) -> Box:
+    (ax, ay, az), (bx, by, bz) = s["from"], s["to"]
+    return min(ax, bx), min(ay, by), min(az, bz), max(ax, bx), max(ay, by), max(az, bz)
+
+
+def _shape(box: Box) -> Tuple[int, int, int]:
+    x0, y0, z0, x1, y1, z1 = box
+    return y1 - y0 + 1, x1 - x0 + 1, z1 - z0 + 1
+
+
+# ---------- 解析与校验 ----------
+
+def _int(value: Any, field: str) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise PlanError(f"{field} 必须是数字")
+    return int(round(value))
+
+
+def _point(value: Any, field: str, max_offset: Optional[int]) -> Tuple[int, int, int]:
+    if not isinstance(value, (list, tuple)) or len(value) != 3:
+        raise PlanError(f"{field} 必须是 [x, y, z]")
+    point = tuple(_int(v, field) for v in value)
+    if max_offset is not None and any(abs(v) > max_offset for v in point):
+        raise PlanError(f"{field} 距离玩家过远（上限 {max_offset} 格）")
+    return point
+
+
+def parse_plan(text: str) -> List[Shape]:
+    """
+    解析并校验大模型返回的 JSON 建造计划，返回规范化后的形状列表。
+    计划格式：{"shapes": [{"type": "box", "from": [dx, dy, dz], "to": [...], "block": 17}, ...]}，
+    坐标是相对玩家所在方块的偏移；也接受直接给出形状数组。
+    """
+    try:
+        plan = json.loads(text)
+    except ValueError as e:
+        raise PlanError(f"JSON 解析失败: {e}")
+
+    shapes = plan.get("shapes") if isinstance(plan, dict) else plan
+    if not isinstance(shapes, list) or not shapes:
+        raise PlanError("缺少 shapes 列表")
+    if len(shapes) > CONFIG['plan']['max_shapes']:
+        raise PlanError(f"形状过多: {len(shapes)} > {CONFIG['plan']['max_shapes']}")
+
+    max_offset = CONFIG['plan']['max_offset']
+    normalized = []
+    for i, raw in enumerate(shapes):
+        if not isinstance(raw, dict):
+            raise PlanError(f"第 {i + 1} 个形状不是对象")
+        normalized.append(normalize_shape(raw, max_offset))
+    return normalized
+
+
+def normalize_shape(raw: Shape, max_offset: Optional[int] = None) -> Shape:
+    """
+    校验单个形状并把数值取整；max_offset 不为空时坐标视为相对玩家的偏移，超出即拒绝。
+    半径和高度始终受 plan.max_offset 限制，避免一个形状就撑爆体素模型。
+    """
+    kind = raw.get("type")
+    if kind not in SHAPES:
+        raise PlanError(f"未知形状: {kind}")
+
+    required, _ = SHAPES[kind]
+    missing = [f for f in required if f not in raw]
+    if missing:
+        raise PlanError(f"{kind} 缺少字段: {', '.join(missing)}")
+
+    shape = {"type": kind, "block": 0, "data": 0}
+    for key, value in raw.items():
+        if key in ("from", "to", "center"):
+            shape[key] = _point(value, f"{kind}.{key}", max_offset)
+        elif key in ("block", "data", "radius", "height"):
+            shape[key] = _int(value, f"{kind}.{key}")
+        elif key in ("hollow", "open_top"):
+            shape[key] = bool(value)
+
+    if not 0 <= shape["block"] <= 255 or not 0 <= shape["data"] <= 15:
+        raise PlanError(f"{kind} 的方块 ID 或 data 超出范围")
+    limit = CONFIG['plan']['max_offset'] + 1
+    for key in ("radius", "height"):
+        if key in shape and not 0 < shape[key] <= limit:
+            raise PlanError(f"{kind}.{key} 超出范围: {shape[key]}")
+    return shape
+
+
+# ---------- 光栅化 ----------
+
+def rasterize(shapes: List[Shape], origin: Tuple[int, int, int], max_volume: int = None) -> VoxelRegion:
+    """把形状依次写入 NumPy 体素模型；origin 为玩家所在方块，体积超限时抛出 PlanError"""
+    region = VoxelRegion(max_volume or CONFIG['builder']['max_buffered_blocks'])
+    ox, oy, oz = origin
+    for shape in shapes:
+        for (x0, y0, z0, _, _, _), mask, block_id, data in SHAPES[shape["type"]][1](shape):
+            if not region.fill_mask(ox + x0, oy + y0, oz + z0, mask, block_id, data):
+                raise PlanError("建造范围过大")
+    return region
+
+
+def shape_cuboids(shape: Shape) -> List[Cuboid]:
+    """单个形状（绝对坐标）光栅化并合并成长方体"""
+    return rasterize([shape], (0, 0, 0)).to_cuboids()
+
+
+def plan_to_ops(shapes: List[Shape], origin: Tuple[int, int, int]) -> BlockOps:
+    """光栅化后贪心合并成最少的长方体写操作"""
+    cuboids = rasterize(shapes, origin).to_cuboids()
+    ops = BlockOps(max(1, len(cuboids)))
+    for cuboid in cuboids:
+        ops.append(*cuboid)
+    return ops
@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from .config_loader import CONFIG
+from .metrics import metrics
+
+# 这些状态码说明服务端暂时不可用，值得重试
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开期间直接拒绝请求"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    简单熔断器：
+    - 连续失败达到阈值后打开，reset_timeout 秒内所有请求直接失败
+    - 超时后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class HttpTransport:
+    """
+    大模型请求共用的 HTTP 传输层：
+    - requests.Session + 连接池，复用 TCP/TLS 连接
+    - 连接超时与读取超时分开配置
+    - 失败后按带抖动的指数退避重试，遵守 Retry-After
+    - 熔断器在服务商故障时快速失败
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.connect_timeout = CONFIG['http']['connect_timeout']
+        self.read_timeout = CONFIG['http']['read_timeout']
+        self.max_retries = CONFIG['system']['max_retries']
+        self.backoff_base = CONFIG['system']['retry_delay']
+        self.backoff_max = CONFIG['http']['backoff_max']
+        self.breaker = CircuitBreaker(
+            CONFIG['http']['breaker_failure_threshold'],
+            CONFIG['http']['breaker_reset_timeout']
+        )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=CONFIG['http']['pool_size'],
+            pool_maxsize=CONFIG['http']['pool_size'],
+            max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """全抖动指数退避：在 [0, min(上限, 基数 * 2^attempt)] 内随机等待"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(self.backoff_max, float(retry_after))
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, url: str, payload: dict, headers: dict, stream: bool = False) -> requests.Response:
+        """
+        发送 JSON POST 请求，返回最后一次的响应：
+        - 2xx 和不可重试的 4xx 直接返回，由调用方处理
+        - 网络错误和可重试状态码会退避重试，全部失败后抛出最后一次异常或返回最后一次响应
+        - 其他 requests 异常记一次失败后直接抛出
+        """
+        last_error = None
+        response = None
+
+        for attempt in range(self.max_retries):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name} 熔断中，{self.breaker.reset_timeout} 秒内不再请求")
+
+            try:
+                print(f"📤 发送请求 (第 {attempt + 1} 次)")
+                if attempt:
+                    metrics.inc("http_retries", provider=self.name)
+                with metrics.span("http_attempt"):
+                    response = self.session.post(
+                        url,
+                        json=payload,
+                        headers=headers,
+                        timeout=(self.connect_timeout, self.read_timeout),
+                        stream=stream
+                    )
+                print(f"📥 响应状态码: {response.status_code}")
+                metrics.inc("http_responses", provider=self.name, status=response.status_code)
+
+                if response.status_code not in RETRYABLE_STATUS:
+                    # 4xx 说明服务本身可用，只是请求有问题，不计入熔断
+                    self.breaker.record_success()
+                    return response
+
+                self.breaker.record_failure()
+                print(f"❌ 错误 {response.status_code}: {response.text[:200]}")
+                last_error = None
+
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                self.breaker.record_failure()
+                metrics.inc("http_errors", provider=self.name, error=type(e).__name__)
+                print(f"⚠️ 请求异常: {e}")
+                last_error = e
+                response = None
+
+            except requests.exceptions.RequestException as e:
+                # 地址无效、SSL 错误等重试也无济于事；仍要记一次失败，半开状态的探测名额才会释放
+                self.breaker.record_failure()
+                metrics.inc("http_errors", provider=self.name, error=type(e).__name__)
+                print(f"⚠️ 请求异常: {e}")
+                raise
+
+            if attempt < self.max_retries - 1:
+                time.sleep(self._backoff(attempt, response))
+
+        if last_error is not None:
+            raise last_error
+        return response
+
+
+_transports: Dict[str, HttpTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(name: str) -> HttpTransport:
+    """按名称获取共享的传输层实例（同一服务商共用连接池和熔断器）"""
+    with _transports_lock:
+        transport = _transports.get(name)
+        if transport is None:
+            transport = HttpTransport(name)
+            _transports[name] = transport
+        return transport
@@ -0,0 +1,453 @@
+import ast
+import math
+import operator
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+from mcpi.block import Block
+from mcpi.minecraft import intFloor
+from .block_ops import BlockOps
+from .chunk_cache import WORLD_CACHE
+from .code_safety import CodeSafetyChecker
+from .config_loader import CONFIG
+from .primitives import PRIMITIVES, primitive_cuboids
+
+
+class StepLimitExceeded(Exception):
+    """执行的语句数超过 interpreter.max_steps"""
+    pass
+
+
+_BINOPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+_UNARYOPS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+_CMPOPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.Gt: operator.gt,
+    ast.LtE: operator.le,
+    ast.GtE: operator.ge,
+}
+
+Expr = Callable[["Frame"], Any]
+Stmt = Callable[["Frame"], None]
+
+
+class Frame:
+    """一次程序执行的状态：变量表和已执行的步数"""
+
+    __slots__ = ("vars", "steps", "max_steps")
+
+    def __init__(self, variables: Dict[str, Any], max_steps: int):
+        self.vars = variables
+        self.steps = 0
+        self.max_steps = max_steps
+
+    def tick(self):
+        self.steps += 1
+        if self.steps > self.max_steps:
+            raise StepLimitExceeded(f"执行步数超过上限 {self.max_steps}")
+
+
+def _int_args(args: tuple) -> List[int]:
+    """与 mcpi 的 intFloor 相同；参数都是数字时走快速路径"""
+    try:
+        return [math.floor(a) for a in args]
+    except TypeError:
+        return intFloor(args)
+
+
+class WorldProxy:
+    """
+    生成代码看到的 mc：
+    - setBlock / setBlocks 只追加到 BlockOps，不访问网络
+    - getBlock / getBlockWithData 先查本次程序已写入的方块，再查本地区块缓存
+    - getHeight 经过本地区块缓存
+    - 其余白名单方法（postToChat 等）转发给真实 mc
+    """
+
+    def __init__(self, mc: Any, ops: BlockOps):
+        self._mc = mc
+        self.ops = ops
+        # take_ops 取走的操作，流式执行时后面的语句仍能读到前面语句写的方块
+        self.history = BlockOps()
+
+    def _lookup(self, x: int, y: int, z: int):
+        state = self.ops.lookup(x, y, z)
+        if state is None:
+            state = self.history.lookup(x, y, z)
+        return state
+
+    def __getattr__(self, name: str):
+        if name not in CodeSafetyChecker.ALLOWED_MC_ATTRS:
+            raise AttributeError(f"禁止方法: mc.{name}")
+        return getattr(self._mc, name)
+
+    def setBlock(self, *args):
+        values = _int_args(args)
+        x, y, z, block_id = values[:4]
+        data = values[4] if len(values) > 4 else 0
+        self.ops.append(x, y, z, x, y, z, block_id, data)
+
+    def setBlocks(self, *args):
+        values = _int_args(args)
+        x0, y0, z0, x1, y1, z1, block_id = values[:7]
+        data = values[7] if len(values) > 7 else 0
+        self.ops.append(x0, y0, z0, x1, y1, z1, block_id, data)
+
+    def getBlock(self, *args):
+        x, y, z = _int_args(args)[:3]
+        state = self._lookup(x, y, z)
+        if state is not None:
+            return state[0]
+        return WORLD_CACHE.get_block(self._mc, x, y, z)
+
+    def getBlockWithData(self, *args):
+        x, y, z = _int_args(args)[:3]
+        state = self._lookup(x, y, z)
+        if state is not None:
+            return Block(*state)
+        return WORLD_CACHE.get_block_with_data(self._mc, x, y, z)
+
+    def getHeight(self, *args):
+        x, z = _int_args(args)[:2]
+        return WORLD_CACHE.get_height(self._mc, x, z)
+
+
+class ProgramCompiler:
+    """
+    把 CodeSafetyChecker.ALLOWED_NODES 范围内的 AST 编译成 Python 闭包树。
+    每个表达式节点变成 frame -> 值 的函数，每条语句变成 frame -> None 的函数，
+    执行时不再经过 exec，也不会触碰 __builtins__。
+    """
+
+    def compile(self, tree: ast.Module) -> Stmt:
+        return self._block(tree.body)
+
+    @staticmethod
+    def _unsupported(node: ast.AST):
+        return SyntaxError(f"禁止语法: {type(node).__name__}")
+
+    # ---------- 语句 ----------
+
+    def _block(self, body: List[ast.stmt]) -> Stmt:
+        stmts = [self._stmt(s) for s in body]
+
+        def run(frame: Frame):
+            for stmt in stmts:
+                stmt(frame)
+        return run
+
+    def _stmt(self, node: ast.stmt) -> Stmt:
+        if isinstance(node, ast.Expr):
+            value = self._expr(node.value)
+
+            def run_expr(frame: Frame):
+                frame.tick()
+                value(frame)
+            return run_expr
+
+        if isinstance(node, ast.Assign):
+            value = self._expr(node.value)
+            targets = [self._target(t) for t in node.targets]
+
+            def run_assign(frame: Frame):
+                frame.tick()
+                result = value(frame)
+                for assign in targets:
+                    assign(frame, result)
+            return run_assign
+
+        if isinstance(node, ast.For):
+            iterable = self._expr(node.iter)
+            target = self._target(node.target)
+            body = self._block(node.body)
+            orelse = self._block(node.orelse)
+
+            def run_for(frame: Frame):
+                frame.tick()
+                for item in iterable(frame):
+                    frame.tick()
+                    target(frame, item)
+                    body(frame)
+                # 不允许 break，循环结束后 else 分支总会执行
+                orelse(frame)
+            return run_for
+
+        if isinstance(node, ast.If):
+            test = self._expr(node.test)
+            body = self._block(node.body)
+            orelse = self._block(node.orelse)
+
+            def run_if(frame: Frame):
+                frame.tick()
+                if test(frame):
+                    body(frame)
+                else:
+                    orelse(frame)
+            return run_if
+
+        raise self._unsupported(node)
+
+    def _target(self, node: ast.expr) -> Callable[[Frame, Any], None]:
+        if isinstance(node, ast.Name):
+            name = node.id
+
+            def store_name(frame: Frame, value: Any):
+                frame.vars[name] = value
+            return store_name
+
+        if isinstance(node, (ast.Tuple, ast.List)):
+            targets = [self._target(e) for e in node.elts]
+
+            def store_unpack(frame: Frame, value: Any):
+                values = list(value)
+                if len(values) != len(targets):
+                    raise ValueError(f"解包数量不匹配: 需要 {len(targets)} 个，实际 {len(values)} 个")
+                for assign, item in zip(targets, values):
+                    assign(frame, item)
+            return store_unpack
+
+        if isinstance(node, ast.Subscript):
+            container = self._expr(node.value)
+            index = self._slice(node.slice)
+
+            def store_item(frame: Frame, value: Any):
+                container(frame)[index(frame)] = value
+            return store_item
+
+        if isinstance(node, ast.Attribute):
+            owner = self._expr(node.value)
+            attr = self._public_attr(node.attr)
+
+            def store_attr(frame: Frame, value: Any):
+                setattr(owner(frame), attr, value)
+            return store_attr
+
+        raise self._unsupported(node)
+
+    # ---------- 表达式 ----------
+
+    def _expr(self, node: ast.expr) -> Expr:
+        if isinstance(node, ast.Constant):
+            value = node.value
+            return lambda frame: value
+
+        if isinstance(node, ast.Name):
+            name = node.id
+
+            def load(frame: Frame):
+                try:
+                    return frame.vars[name]
+                except KeyError:
+                    raise NameError(f"name '{name}' is not defined") from None
+            return load
+
+        if isinstance(node, ast.BinOp):
+            fn = _BINOPS.get(type(node.op))
+            if fn is None:
+                raise self._unsupported(node.op)
+            left, right = self._expr(node.left), self._expr(node.right)
+            return lambda frame: fn(left(frame), right(frame))
+
+        if isinstance(node, ast.UnaryOp):
+            fn = _UNARYOPS.get(type(node.op))
+            if fn is None:
+                raise self._unsupported(node.op)
+            operand = self._expr(node.operand)
+            return lambda frame: fn(operand(frame))
+
+        if isinstance(node, ast.BoolOp):
+            return self._boolop(node)
+
+        if isinstance(node, ast.Compare):
+            return self._compare(node)
+
+        if isinstance(node, ast.Tuple):
+            elts = [self._expr(e) for e in node.elts]
+            return lambda frame: tuple(e(frame) for e in elts)
+
+        if isinstance(node, ast.List):
+            elts = [self._expr(e) for e in node.elts]
+            return lambda frame: [e(frame) for e in elts]
+
+        if isinstance(node, ast.Dict):
+            if any(k is None for k in node.keys):
+                raise self._unsupported(node)
+            pairs = [(self._expr(k), self._expr(v)) for k, v in zip(node.keys, node.values)]
+            return lambda frame: {k(frame): v(frame) for k, v in pairs}
+
+        if isinstance(node, ast.Subscript):
+            container = self._expr(node.value)
+            index = self._slice(node.slice)
+            return lambda frame: container(frame)[index(frame)]
+
+        if isinstance(node, ast.Attribute):
+            owner = self._expr(node.value)
+            attr = self._public_attr(node.attr)
+            return lambda frame: getattr(owner(frame), attr)
+
+        if isinstance(node, ast.Call):
+            return self._call(node)
+
+        raise self._unsupported(node)
+
+    def _slice(self, node: ast.AST) -> Expr:
+        # Python 3.8 及以下下标包在 Index 节点里
+        if type(node).__name__ == "Index":
+            return self._expr(node.value)
+        if isinstance(node, ast.Slice):
+            parts = [self._expr(p) if p is not None else (lambda frame: None)
+                     for p in (node.lower, node.upper, node.step)]
+            return lambda frame: slice(*(p(frame) for p in parts))
+        return self._expr(node)
+
+    @staticmethod
+    def _public_attr(attr: str) -> str:
+        if attr.startswith("_"):
+            raise SyntaxError(f"禁止属性: {attr}")
+        return attr
+
+    def _boolop(self, node: ast.BoolOp) -> Expr:
+        values = [self._expr(v) for v in node.values]
+        is_and = isinstance(node.op, ast.And)
+
+        def run(frame: Frame):
+            result = None
+            for value in values:
+                result = value(frame)
+                if bool(result) != is_and:
+                    return result
+            return result
+        return run
+
+    def _compare(self, node: ast.Compare) -> Expr:
+        left = self._expr(node.left)
+        pairs = []
+        for op, comparator in zip(node.ops, node.comparators):
+            fn = _CMPOPS.get(type(op))
+            if fn is None:
+                raise self._unsupported(op)
+            pairs.append((fn, self._expr(comparator)))
+
+        def run(frame: Frame):
+            current = left(frame)
+            for fn, right in pairs:
+                value = right(frame)
+                if not fn(current, value):
+                    return False
+                current = value
+            return True
+        return run
+
+    def _call(self, node: ast.Call) -> Expr:
+        func = self._expr(node.func)
+        args = [self._expr(a) for a in node.args]
+        kwargs = [(k.arg, self._expr(k.value)) for k in node.keywords]
+
+        if not kwargs:
+            return lambda frame: func(frame)(*[a(frame) for a in args])
+
+        def run(frame: Frame):
+            named = {}
+            for name, value in kwargs:
+                if name is None:
+                    named.update(value(frame))
+                else:
+                    named[name] = value(frame)
+            return func(frame)(*[a(frame) for a in args], **named)
+        return run
+
+
+class Program:
+    """编译好的生成代码，可以在不同位置、不同世界上反复执行"""
+
+    def __init__(self, tree: ast.Module):
+        self._run = ProgramCompiler().compile(tree)
+
+    def run(self, frame: Frame):
+        self._run(frame)
+
+
+_programs: "OrderedDict[str, Program]" = OrderedDict()
+_programs_lock = threading.Lock()
+
+
+def compile_program(code: str) -> Program:
+    """解析并编译代码，结果按源码缓存（LRU），缓存命中和流式重放时不再重复解析"""
+    with _programs_lock:
+        program = _programs.get(code)
+        if program is not None:
+            _programs.move_to_end(code)
+            return program
+
+    program = Program(ast.parse(code, mode="exec"))
+
+    with _programs_lock:
+        _programs[code] = program
+        while len(_programs) > CONFIG['interpreter']['program_cache_entries']:
+            _programs.popitem(last=False)
+    return program
+
+
+class Interpreter:
+    """
+    执行生成代码，把写操作收集成 BlockOps：
+    - 变量表里只有 mc（WorldProxy）、pos、少量内置函数和形状函数
+    - 形状函数（fill_sphere 等）在本地用 NumPy 光栅化，直接追加合并好的长方体
+    - 多次 run 共用同一个变量表，流式执行时变量可以跨语句使用
+    - 总步数受 interpreter.max_steps 限制，防止死循环拖住执行线程
+    """
+
+    def __init__(self, mc: Any, pos: Any, ops_factory: Callable[[], BlockOps] = BlockOps):
+        self._new_ops = ops_factory
+        self.ops = ops_factory()
+        self.world = WorldProxy(mc, self.ops)
+        self.frame = Frame({
+            "mc": self.world,
+            "pos": pos,
+            "range": range,
+            "len": len,
+            "abs": abs,
+            "min": min,
+            "max": max,
+            "sum": sum,
+            "print": lambda x: mc.postToChat(f" {x}"),
+            **{name: self._primitive(name) for name in PRIMITIVES},
+        }, CONFIG['interpreter']['max_steps'])
+
+    def _primitive(self, name: str) -> Callable:
+        def draw(*args, **kwargs):
+            for cuboid in primitive_cuboids(name, args, kwargs):
+                self.ops.append(*cuboid)
+        return draw
+
+    def run(self, code: str) -> BlockOps:
+        """执行一段代码；出错时已记录的操作仍保留在 self.ops 中"""
+        compile_program(code).run(self.frame)
+        return self.ops
+
+    def take_ops(self) -> BlockOps:
+        """取出目前记录的操作并开始新的列表；取出的操作仍保留一份供 getBlock 查询"""
+        ops = self.ops
+        self.world.history.extend(ops)
+        self.ops = self._new_ops()
+        self.world.ops = self.ops
+        return ops
+
+    def close(self):
+        """与沙箱会话接口一致；进程内执行没有需要释放的资源"""
+        pass
@@ -1,25 +1,10 @@
 import time
-from mcpi import connection
 from .config_loader import CONFIG
+from .rj_connection import BufferedConnection
 
 __author__ = "Link-Qian"
 __version__ = "1.0.1"
 
-def _patched_receive(self):
-    buf = b""
-    try:
-        while True:
-            char = self.socket.recv(1)
-            if char == b"\n" or not char:
-                break
-            buf += char
-        return buf.decode("utf-8").rstrip("\n")
-    except Exception as e:
-        print(f"[MCPI Patch] Receive error: {e}")
-        raise
-
-connection.Connection.receive = _patched_receive
-
 def create_minecraft_connection():
     max_retries = 10
     attempt = 0
@@ -27,10 +12,10 @@ def create_minecraft_connection():
         try:
             print(f"正在连接 Minecraft 服务器 {CONFIG['minecraft']['host']}:{CONFIG['minecraft']['port']}... (尝试 {attempt + 1})")
             from mcpi.minecraft import Minecraft
-            mc = Minecraft.create(
-                address=CONFIG['minecraft']['host'],
-                port=CONFIG['minecraft']['port']
-            )
+            mc = Minecraft(BufferedConnection(
+                CONFIG['minecraft']['host'],
+                CONFIG['minecraft']['port']
+            ))
             print("🟢 成功连接到 Minecraft 服务器！")
             print(f"作者: {__author__}")
             print(f"版本: {__version__}")
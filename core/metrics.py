@@ -0,0 +1,175 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from .config_loader import CONFIG
+
+# 直方图桶上界（秒），覆盖单次 socket 往返到一次完整的大模型请求
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PREFIX = "mcai"
+
+_NOOP = nullcontext()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """固定分桶的耗时直方图"""
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶估算分位数（返回所在桶的上界）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """
+    各处理阶段的耗时与计数：
+    - span(stage)：with 块的耗时计入该阶段的直方图
+    - inc(name, **labels)：计数器
+    - 关闭时 span 直接返回共享的空上下文，inc 立即返回，几乎没有开销
+    """
+
+    def __init__(self):
+        self.enabled = CONFIG['metrics']['enabled']
+        self._stages: Dict[str, Histogram] = {}
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._lock = threading.Lock()
+
+    def span(self, stage: str):
+        if not self.enabled:
+            return _NOOP
+        return self._span(stage)
+
+    @contextmanager
+    def _span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": h.count,
+                    "sum": h.sum,
+                    "mean": h.sum / h.count if h.count else None,
+                    "p50": h.quantile(0.5),
+                    "p99": h.quantile(0.99),
+                }
+                for stage, h in self._stages.items()
+            }
+            counters: Dict[str, List[dict]] = {}
+            for (name, labels), value in self._counters.items():
+                counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return {"stages": stages, "counters": counters}
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式"""
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds 各处理阶段耗时",
+            f"# TYPE {PREFIX}_stage_seconds histogram",
+        ]
+        with self._lock:
+            for stage, h in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS, h.counts):
+                    cumulative += n
+                    lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {h.sum}')
+                lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {h.count}')
+
+            declared = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+                    declared.add(name)
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{PREFIX}_{name}_total{{{label_text}}} {value}" if labels
+                             else f"{PREFIX}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server() -> Optional[ThreadingHTTPServer]:
+    """开启本地指标接口：/metrics 返回 Prometheus 文本，/metrics.json 返回 JSON；未开启时返回 None"""
+    global _server
+    if not metrics.enabled or _server is not None:
+        return _server
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = metrics.render_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path == "/metrics.json":
+                body = json.dumps(metrics.snapshot(), ensure_ascii=False).encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    try:
+        _server = ThreadingHTTPServer((CONFIG['metrics']['host'], CONFIG['metrics']['port']), Handler)
+    except OSError as e:
+        print(f"⚠️ 指标接口启动失败: {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    host, port = _server.server_address[:2]
+    print(f"📈 指标接口: http://{host}:{port}/metrics")
+    return _server
@@ -0,0 +1,120 @@
+import math
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+from .geometry import PlanError, Shape, normalize_shape, shape_cuboids
+
+# 估算时使用：span(a, b) 为参数 b - a 的最大绝对值，size(p) 为参数 p 的最大绝对值，无法确定时为 None
+Span = Callable[[str, str], Optional[float]]
+Size = Callable[[str], Optional[float]]
+
+
+class Primitive(NamedTuple):
+    params: Tuple[str, ...]
+    # 绑定好的参数 -> geometry 形状（绝对坐标）
+    to_shape: Callable[[Dict[str, Any]], Shape]
+    # 包围盒 (x, y, z) 方向格数的上界，用于静态估算方块量
+    extent: Callable[[Span, Size], Tuple[Optional[float], ...]]
+
+
+def _cells(n: Optional[float]) -> Optional[float]:
+    """坐标差 -> 格数"""
+    return None if n is None else n + 1
+
+
+def _diameter(size: Size) -> Optional[float]:
+    r = size("radius")
+    return None if r is None else 2 * r + 1
+
+
+def _box_extent(span: Span, size: Size):
+    return _cells(span("x0", "x1")), _cells(span("y0", "y1")), _cells(span("z0", "z1"))
+
+
+def _roof_extent(span: Span, size: Size):
+    nx, nz = _cells(span("x0", "x1")), _cells(span("z0", "z1"))
+    levels = None if nx is None or nz is None else (min(nx, nz) + 1) // 2
+    return nx, levels, nz
+
+
+def _corner_shape(kind: str, **extra):
+    return lambda v: dict(type=kind, block=v["block"], data=v["data"],
+                          **{"from": (v["x0"], v["y0"], v["z0"]), "to": (v["x1"], v["y1"], v["z1"])}, **extra)
+
+
+def _centered_shape(kind: str, **extra):
+    return lambda v: dict(type=kind, center=(v["cx"], v["cy"], v["cz"]), radius=v["radius"],
+                          block=v["block"], data=v["data"], **extra)
+
+
+def _cylinder_shape(hollow: bool):
+    return lambda v: dict(type="cylinder", center=(v["cx"], v["y"], v["cz"]), radius=v["radius"],
+                          height=v["height"], hollow=hollow, block=v["block"], data=v["data"])
+
+
+BOX_PARAMS = ("x0", "y0", "z0", "x1", "y1", "z1", "block", "data")
+SPHERE_PARAMS = ("cx", "cy", "cz", "radius", "block", "data")
+CYLINDER_PARAMS = ("cx", "y", "cz", "radius", "height", "block", "data")
+
+PRIMITIVES: Dict[str, Primitive] = {
+    "fill_sphere": Primitive(
+        SPHERE_PARAMS, _centered_shape("sphere"),
+        lambda span, size: (_diameter(size),) * 3),
+    "hollow_sphere": Primitive(
+        SPHERE_PARAMS, _centered_shape("sphere", hollow=True),
+        lambda span, size: (_diameter(size),) * 3),
+    "dome": Primitive(
+        SPHERE_PARAMS, _centered_shape("dome"),
+        lambda span, size: (_diameter(size), _cells(size("radius")), _diameter(size))),
+    "fill_cylinder": Primitive(
+        CYLINDER_PARAMS, _cylinder_shape(False),
+        lambda span, size: (_diameter(size), size("height"), _diameter(size))),
+    "hollow_cylinder": Primitive(
+        CYLINDER_PARAMS, _cylinder_shape(True),
+        lambda span, size: (_diameter(size), size("height"), _diameter(size))),
+    "wall_ring": Primitive(BOX_PARAMS, _corner_shape("wall_ring"), _box_extent),
+    "hollow_box": Primitive(BOX_PARAMS, _corner_shape("hollow_box"), _box_extent),
+    "pyramid_roof": Primitive(
+        ("x0", "y", "z0", "x1", "z1", "block", "data"),
+        lambda v: {"type": "pyramid_roof", "from": (v["x0"], v["y"], v["z0"]),
+                   "to": (v["x1"], v["y"], v["z1"]), "block": v["block"], "data": v["data"]},
+        _roof_extent),
+}
+
+
+def bind_args(name: str, args: tuple, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """按参数表绑定位置参数和关键字参数；data 可省略，默认为 0"""
+    params = PRIMITIVES[name].params
+    if len(args) > len(params):
+        raise TypeError(f"{name}() 最多 {len(params)} 个参数")
+    values = dict(zip(params, args))
+    for key, value in kwargs.items():
+        if key not in params or key in values:
+            raise TypeError(f"{name}() 参数错误: {key}")
+        values[key] = value
+    values.setdefault("data", 0)
+    missing = [p for p in params if p not in values]
+    if missing:
+        raise TypeError(f"{name}() 缺少参数: {', '.join(missing)}")
+    return values
+
+
+def primitive_cuboids(name: str, args: tuple, kwargs: Dict[str, Any]):
+    """调用形状函数：坐标与 setBlocks 一样向下取整，返回合并好的长方体"""
+    values = bind_args(name, args, kwargs)
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise TypeError(f"{name}() 的参数 {key} 必须是数字")
+        values[key] = math.floor(value)
+    try:
+        return shape_cuboids(normalize_shape(PRIMITIVES[name].to_shape(values)))
+    except PlanError as e:
+        raise ValueError(f"{name}(): {e}")
+
+
+def estimate_volume(name: str, span: Span, size: Size) -> Optional[int]:
+    """形状函数写入的方块数上界（包围盒体积）；尺寸无法确定时返回 None"""
+    volume = 1
+    for cells in PRIMITIVES[name].extent(span, size):
+        if cells is None:
+            return None
+        volume *= int(cells)
+    return volume
@@ -0,0 +1,98 @@
+from typing import Callable, Dict, List, Optional, Type
+
+
+class ProviderAdapter:
+    """
+    大模型服务商适配器：把统一的 messages 转成各家的请求格式，再从响应中取出文本和 usage。
+    默认实现即 OpenAI 兼容格式（OpenAI / DeepSeek / Moonshot / DashScope 兼容模式等），
+    其他格式的服务商继承后覆盖对应方法，并用 register_provider 注册。
+    """
+
+    supports_stream = True
+
+    def __init__(self, settings: dict):
+        self.api_key = settings.get("api_key", "")
+        self.model = settings.get("model", "")
+        self.base_url = settings.get("base_url", "")
+        self.settings = settings
+
+    def headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def payload(self, messages: List[dict], stream: bool = False) -> dict:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream
+        }
+
+    def parse(self, data: dict) -> str:
+        """非流式响应 -> 文本"""
+        return data["choices"][0]["message"]["content"].strip()
+
+    def parse_chunk(self, chunk: dict) -> Optional[str]:
+        """SSE 的一段 -> 增量文本；部分服务商最后一段 choices 为空，只带 usage"""
+        if not chunk.get("choices"):
+            return None
+        return chunk["choices"][0].get("delta", {}).get("content")
+
+    @staticmethod
+    def usage(data: dict) -> Optional[dict]:
+        return data.get("usage")
+
+
+PROVIDERS: Dict[str, Type[ProviderAdapter]] = {}
+
+
+def register_provider(*names: str) -> Callable[[Type[ProviderAdapter]], Type[ProviderAdapter]]:
+    """注册适配器：@register_provider("name") 修饰 ProviderAdapter 的子类"""
+    def decorator(cls: Type[ProviderAdapter]) -> Type[ProviderAdapter]:
+        for name in names:
+            PROVIDERS[name] = cls
+        return cls
+    return decorator
+
+
+register_provider("openai", "deepseek", "moonshot", "dashscope")(ProviderAdapter)
+
+
+@register_provider("fastgpt")
+class FastGPTAdapter(ProviderAdapter):
+    """FastGPT：OpenAI 兼容格式，配置了 ai.app_id 时附带 appId 指定应用"""
+
+    def payload(self, messages: List[dict], stream: bool = False) -> dict:
+        data = super().payload(messages, stream)
+        if self.settings.get("app_id"):
+            data["appId"] = self.settings["app_id"]
+        return data
+
+
+@register_provider("qianfan")
+class QianfanAdapter(ProviderAdapter):
+    """百度千帆：鉴权放在 URL 上，请求体不带 stream，文本在 result 字段"""
+
+    supports_stream = False
+
+    def headers(self) -> dict:
+        return {"Content-Type": "application/json"}
+
+    def payload(self, messages: List[dict], stream: bool = False) -> dict:
+        return {
+            "model": self.model,
+            "messages": messages
+        }
+
+    def parse(self, data: dict) -> str:
+        return data["result"].strip()
+
+
+def create_adapter(provider: str, settings: dict) -> ProviderAdapter:
+    """按 ai.provider 创建适配器；未注册的服务商按 OpenAI 兼容格式处理"""
+    cls = PROVIDERS.get(provider)
+    if cls is None:
+        print(f"⚠️ 未知的服务商 {provider}，按 OpenAI 兼容格式请求")
+        cls = ProviderAdapter
+    return cls(settings)
@@ -0,0 +1,154 @@
+import select
+import socket
+import sys
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Any, Iterable, List
+from mcpi.connection import RequestError
+from mcpi.util import flatten_parameters_to_bytestring
+from .metrics import metrics
+
+
+class BufferedConnection:
+    """
+    RaspberryJuice 协议连接（可直接替换 mcpi.connection.Connection）：
+    - 接收：复用 bytearray 缓冲区，一次 recv_into 读取整块数据再按行切分
+    - 发送：batch() 期间的写命令只进入发送缓冲区，退出时一次 sendall
+    - 写命令不等待回复（RaspberryJuice 对 set 类命令本就不回复）
+    - 所有收发都在同一把可重入锁内完成，多个工作线程可以共用一个连接
+    """
+    RequestFailed = "Fail"
+
+    def __init__(self, address: str, port: int,
+                 recv_size: int = 65536, flush_threshold: int = 65536):
+        self.socket = socket.create_connection((address, port))
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.lastSent = b""
+        self._lock = threading.RLock()
+
+        self._flush_threshold = flush_threshold
+        self._batch_depth = 0
+        self._out = bytearray()
+
+        self._in = bytearray()
+        self._scan_from = 0
+        self._chunk = bytearray(recv_size)
+        self._chunk_view = memoryview(self._chunk)
+
+        self.commands_sent = 0
+        self.bytes_sent = 0
+
+    def drain(self):
+        """丢弃服务器主动发来的、不属于任何请求的数据"""
+        if self._in:
+            self._report_drained(bytes(self._in))
+            self._in.clear()
+            self._scan_from = 0
+
+        while True:
+            readable, _, _ = select.select([self.socket], [], [], 0.0)
+            if not readable:
+                break
+            n = self.socket.recv_into(self._chunk)
+            if not n:
+                break
+            self._report_drained(bytes(self._chunk_view[:n]))
+
+    def _report_drained(self, data: bytes):
+        e = "Drained Data: <%s>\n" % data.strip()
+        e += "Last Message: <%s>\n" % self.lastSent.strip()
+        sys.stderr.write(e)
+
+    def send(self, f: bytes, *data):
+        """写入一条命令（末尾自动加换行）；不在 batch() 中时立即发送"""
+        line = b"".join([f, b"(", flatten_parameters_to_bytestring(data), b")", b"\n"])
+        with self._lock:
+            self.lastSent = line
+            self._out += line
+            self.commands_sent += 1
+
+            if self._batch_depth == 0 or len(self._out) >= self._flush_threshold:
+                self.flush()
+
+    def send_many(self, lines: Iterable[bytes]):
+        """批量写入多条已编码的命令行（每条须以换行结尾）"""
+        with self._lock, self.batch():
+            for line in lines:
+                self._out += line
+                self.commands_sent += 1
+                if len(self._out) >= self._flush_threshold:
+                    self.flush()
+
+    def flush(self):
+        """把发送缓冲区中的所有命令一次性写到 socket"""
+        with self._lock:
+            if not self._out:
+                return
+            self.socket.sendall(self._out)
+            self.bytes_sent += len(self._out)
+            self._out.clear()
+
+    @contextmanager
+    def batch(self):
+        """流水线写入：期间的写命令合并发送，不逐条等待"""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.flush()
+
+    def receive(self) -> str:
+        """读取一行回复（去掉末尾换行）"""
+        while True:
+            end = self._in.find(b"\n", self._scan_from)
+            if end >= 0:
+                break
+            self._scan_from = len(self._in)
+            n = self.socket.recv_into(self._chunk)
+            if not n:
+                raise socket.error("连接已被服务器关闭")
+            self._in += self._chunk_view[:n]
+
+        line = self._in[:end].decode("utf-8")
+        del self._in[:end + 1]
+        self._scan_from = 0
+
+        if line == BufferedConnection.RequestFailed:
+            raise RequestError("%s failed" % self.lastSent.strip())
+        return line
+
+    def sendReceive(self, f: bytes, *data) -> str:
+        """发送请求并等待回复；未发送的写命令会与请求合并为一次 sendall"""
+        with self._lock, metrics.span("rj_round_trip"):
+            self.drain()
+            with self.batch():
+                self.send(f, *data)
+            self.flush()
+            return self.receive()
+
+    def send_receive_many(self, f: bytes, requests: Iterable[tuple]) -> List[str]:
+        """流水线请求：同类请求一次全部发出，再按顺序读取各自的回复，整批只有一次往返"""
+        with self._lock, metrics.span("rj_round_trip"):
+            self.drain()
+            count = 0
+            with self.batch():
+                for data in requests:
+                    self.send(f, *data)
+                    count += 1
+            return [self.receive() for _ in range(count)]
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.socket.close()
+
+
+def write_batch(mc: Any):
+    """对 mc 的写操作开启流水线批量发送；普通 mcpi 连接则不做处理"""
+    batch = getattr(getattr(mc, "conn", None), "batch", None)
+    return batch() if batch else nullcontext()
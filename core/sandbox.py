@@ -0,0 +1,354 @@
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from typing import Any, Optional
+from .block_ops import BlockOps
+from .chunk_cache import WORLD_CACHE
+from .code_safety import CodeSafetyChecker
+from .config_loader import CONFIG
+from .interpreter import Interpreter
+
+# 读取世界的方法在父进程里经过区块缓存
+_CACHED_READS = {
+    "getBlock": WORLD_CACHE.get_block,
+    "getBlockWithData": WORLD_CACHE.get_block_with_data,
+    "getHeight": WORLD_CACHE.get_height,
+}
+
+
+class SandboxError(Exception):
+    """沙箱进程被终止或异常退出"""
+    pass
+
+
+class SandboxTimeout(SandboxError):
+    pass
+
+
+class SandboxMemoryExceeded(SandboxError):
+    pass
+
+
+# ---------- 子进程 ----------
+
+class _RemoteWorld:
+    """子进程里的 mc：所有调用经管道转发给父进程，由父进程用真实连接完成"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name: str):
+        def call(*args):
+            self._conn.send(("call", name, args))
+            kind, value = self._conn.recv()
+            if kind == "error":
+                raise value
+            return value
+        return call
+
+
+class _StreamingOps(BlockOps):
+    """子进程里的 BlockOps：每积累 chunk 条操作就发给父进程一次"""
+
+    def __init__(self, conn, chunk: int):
+        super().__init__()
+        self._conn = conn
+        self._chunk = chunk
+        self._sent = 0
+
+    def append(self, *args):
+        super().append(*args)
+        if len(self) - self._sent >= self._chunk:
+            self.flush()
+
+    def flush(self):
+        if len(self) > self._sent:
+            self._conn.send(("ops", self.rows(self._sent)))
+            self._sent = len(self)
+
+
+def _send_result(conn, error: Optional[BaseException]):
+    try:
+        conn.send(("done", error))
+    except Exception:
+        # 异常对象无法序列化时只传文字
+        conn.send(("done", SandboxError(f"{type(error).__name__}: {error}")))
+
+
+def _limit_memory(max_bytes: int):
+    """限制子进程的地址空间：超出的分配直接失败（MemoryError），不会先占用主机内存"""
+    try:
+        import resource
+    except ImportError:
+        # Windows 没有 resource，只依靠超时兜底
+        return
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+    except (ValueError, OSError) as e:
+        print(f"⚠️ 沙箱进程无法限制内存: {e}")
+
+
+def _worker_main(conn, ops_chunk: int, max_bytes: int):
+    """沙箱子进程：等待父进程的 open / run / close 指令，执行生成代码并回传方块操作"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _limit_memory(max_bytes)
+    # 子进程没有自己的连接，读取都转发给父进程，由父进程的区块缓存处理
+    WORLD_CACHE.enabled = False
+
+    interpreter = None
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+
+        command = message[0]
+        if command == "open":
+            _, pos, max_steps = message
+            world = _RemoteWorld(conn)
+            interpreter = Interpreter(world, pos, lambda: _StreamingOps(conn, ops_chunk))
+            interpreter.frame.max_steps = max_steps
+        elif command == "run":
+            error = None
+            try:
+                interpreter.run(message[1])
+            except MemoryError:
+                error = SandboxMemoryExceeded(f"内存超出上限（{max_bytes // 2 ** 20} MB）")
+            except Exception as e:
+                error = e
+            interpreter.ops.flush()
+            # 已回传的操作由父进程保管；take_ops 在解释器里留一份，后续语句的 getBlock 仍能读到
+            interpreter.take_ops()
+            _send_result(conn, error)
+        elif command == "close":
+            interpreter = None
+
+
+# ---------- 父进程 ----------
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """子进程常驻内存；没有 /proc 的平台返回 None"""
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Worker:
+    def __init__(self, ctx, ops_chunk: int, max_bytes: int):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, ops_chunk, max_bytes),
+                                   name="ai-sandbox", daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(timeout=1)
+        finally:
+            self.conn.close()
+
+
+class SandboxSession:
+    """
+    一次建造在沙箱进程中的执行会话，接口与 Interpreter 相同（run / ops / take_ops / close）。
+    流式执行时多条语句共用同一个会话，变量跨语句保留。
+    """
+
+    def __init__(self, pool: "SandboxPool", mc: Any, pos: Any):
+        self._pool = pool
+        self._mc = mc
+        self._worker = pool.acquire()
+        self._elapsed = 0.0
+        self.peak_rss = 0
+        self.ops = BlockOps()
+        self._send(("open", pos, CONFIG['interpreter']['max_steps']))
+
+    def run(self, code: str) -> BlockOps:
+        """在子进程中执行代码；超时、超内存时终止子进程并抛出 SandboxError"""
+        if self._worker is None:
+            raise SandboxError("沙箱进程已被终止")
+
+        conn = self._worker.conn
+        started = time.monotonic()
+        deadline = started + self._pool.wall_seconds - self._elapsed
+        try:
+            self._send(("run", code))
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._abort()
+                    raise SandboxTimeout(f"执行超时（{self._pool.wall_seconds} 秒）")
+                if not conn.poll(min(remaining, 0.05)):
+                    self._check_memory()
+                    continue
+
+                message = self._recv()
+                kind = message[0]
+                if kind == "ops":
+                    self.ops.extend_rows(message[1])
+                    if self.ops.volume() > CONFIG['budget']['max_blocks']:
+                        self._abort()
+                        raise SandboxError(f"方块数超出预算: {self.ops.volume()} > {CONFIG['budget']['max_blocks']}")
+                elif kind == "call":
+                    self._serve_call(message[1], message[2])
+                elif kind == "done":
+                    if isinstance(message[1], SandboxMemoryExceeded) and self.peak_rss:
+                        print(f"⚠️ 沙箱内存超限，常驻内存峰值 {self.peak_rss // 2 ** 20} MB")
+                    if message[1] is not None:
+                        raise message[1]
+                    return self.ops
+        finally:
+            self._elapsed += time.monotonic() - started
+
+    def _send(self, message: tuple):
+        try:
+            self._worker.conn.send(message)
+        except OSError:
+            self._abort()
+            raise SandboxError("沙箱进程异常退出")
+
+    def _recv(self) -> tuple:
+        try:
+            return self._worker.conn.recv()
+        except (EOFError, OSError):
+            self._abort()
+            raise SandboxError("沙箱进程异常退出")
+
+    def _serve_call(self, name: str, args: tuple):
+        try:
+            if name in _CACHED_READS:
+                value = _CACHED_READS[name](self._mc, *args)
+            elif name in CodeSafetyChecker.ALLOWED_MC_ATTRS:
+                value = getattr(self._mc, name)(*args)
+            else:
+                raise AttributeError(f"禁止方法: mc.{name}")
+        except Exception as e:
+            try:
+                self._worker.conn.send(("error", e))
+            except Exception:
+                self._send(("error", SandboxError(f"{type(e).__name__}: {e}")))
+            return
+        self._send(("result", value))
+
+    def _check_memory(self):
+        """记录常驻内存峰值，仅用于报告；上限由子进程内的 RLIMIT_AS 强制"""
+        rss = _rss_bytes(self._worker.process.pid)
+        if rss is not None:
+            self.peak_rss = max(self.peak_rss, rss)
+
+    def _abort(self):
+        """终止失控的子进程并补一个新的，聊天轮询和其他建造不受影响"""
+        worker, self._worker = self._worker, None
+        self._pool.discard(worker)
+
+    def take_ops(self) -> BlockOps:
+        ops = self.ops
+        self.ops = BlockOps()
+        return ops
+
+    def close(self):
+        if self._worker is None:
+            return
+        worker, self._worker = self._worker, None
+        try:
+            worker.conn.send(("close",))
+        except OSError:
+            self._pool.discard(worker)
+            return
+        self._pool.release(worker)
+
+
+class SandboxPool:
+    """
+    预先启动的沙箱进程池：
+    - 生成代码在子进程中解释执行，主进程只转发世界读取并接收方块操作
+    - 每个会话受 sandbox.wall_seconds（累计执行时间）和 sandbox.max_rss_mb 限制，
+      循环步数仍由 interpreter.max_steps 限制
+    - 超时直接杀掉子进程并补充新进程；内存上限在子进程内用 RLIMIT_AS 强制，超出的分配直接失败
+    - 等待空闲进程最多 sandbox.acquire_timeout 秒，会话应尽量晚取、用完立即 close
+    """
+
+    def __init__(self, size: int):
+        # fork 会把父进程其他线程持有的锁一起复制过去，改用 forkserver / spawn
+        method = "forkserver" if sys.platform.startswith("linux") else "spawn"
+        self._ctx = multiprocessing.get_context(method)
+        if method == "forkserver":
+            self._ctx.set_forkserver_preload([__name__])
+
+        self.wall_seconds = CONFIG['sandbox']['wall_seconds']
+        self.max_rss = CONFIG['sandbox']['max_rss_mb'] * 2 ** 20
+        self._ops_chunk = CONFIG['sandbox']['ops_chunk']
+        self.acquire_timeout = CONFIG['sandbox']['acquire_timeout']
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        for _ in range(size):
+            self._idle.put(_Worker(self._ctx, self._ops_chunk, self.max_rss))
+
+    def acquire(self) -> _Worker:
+        """取一个空闲进程；acquire_timeout 秒内都没有空闲进程时抛出 SandboxError"""
+        try:
+            worker = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise SandboxError(f"沙箱进程全部繁忙，{self.acquire_timeout} 秒内没有空闲进程") from None
+        if not worker.process.is_alive():
+            worker.kill()
+            worker = _Worker(self._ctx, self._ops_chunk, self.max_rss)
+        return worker
+
+    def release(self, worker: _Worker):
+        self._idle.put(worker)
+
+    def discard(self, worker: _Worker):
+        worker.kill()
+        self._idle.put(_Worker(self._ctx, self._ops_chunk, self.max_rss))
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+
+_pool: Optional[SandboxPool] = None
+_pool_failed = False
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> Optional[SandboxPool]:
+    """返回共享的沙箱进程池；未开启或启动失败时返回 None，调用方改在本进程内执行"""
+    global _pool, _pool_failed
+    if not CONFIG['sandbox']['enabled']:
+        return None
+
+    with _pool_lock:
+        if _pool is None and not _pool_failed:
+            try:
+                _pool = SandboxPool(CONFIG['sandbox']['workers'])
+                print(f"🧪 已启动 {CONFIG['sandbox']['workers']} 个沙箱进程")
+            except Exception as e:
+                _pool_failed = True
+                print(f"⚠️ 启动沙箱进程失败，改在主进程内执行: {e}")
+        return _pool
+
+
+def shutdown_sandbox_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+
+
+def create_interpreter(mc: Any, pos: Any):
+    """开启沙箱时返回 SandboxSession，否则返回进程内的 Interpreter；两者接口相同"""
+    pool = get_sandbox_pool()
+    if pool is None:
+        return Interpreter(mc, pos)
+    return SandboxSession(pool, mc, pos)
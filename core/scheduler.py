@@ -0,0 +1,188 @@
+import itertools
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+from .block_writer import block_writer
+from .config_loader import CONFIG
+
+# 优先级：数值越小越先调度
+QUICK, BUILD = 0, 1
+
+_ids = itertools.count(1)
+
+
+@dataclass(eq=False)
+class Job:
+    """一条排队或正在处理的指令；task 不为空时是不需要大模型的本地任务（如撤销）"""
+    player: str
+    command: str
+    mc: Any = field(default=None, repr=False)
+    priority: int = BUILD
+    task: Optional[Callable] = None
+    id: int = field(default_factory=lambda: next(_ids))
+    stage: str = "排队中"
+    created: float = field(default_factory=time.monotonic)
+    started: Optional[float] = None
+    cancel: threading.Event = field(default_factory=threading.Event)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel.is_set()
+
+    def describe(self) -> str:
+        since = self.started if self.started is not None else self.created
+        return f"#{self.id} {self.command[:20]} · {self.stage} {time.monotonic() - since:.0f}s"
+
+
+def classify(command: str) -> int:
+    """查询坐标之类的只读小指令优先于建造"""
+    text = command.lower()
+    if any(keyword in text for keyword in CONFIG['scheduler']['quick_keywords']):
+        return QUICK
+    return BUILD
+
+
+class FairScheduler:
+    """
+    多玩家公平调度：
+    - 每个玩家一条先进先出队列，玩家之间按权重轮转（scheduler.player_weights，默认 1），
+      轮到的玩家连续取出 权重 条指令后让给下一位
+    - 只读小指令（QUICK）总是先于建造（BUILD）调度；建造最多占用 max_running - quick_reserved 个名额，
+      大建造进行时查询坐标等指令也不必等待
+    - 每个玩家同时进行的建造不超过 system.max_inflight_per_player，其余排队
+    本类只负责排队和选取，不执行任务；调用方在 next_job 取到任务后执行，结束时调用 finish。
+    """
+
+    def __init__(self):
+        self.max_running = CONFIG['scheduler']['max_running']
+        self.quick_reserved = CONFIG['scheduler']['quick_reserved']
+        self.max_queued = CONFIG['scheduler']['max_queued_per_player']
+        self.max_player_builds = CONFIG['system']['max_inflight_per_player']
+        self.weights: Dict[str, int] = CONFIG['scheduler']['player_weights']
+
+        self._queues: Dict[int, Dict[str, Deque[Job]]] = {QUICK: {}, BUILD: {}}
+        self._rotation: Dict[int, Deque[str]] = {QUICK: deque(), BUILD: deque()}
+        self._credit: Dict[int, Dict[str, int]] = {QUICK: {}, BUILD: {}}
+        self._running: Dict[int, Job] = {}
+        self._lock = threading.Lock()
+
+    def _weight(self, player: str) -> int:
+        return max(1, int(self.weights.get(player, 1)))
+
+    def enqueue(self, job: Job) -> Optional[int]:
+        """加入队列，返回前面还在排队的任务数；该玩家排队数已达上限时返回 None"""
+        with self._lock:
+            if len(self._player_queued(job.player)) >= self.max_queued:
+                return None
+            ahead = self.queued()
+            queue = self._queues[job.priority].setdefault(job.player, deque())
+            if not queue:
+                self._rotation[job.priority].append(job.player)
+                self._credit[job.priority][job.player] = self._weight(job.player)
+            queue.append(job)
+            return ahead
+
+    def next_job(self) -> Optional[Job]:
+        """取出下一个可以开始的任务并标记为运行中；没有时返回 None"""
+        with self._lock:
+            if len(self._running) >= self.max_running:
+                return None
+            for priority in (QUICK, BUILD):
+                if priority == BUILD and self._builds() >= self.max_running - self.quick_reserved:
+                    continue
+                job = self._take(priority)
+                if job is not None:
+                    job.started = time.monotonic()
+                    self._running[job.id] = job
+                    return job
+            return None
+
+    def _take(self, priority: int) -> Optional[Job]:
+        """加权轮转：跳过已达个人建造上限的玩家"""
+        rotation, queues, credit = self._rotation[priority], self._queues[priority], self._credit[priority]
+        for _ in range(len(rotation)):
+            player = rotation[0]
+            if priority == BUILD and self._builds(player) >= self.max_player_builds:
+                rotation.rotate(-1)
+                continue
+
+            job = queues[player].popleft()
+            credit[player] -= 1
+            if not queues[player]:
+                rotation.popleft()
+                del queues[player], credit[player]
+            elif credit[player] <= 0:
+                rotation.rotate(-1)
+                credit[player] = self._weight(player)
+            return job
+        return None
+
+    def _builds(self, player: str = None) -> int:
+        return sum(1 for job in self._running.values()
+                   if job.priority == BUILD and (player is None or job.player == player))
+
+    def _player_queued(self, player: str) -> List[Job]:
+        return [job for queues in self._queues.values() for job in queues.get(player, ())]
+
+    def finish(self, job: Job):
+        with self._lock:
+            self._running.pop(job.id, None)
+
+    def cancel(self, player: str, job_id: int = None) -> List[Job]:
+        """
+        取消玩家的任务（job_id 为空时取消全部），返回被取消的任务。
+        排队中的任务直接移出队列；运行中的任务只设置取消标记，由执行方在下一阶段前停止。
+        """
+        cancelled = []
+        with self._lock:
+            for priority, queues in self._queues.items():
+                queue = queues.get(player)
+                if not queue:
+                    continue
+                removed = [job for job in queue if job_id is None or job.id == job_id]
+                kept = deque(job for job in queue if job not in removed)
+                cancelled.extend(removed)
+                if kept:
+                    queues[player] = kept
+                else:
+                    del queues[player], self._credit[priority][player]
+                    self._rotation[priority].remove(player)
+
+            for job in self._running.values():
+                if job.player == player and (job_id is None or job.id == job_id):
+                    cancelled.append(job)
+
+        for job in cancelled:
+            job.cancel.set()
+            job.stage = "取消中"
+        return cancelled
+
+    def queued(self) -> int:
+        return sum(len(queue) for queues in self._queues.values() for queue in queues.values())
+
+    def running(self) -> int:
+        with self._lock:
+            return len(self._running)
+
+    def jobs(self, player: str) -> List[Job]:
+        """玩家的所有任务：运行中的在前，排队中的按调度顺序"""
+        with self._lock:
+            running = [job for job in self._running.values() if job.player == player]
+            queued = sorted(self._player_queued(player), key=lambda job: (job.priority, job.id))
+            return sorted(running, key=lambda job: job.id) + queued
+
+    def status(self, player: str) -> List[str]:
+        """\\ai status 的回复；聊天协议按行分隔命令，每行单独发送"""
+        jobs = self.jobs(player)
+        with self._lock:
+            summary = f"📊 全服：运行中 {len(self._running)} 个，排队中 {self.queued()} 个"
+        if not jobs:
+            return ["ℹ️ 你没有进行中的任务。", summary]
+        lines = ["📋 你的任务："] + [f"   {job.describe()}" for job in jobs]
+        progress = block_writer.progress(player)
+        if progress:
+            done, total = progress
+            lines.append(f"   🚧 写入进度 {done * 100 // total}%（{done}/{total} 方块）")
+        return lines + [summary]
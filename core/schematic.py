@@ -0,0 +1,308 @@
+import os
+import re
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from mcpi.minecraft import intFloor
+from .block_ops import BlockOps
+from .block_writer import WriteCancelled, block_writer
+from .config_loader import BASE_DIR, CONFIG
+from .snapshot import snapshots
+from .voxel_model import VoxelRegion
+
+# 文件格式（小端）：
+#   头部    magic "MCSC" | 版本 u8 | 尺寸 nx, ny, nz u16 | 相对 pos 的最小角 ox, oy, oz i32 | 调色板长度 u16
+#   调色板  每项 (id u16, data u8)；格子里存调色板下标 + 1，0 表示建造没有碰过、粘贴时保持原样
+#   各层    自下而上，每层 u32 压缩长度 + zlib 压缩的 (nx, nz) 下标数组（调色板不超过 255 项时为 u8，否则 u16）
+MAGIC = b"MCSC"
+VERSION = 1
+HEADER = struct.Struct("<4sBHHHiiiH")
+PALETTE_ENTRY = struct.Struct("<HB")
+LAYER_LENGTH = struct.Struct("<I")
+
+NAME_PATTERN = re.compile(r"^[\w\-]{1,32}$")
+
+
+class SchematicError(Exception):
+    """蓝图不存在、损坏或超出限制"""
+    pass
+
+
+class Header:
+    def __init__(self, size: Tuple[int, int, int], offset: Tuple[int, int, int], palette: np.ndarray):
+        self.size = size
+        self.offset = offset
+        # (n, 2) 数组：每行 (id, data)
+        self.palette = palette
+
+    @property
+    def index_dtype(self):
+        return np.uint8 if len(self.palette) < 256 else np.uint16
+
+    @property
+    def volume(self) -> int:
+        nx, ny, nz = self.size
+        return nx * ny * nz
+
+
+# ---------- 旋转与镜像（绕竖直轴，只变换 x / z） ----------
+
+def transform_point(dx: int, dz: int, rotation: int, mirror: Optional[str]) -> Tuple[int, int]:
+    """先镜像再按俯视顺时针旋转 rotation 度（东 → 南），坐标相对 pos"""
+    if mirror == "x":
+        dx = -dx
+    elif mirror == "z":
+        dz = -dz
+    for _ in range(rotation // 90 % 4):
+        dx, dz = -dz, dx
+    return dx, dz
+
+
+def transform_layer(layer: np.ndarray, rotation: int, mirror: Optional[str]) -> np.ndarray:
+    """(nx, nz) 的一层做与 transform_point 相同的变换"""
+    if mirror == "x":
+        layer = layer[::-1, :]
+    elif mirror == "z":
+        layer = layer[:, ::-1]
+    return np.rot90(layer, rotation // 90 % 4)
+
+
+def transform_offset(header: Header, rotation: int, mirror: Optional[str]) -> Tuple[int, int, int]:
+    """变换后包围盒的最小角（相对 pos）"""
+    nx, _, nz = header.size
+    ox, oy, oz = header.offset
+    corners = [transform_point(ox + i, oz + k, rotation, mirror) for i in (0, nx - 1) for k in (0, nz - 1)]
+    return min(c[0] for c in corners), oy, min(c[1] for c in corners)
+
+
+# ---------- 写入 ----------
+
+def _palette(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(调色板, 每条操作对应的格子值)"""
+    keys = (rows[:, 6] << 8) | rows[:, 7]
+    unique, inverse = np.unique(keys, return_inverse=True)
+    palette = np.column_stack((unique >> 8, unique & 0xFF))
+    return palette, inverse + 1
+
+
+def _layers(rows: np.ndarray, cells: np.ndarray, bounds, dtype) -> Iterator[np.ndarray]:
+    """逐层把操作光栅化成下标数组，同一时刻内存里只有一层"""
+    x0, y0, z0, x1, y1, z1 = bounds
+    lo_y, hi_y = rows[:, 1], rows[:, 4]
+    for y in range(y0, y1 + 1):
+        layer = np.zeros((x1 - x0 + 1, z1 - z0 + 1), dtype=dtype)
+        # 按执行顺序写入，后写覆盖先写
+        for i in np.flatnonzero((lo_y <= y) & (y <= hi_y)):
+            ax, _, az, bx, _, bz = rows[i, :6]
+            layer[ax - x0:bx - x0 + 1, az - z0:bz - z0 + 1] = cells[i]
+        yield layer
+
+
+def write_schematic(path: Path, rows: np.ndarray):
+    """把相对 pos 的操作数组 (n, 8) 保存为蓝图文件（先写临时文件再替换）"""
+    lo, hi = rows[:, 0:3].min(axis=0), rows[:, 3:6].max(axis=0)
+    bounds = (*map(int, lo), *map(int, hi))
+    size = tuple(int(v) for v in hi - lo + 1)
+    if any(v > 0xFFFF for v in size):
+        raise SchematicError("建造范围过大，无法保存")
+
+    palette, cells = _palette(rows)
+    header = Header(size, bounds[:3], palette)
+
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, *size, *header.offset, len(palette)))
+        for block_id, data in palette.tolist():
+            f.write(PALETTE_ENTRY.pack(block_id, data))
+        for layer in _layers(rows, cells, bounds, header.index_dtype):
+            compressed = zlib.compress(layer.tobytes(), 6)
+            f.write(LAYER_LENGTH.pack(len(compressed)))
+            f.write(compressed)
+    os.replace(tmp, path)
+
+
+# ---------- 读取 ----------
+
+def _read_exact(f: BinaryIO, n: int) -> bytes:
+    buffer = f.read(n)
+    if len(buffer) != n:
+        raise SchematicError("蓝图文件已损坏")
+    return buffer
+
+
+def read_header(f: BinaryIO) -> Header:
+    magic, version, nx, ny, nz, ox, oy, oz, count = HEADER.unpack(_read_exact(f, HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise SchematicError("不是有效的蓝图文件")
+    palette = np.frombuffer(_read_exact(f, PALETTE_ENTRY.size * count),
+                            dtype=np.dtype([("id", "<u2"), ("data", "u1")]))
+    return Header((nx, ny, nz), (ox, oy, oz), np.column_stack((palette["id"], palette["data"])).astype(np.int32))
+
+
+def read_layers(f: BinaryIO, header: Header) -> Iterator[np.ndarray]:
+    """逐层解压，每次只在内存里保留一层 (nx, nz)"""
+    nx, ny, nz = header.size
+    for _ in range(ny):
+        (length,) = LAYER_LENGTH.unpack(_read_exact(f, LAYER_LENGTH.size))
+        raw = zlib.decompress(_read_exact(f, length))
+        yield np.frombuffer(raw, dtype=header.index_dtype).reshape(nx, nz)
+
+
+class SchematicStore:
+    """
+    \\ai save / \\ai paste：
+    - 每个玩家最近一次建造的方块操作（相对 pos）保存在内存里，save 时按层光栅化、
+      调色板编码后逐层 zlib 压缩写入 cache/schematics/<名字>.mcs
+    - paste 逐层解压并旋转 / 镜像，每积累 window_blocks 格就与世界比对、合并成长方体，
+      交给限速写入器并行发送；整个蓝图不会一次性展开到内存
+    - 方块的 data 朝向值不随旋转调整
+    """
+
+    def __init__(self):
+        self.root = BASE_DIR / CONFIG['schematic']['path']
+        self.max_volume = CONFIG['schematic']['max_volume']
+        self.window_blocks = CONFIG['schematic']['window_blocks']
+        self._last: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def remember(self, player: str, ops: BlockOps, origin: Tuple[int, int, int], append: bool = False):
+        """记录玩家这次建造写入的操作；append 时接在同一次建造已记录的操作之后（流式执行分段写入）"""
+        rows = ops.rows()
+        if not len(rows):
+            return
+        rows[:, 0:3] -= origin
+        rows[:, 3:6] -= origin
+        with self._lock:
+            if append and player in self._last:
+                rows = np.concatenate((self._last[player], rows))
+            self._last[player] = rows
+
+    def path(self, name: str) -> Path:
+        if not NAME_PATTERN.match(name):
+            raise SchematicError("名字只能包含字母、数字、汉字、下划线和 -，最长 32 个字符")
+        return self.root / f"{name}.mcs"
+
+    def names(self) -> List[str]:
+        if not self.root.is_dir():
+            return []
+        return sorted(p.stem for p in self.root.glob("*.mcs"))
+
+    def save(self, player: str, name: str) -> int:
+        """保存玩家最近一次建造，返回包围盒体积"""
+        path = self.path(name)
+        with self._lock:
+            rows = self._last.get(player)
+        if rows is None:
+            raise SchematicError("你还没有可以保存的建造")
+
+        size = rows[:, 3:6].max(axis=0) - rows[:, 0:3].min(axis=0) + 1
+        volume = int(np.prod(size))
+        if volume > self.max_volume:
+            raise SchematicError(f"建造范围 {volume} 格超过上限 {self.max_volume}")
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        write_schematic(path, rows)
+        return volume
+
+    def paste(self, mc: Any, player: str, name: str, rotation: int = 0, mirror: Optional[str] = None,
+              cancel: threading.Event = None) -> int:
+        """在玩家当前位置粘贴蓝图，返回写入命令数"""
+        path = self.path(name)
+        if not path.is_file():
+            raise SchematicError(f"没有名为 {name} 的蓝图")
+
+        pos = mc.player.getPos()
+        origin = tuple(intFloor(pos.x, pos.y, pos.z))
+        with open(path, "rb") as f:
+            header = read_header(f)
+            if header.volume > self.max_volume:
+                raise SchematicError(f"蓝图 {header.volume} 格超过上限 {self.max_volume}")
+
+            nx, ny, nz = header.size
+            dx, dy, dz = transform_offset(header, rotation, mirror)
+            x0, y0, z0 = origin[0] + dx, origin[1] + dy, origin[2] + dz
+            if rotation // 90 % 2:
+                nx, nz = nz, nx
+            # 写入前保存整个包围盒，\ai undo 可以撤销粘贴
+            snapshots.capture(mc, (x0, y0, z0, x0 + nx - 1, y0 + ny - 1, z0 + nz - 1), player)
+
+            layers_per_window = max(1, self.window_blocks // (nx * nz))
+            region, sent = None, 0
+            for i, layer in enumerate(read_layers(f, header)):
+                if region is None:
+                    region = VoxelRegion(layers_per_window * nx * nz)
+                layer = transform_layer(layer, rotation, mirror)
+                for cell in np.unique(layer):
+                    if cell:
+                        block_id, data = header.palette[cell - 1]
+                        region.fill_mask(x0, y0 + i, z0, (layer == cell)[None], int(block_id), int(data))
+                if (i + 1) % layers_per_window == 0:
+                    sent += self._flush(mc, region, player, cancel)
+                    region = None
+            if region is not None:
+                sent += self._flush(mc, region, player, cancel)
+        return sent
+
+    @staticmethod
+    def _flush(mc: Any, region: VoxelRegion, player: str, cancel: Optional[threading.Event]) -> int:
+        if region.origin is None:
+            return 0
+        required = None
+        if CONFIG['builder']['diff_writes']:
+            try:
+                required = region.diff_mask(mc)
+            except Exception as e:
+                print(f"⚠️ 读取区域失败，改为全量写入: {e}")
+        return block_writer.write(mc, region.to_cuboids(required), player, disjoint=True, cancel=cancel)
+
+
+schematics = SchematicStore()
+
+
+def parse_paste_options(words: List[str]) -> Tuple[int, Optional[str]]:
+    """解析 paste 名字之后的参数：90 / 180 / 270 为旋转角度，mirror [x|z] 为镜像（默认沿 x）"""
+    rotation, mirror = 0, None
+    i = 0
+    while i < len(words):
+        word = words[i].lower()
+        if word in ("0", "90", "180", "270"):
+            rotation = int(word)
+        elif word == "mirror":
+            mirror = "x"
+            if i + 1 < len(words) and words[i + 1].lower() in ("x", "z"):
+                mirror = words[i + 1].lower()
+                i += 1
+        else:
+            raise SchematicError(f"无法识别的参数: {words[i]}")
+        i += 1
+    return rotation, mirror
+
+
+def save_last_build(mc: Any, player: str, name: str, cancel: threading.Event = None):
+    """\\ai save <名字>；只写文件，不涉及方块写入，cancel 不起作用"""
+    try:
+        volume = schematics.save(player, name)
+    except SchematicError as e:
+        mc.postToChat(f"⚠️ 保存失败: {e}")
+        return
+    mc.postToChat(f"💾 已保存蓝图 {name}（{volume} 格），输入 \\ai paste {name} 粘贴")
+    print(f"💾 {player} 保存蓝图: {name}")
+
+
+def paste_schematic(mc: Any, player: str, name: str, rotation: int = 0, mirror: Optional[str] = None,
+                    cancel: threading.Event = None):
+    """\\ai paste <名字> [90|180|270] [mirror x|z]"""
+    mc.postToChat(f"📐 正在粘贴蓝图 {name}...")
+    try:
+        sent = schematics.paste(mc, player, name, rotation, mirror, cancel)
+    except SchematicError as e:
+        mc.postToChat(f"⚠️ 粘贴失败: {e}")
+        return
+    except WriteCancelled as e:
+        mc.postToChat(f"🛑 粘贴已取消，{e}")
+        return
+    mc.postToChat(f"✅ 已粘贴蓝图 {name}（{sent} 条写入命令）")
+    print(f"📐 {player} 粘贴蓝图: {name}，{sent} 条命令")
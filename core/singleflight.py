@@ -0,0 +1,115 @@
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+
+class SingleFlightAbandoned(Exception):
+    """共享的流式调用在发起者读完之前被放弃"""
+    pass
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Stream:
+    """一次共享的流式调用：发起者边读上游边追加，跟随者按下标读取已有的增量并等待后续增量"""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.finished = False
+        self.error = None
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    """
+    相同 key 的并发调用只执行一次：
+    - 第一个调用者（发起者）真正执行，其余调用者等待并共享同一个结果（或异常）
+    - 调用结束后立即移除，之后的调用会重新执行；持久的复用交给指令缓存
+    - stream() 用于流式调用，跟随者从头收到同样的增量文本；上游中途出错时跟随者收到同一个异常
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Stream] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable, *args) -> Tuple[Any, bool]:
+        """返回 (结果, 是否共享了其他调用者的结果)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stream(self, key: str, fn: Callable[..., Iterator[str]], *args) -> Tuple[Iterator[str], bool]:
+        """返回 (增量文本迭代器, 是否共享)；发起者的迭代器驱动上游读取"""
+        with self._lock:
+            shared = self._streams.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._streams[key] = _Stream()
+
+        if leader:
+            return self._lead(key, shared, fn(*args)), False
+        return self._follow(shared), True
+
+    def _lead(self, key: str, shared: _Stream, upstream: Iterator[str]) -> Iterator[str]:
+        completed = False
+        try:
+            for part in upstream:
+                with shared.cond:
+                    shared.parts.append(part)
+                    shared.cond.notify_all()
+                yield part
+            completed = True
+        except Exception as e:
+            shared.error = e
+            raise
+        finally:
+            if not completed and shared.error is None:
+                # 发起者没有读完就放弃了迭代（GeneratorExit），跟随者拿到的同样不完整
+                shared.error = SingleFlightAbandoned("共享的流式请求被发起者中途放弃")
+            with self._lock:
+                del self._streams[key]
+            with shared.cond:
+                shared.finished = True
+                shared.cond.notify_all()
+
+    @staticmethod
+    def _follow(shared: _Stream) -> Iterator[str]:
+        index = 0
+        while True:
+            with shared.cond:
+                while index >= len(shared.parts) and not shared.finished:
+                    shared.cond.wait()
+                parts = shared.parts[index:]
+                finished = shared.finished
+            for part in parts:
+                yield part
+            index += len(parts)
+            if finished and index >= len(shared.parts):
+                # 发起者的上游中途出错：不能把截断的文本当作完整结果
+                if shared.error is not None:
+                    raise shared.error
+                return
@@ -0,0 +1,167 @@
+import threading
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+import numpy as np
+from .block_writer import WriteCancelled, block_writer
+from .code_cache import hash_text
+from .config_loader import BASE_DIR, CONFIG
+from .voxel_model import VoxelRegion, read_block_data, read_region
+
+Bounds = Tuple[int, int, int, int, int, int]
+
+
+class SnapshotStore:
+    """
+    建造前的区域快照，用于 \\ai undo：
+    - 用 world.getBlocks 批量读取建造的包围盒，方块 ID 存为 uint16、data 存为 uint8
+    - getBlocks 不返回 data 值，data_block_ids 中的方块（羊毛、木头等）再用流水线的 getBlockWithData 批量补读；
+      超过 max_data_reads 个时其余方块的 data 记为 0，快照标记为不精确并在聊天栏提醒玩家
+    - 以 np.savez_compressed 写到 cache/snapshots/<玩家>/，每个玩家只保留最近 max_per_player 次建造
+    - 流式执行时一次建造可能分多段写入，同一次建造的多段快照共用一个编号，撤销时倒序恢复
+    """
+
+    def __init__(self):
+        self.enabled = CONFIG['snapshot']['enabled']
+        self.root = BASE_DIR / CONFIG['snapshot']['path']
+        self.max_per_player = CONFIG['snapshot']['max_per_player']
+        self.max_volume = CONFIG['snapshot']['max_volume']
+        self.data_block_ids = np.array(CONFIG['builder']['data_block_ids'], dtype=np.uint16)
+        self.max_data_reads = CONFIG['builder']['max_data_reads']
+        self._lock = threading.Lock()
+
+    def _player_dir(self, player: str) -> Path:
+        return self.root / hash_text(player)[:16]
+
+    @staticmethod
+    def _build_id(path: Path) -> int:
+        return int(path.stem.split("_")[0])
+
+    def _files(self, player: str) -> List[Path]:
+        """该玩家的所有快照文件，按 (建造编号, 段号) 排序"""
+        folder = self._player_dir(player)
+        if not folder.is_dir():
+            return []
+        return sorted(folder.glob("*.npz"), key=lambda p: tuple(int(n) for n in p.stem.split("_")))
+
+    def _read_data(self, mc: Any, ids: np.ndarray, origin: Tuple[int, int, int]) -> Tuple[np.ndarray, bool]:
+        """批量补读带 data 值的方块，返回 (data, 是否完整)"""
+        data = np.zeros(ids.shape, dtype=np.uint8)
+        cells = np.argwhere(np.isin(ids, self.data_block_ids))
+        exact = len(cells) <= self.max_data_reads
+        if not exact:
+            print(f"⚠️ 快照中有 {len(cells)} 个带 data 的方块，只读取前 {self.max_data_reads} 个")
+            cells = cells[:self.max_data_reads]
+
+        if len(cells):
+            # cells 的列顺序是 (y, x, z)
+            points = cells[:, [1, 0, 2]] + origin
+            data[tuple(cells.T)] = read_block_data(mc, points)
+        return data, exact
+
+    def capture(self, mc: Any, bounds: Optional[Bounds], player: str,
+                build_id: Optional[int] = None) -> Optional[int]:
+        """
+        保存包围盒当前的方块，返回建造编号；未开启、区域过大或读取失败时原样返回 build_id。
+        传入 build_id 时作为同一次建造的下一段保存。
+        """
+        if not self.enabled or bounds is None:
+            return build_id
+
+        x0, y0, z0, x1, y1, z1 = bounds
+        volume = (x1 - x0 + 1) * (y1 - y0 + 1) * (z1 - z0 + 1)
+        if volume > self.max_volume:
+            print(f"⚠️ 区域 {volume} 格超过快照上限 {self.max_volume}，本次建造无法撤销")
+            mc.postToChat(f"⚠️ 建造范围 {volume} 格超过快照上限，本次建造无法撤销")
+            return build_id
+
+        try:
+            ids = read_region(mc, *bounds)
+            data, exact = self._read_data(mc, ids, (x0, y0, z0))
+        except Exception as e:
+            print(f"⚠️ 读取快照失败: {e}")
+            return build_id
+
+        if not exact:
+            mc.postToChat("⚠️ 区域内带朝向或颜色的方块过多，撤销时部分方块的朝向和颜色无法还原")
+
+        with self._lock:
+            files = self._files(player)
+            if build_id is None:
+                build_id = self._build_id(files[-1]) + 1 if files else 0
+                part = 0
+            else:
+                part = sum(1 for f in files if self._build_id(f) == build_id)
+
+            folder = self._player_dir(player)
+            folder.mkdir(parents=True, exist_ok=True)
+            np.savez_compressed(
+                folder / f"{build_id}_{part}.npz",
+                origin=np.array((x0, y0, z0), dtype=np.int32),
+                ids=ids,
+                data=data,
+                exact=np.array(exact),
+            )
+            self._prune(player)
+
+        print(f"📸 已保存快照: {volume} 格")
+        return build_id
+
+    def _prune(self, player: str):
+        files = self._files(player)
+        builds = sorted({self._build_id(f) for f in files})
+        expired = set(builds[:-self.max_per_player])
+        for f in files:
+            if self._build_id(f) in expired:
+                f.unlink()
+
+    def undo(self, mc: Any, player: str, cancel: threading.Event = None) -> Optional[Tuple[int, bool]]:
+        """恢复该玩家最近一次建造前的方块，返回 (写入的命令数, 是否完整还原)；没有快照时返回 None"""
+        with self._lock:
+            files = self._files(player)
+            if not files:
+                return None
+            build_id = self._build_id(files[-1])
+            parts = [f for f in files if self._build_id(f) == build_id]
+
+        sent, exact = 0, True
+        for path in reversed(parts):
+            with np.load(path) as snapshot:
+                region = VoxelRegion(self.max_volume)
+                region.origin = tuple(int(v) for v in snapshot["origin"])
+                region.ids = snapshot["ids"].astype(np.int32)
+                region.data = snapshot["data"]
+                # 旧版本的快照没有 exact 字段
+                if "exact" in snapshot.files and not snapshot["exact"]:
+                    exact = False
+
+            # 只写回与快照不同的格子；ID 相同的带 data 方块会补读 data 比对，只改了朝向或颜色的格子也会恢复
+            try:
+                required = region.diff_mask(mc)
+            except Exception as e:
+                print(f"⚠️ 读取区域失败，改为全量恢复: {e}")
+                required = None
+            sent += block_writer.write(mc, region.to_cuboids(required), player, disjoint=True, cancel=cancel)
+            path.unlink()
+
+        return sent, exact
+
+
+snapshots = SnapshotStore()
+
+
+def undo_last_build(mc: Any, player: str, cancel: threading.Event = None):
+    """\\ai undo：恢复玩家最近一次建造前的样子"""
+    mc.postToChat("⏪ 正在撤销上一次建造...")
+    try:
+        result = snapshots.undo(mc, player, cancel)
+    except WriteCancelled as e:
+        mc.postToChat(f"🛑 撤销已取消，{e}")
+        return
+    if result is None:
+        mc.postToChat("ℹ️ 没有可以撤销的建造。")
+        return
+    sent, exact = result
+    mc.postToChat(f"✅ 已撤销上一次建造（{sent} 条写入命令）")
+    if not exact:
+        mc.postToChat("⚠️ 部分方块的朝向和颜色未能还原")
+    print(f"⏪ 撤销完成: {sent} 条命令")
@@ -0,0 +1,290 @@
+import ast
+import queue
+import re
+import threading
+import time
+from typing import Any, List
+from mcpi.minecraft import intFloor
+from .code_generator import (
+    ai, build_user_message, extract_python_code, lookup_cached_code, remember_code, select_prompt
+)
+from .code_safety import CodeSafetyChecker
+from .block_writer import WriteCancelled
+from .config_loader import CONFIG
+from .executor import execute_code_safely, send_ops
+from .metrics import metrics
+from .sandbox import SandboxError, create_interpreter
+from .schematic import schematics
+from .snapshot import snapshots
+
+# 以这些关键字开头的顶层行属于上一条复合语句
+CONTINUATION = re.compile(r"(else|elif)\b")
+
+
+def _parses(code: str) -> bool:
+    try:
+        ast.parse(code)
+        return True
+    except SyntaxError:
+        return False
+
+
+def _looks_like_code(line: str) -> bool:
+    """“好的”之类的说明文字也能解析成表达式；单独一个非调用表达式不算代码"""
+    stripped = line.strip()
+    # 复合语句的首行（for ... :）要补上语句体才能解析
+    for candidate in (stripped, stripped + "\n    pass"):
+        try:
+            tree = ast.parse(candidate)
+        except SyntaxError:
+            continue
+        if not tree.body:
+            return True
+        node = tree.body[0]
+        return not isinstance(node, ast.Expr) or isinstance(node.value, ast.Call)
+    return False
+
+
+class StatementSplitter:
+    """
+    流式文本 → 完整的顶层语句：
+    - 单行简单语句能独立解析时立即输出
+    - 复合语句（for / if）在下一条顶层语句开始时输出
+    - 出现 ``` 代码块时丢弃之前的说明文字，代码块结束后忽略其余内容
+    - 没有代码块时，第一行像代码的内容出现之前的说明文字都跳过
+    """
+
+    def __init__(self):
+        self._partial = ""
+        self._pending: List[str] = []
+        self._in_fence = False
+        self._closed = False
+        self._started = False
+
+    def feed(self, text: str) -> List[str]:
+        self._partial += text
+        *lines, self._partial = self._partial.split("\n")
+        statements = []
+        for line in lines:
+            statements.extend(self._push(line))
+        return statements
+
+    def finish(self) -> List[str]:
+        statements = []
+        if self._partial:
+            statements.extend(self._push(self._partial))
+            self._partial = ""
+        statements.extend(self._take_pending())
+        return statements
+
+    def _take_pending(self) -> List[str]:
+        code = "\n".join(self._pending).strip()
+        self._pending = []
+        return [code] if code else []
+
+    def _push(self, line: str) -> List[str]:
+        if self._closed:
+            return []
+
+        if line.lstrip().startswith("```"):
+            if self._in_fence:
+                self._closed = True
+                return self._take_pending()
+            self._in_fence = True
+            self._pending = []
+            return []
+
+        if not line.strip():
+            if self._pending:
+                self._pending.append(line)
+            return []
+
+        if not self._in_fence and not self._started:
+            if not _looks_like_code(line):
+                return []
+            self._started = True
+
+        statements = []
+        starts_new = not line[0].isspace() and not CONTINUATION.match(line)
+        if starts_new and self._pending:
+            code = "\n".join(self._pending).rstrip()
+            if _parses(code):
+                statements.append(code)
+                self._pending = []
+        self._pending.append(line)
+
+        # 单行简单语句不必等下一行
+        if len(self._pending) == 1 and not line.rstrip().endswith((":", "\\")) and _parses(line):
+            statements.extend(self._take_pending())
+        return statements
+
+
+class StreamingExecutor:
+    """
+    边生成边执行：语句进入队列，由独立线程逐条安全检查并执行。
+    所有语句共用同一个解释器，变量可以跨语句使用；每条语句执行完立即发送方块。
+    解释器（沙箱进程）在第一条语句到达时才创建，等待大模型首个语句期间不占用沙箱进程。
+    所有语句累计的方块数同样受 budget.max_blocks 限制。
+    任一语句被拒绝或出错、超出预算、或生成中途被 abort 后，后续语句不再执行。
+    """
+
+    def __init__(self, mc: Any, player_name: str, cancel: threading.Event = None):
+        self.mc = mc
+        self.player_name = player_name
+        self.cancel = cancel
+        self.executed = 0
+        # 已执行语句累计的方块数；每条语句单独检查预算，累计值在这里兜底
+        self.volume = 0
+        self.error = None
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="ai-stream-exec", daemon=True)
+        self._interpreter = None
+        self._pos = None
+        self._origin = None
+        self._build_id = None
+
+    def start(self) -> bool:
+        try:
+            pos = self.mc.player.getPos()
+        except Exception as e:
+            self.mc.postToChat("❌ 无法获取玩家位置，请稍后再试。")
+            print(f"获取位置失败: {e}")
+            return False
+
+        self._pos = pos
+        self._origin = tuple(intFloor(pos.x, pos.y, pos.z))
+        self._thread.start()
+        return True
+
+    def submit(self, statement: str):
+        self._queue.put(statement)
+
+    def abort(self, reason: str):
+        """生成中途失败：跳过尚未执行的语句；之后仍需调用 finish 回收线程和沙箱进程"""
+        if not self.error:
+            self.error = reason
+
+    def finish(self) -> bool:
+        """等待所有语句执行完毕，返回是否全部成功"""
+        self._queue.put(None)
+        self._thread.join()
+
+        if self.error:
+            return False
+        if self.executed:
+            self.mc.postToChat("执行成功！")
+            print("执行成功")
+        return self.executed > 0
+
+    def _run(self):
+        while True:
+            statement = self._queue.get()
+            if statement is None:
+                if self._interpreter is not None:
+                    self._interpreter.close()
+                return
+            if self.error:
+                continue
+
+            if self._interpreter is None:
+                try:
+                    self._interpreter = create_interpreter(self.mc, self._pos)
+                except SandboxError as e:
+                    self.error = str(e)
+                    self.mc.postToChat(f"❌ {e}，请稍后再试。")
+                    print(f"创建沙箱会话失败: {e}")
+                    continue
+
+            with metrics.span("safety_check"):
+                is_safe, reason = CodeSafetyChecker.is_safe(statement)
+            if not is_safe:
+                self.error = reason
+                self.mc.postToChat(f"🚫 安全拒绝: {reason}")
+                print(f"🚫 拒绝执行: {reason}\n{statement}")
+                continue
+
+            if self.executed == 0:
+                self.mc.postToChat("⚙️ 正在执行...")
+            print(f"⚙️ 执行语句:\n{statement}")
+
+            try:
+                with metrics.span("interpret"):
+                    self._interpreter.run(statement)
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                error = f"执行失败: {self.error}"
+                self.mc.postToChat(error)
+                print(error)
+            finally:
+                self._send(self._interpreter.take_ops())
+            self.executed += 1
+
+    def _send(self, ops):
+        self.volume += ops.volume()
+        max_blocks = CONFIG['budget']['max_blocks']
+        if self.volume > max_blocks:
+            reason = f"方块数超出预算: {self.volume} > {max_blocks}"
+            metrics.inc("safety_rejections")
+            self.mc.postToChat(f"🚫 安全拒绝: {reason}")
+            print(f"🚫 拒绝写入: {reason}")
+            self.error = self.error or reason
+            return
+
+        # 每段写入前都保存快照，撤销时整次建造一起恢复
+        first = self._build_id is None
+        self._build_id = snapshots.capture(self.mc, ops.bounds(), self.player_name, self._build_id)
+        try:
+            send_ops(ops, self.mc, self.player_name, self.cancel)
+        except WriteCancelled as e:
+            self.error = f"已取消，{e}"
+            self.mc.postToChat(f"🛑 建造已取消，{e}")
+            return
+        schematics.remember(self.player_name, ops, self._origin, append=not first)
+
+
+def stream_and_execute(instruction: str, mc: Any, player_name: str = "玩家", cancel: threading.Event = None) -> str:
+    """
+    流式生成并执行：
+    1. 命中缓存时直接按普通方式执行
+    2. 否则以流式方式请求大模型，每识别出一条完整语句就交给执行线程
+    3. 全部成功后把完整代码写入缓存，返回完整代码
+    """
+    template = select_prompt(instruction)
+
+    cached = lookup_cached_code(instruction, template)
+    if cached:
+        execute_code_safely(cached, mc, player_name, cancel)
+        return cached
+
+    runner = StreamingExecutor(mc, player_name, cancel)
+    if not runner.start():
+        return ""
+
+    splitter = StatementSplitter()
+    chunks = []
+    requested_at = time.perf_counter()
+    # 流在中途断开（读取超时、连接中断、熔断）时也要回收执行线程和沙箱进程
+    try:
+        for delta in ai.ask_stream(build_user_message(instruction), system=template):
+            if not chunks:
+                metrics.observe("llm_first_token", time.perf_counter() - requested_at)
+            chunks.append(delta)
+            for statement in splitter.feed(delta):
+                runner.submit(statement)
+        for statement in splitter.finish():
+            runner.submit(statement)
+    except Exception as e:
+        runner.abort(f"生成中断: {type(e).__name__}: {e}")
+        mc.postToChat("❌ 生成中断，请重试。")
+        raise
+    finally:
+        succeeded = runner.finish()
+    code = extract_python_code("".join(chunks))
+    if not code:
+        mc.postToChat("未能生成有效代码，请重试。")
+        return ""
+
+    if succeeded:
+        remember_code(instruction, template, code)
+    return code
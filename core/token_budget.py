@@ -0,0 +1,99 @@
+import re
+import threading
+from typing import Optional
+from .config_loader import CONFIG
+from .metrics import metrics
+
+# 中日韩字符大多单独成 token，其余文本按约 4 个字符一个 token 估算
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+# 每条消息的角色、分隔符等固定开销
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """不依赖分词器的粗略 token 估算，用于选择提示词和统计，不追求精确"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_messages(*contents: str) -> int:
+    return sum(estimate_tokens(c) + MESSAGE_OVERHEAD for c in contents if c)
+
+
+def is_simple_instruction(instruction: str) -> bool:
+    """
+    简单指令（放一个方块、显示坐标、小平台）用精简提示词：
+    指令较短，且不含需要完整建筑规则的关键词
+    """
+    if not CONFIG['prompt']['compact_enabled']:
+        return False
+    if len(instruction) > CONFIG['prompt']['compact_max_chars']:
+        return False
+    return not any(keyword in instruction for keyword in CONFIG['prompt']['complex_keywords'])
+
+
+class TokenLedger:
+    """
+    逐次记录大模型请求的 token 用量：
+    - 服务商返回 usage 时以其为准（含命中前缀缓存的 cached_tokens），否则使用本地估算
+    - 累计值计入 metrics 计数器 llm_tokens{kind=prompt|completion|cached}
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.estimated_prompt_tokens = 0
+        self._lock = threading.Lock()
+        # 每个线程最近一次请求的用量，批量生成时按指令归属 token
+        self._local = threading.local()
+
+    def record(self, estimated_prompt: int, usage: Optional[dict] = None, completion_text: str = "") -> dict:
+        """记录一次请求，返回本次的用量"""
+        usage = usage or {}
+        details = usage.get("prompt_tokens_details") or {}
+        entry = {
+            "estimated_prompt": estimated_prompt,
+            "prompt": usage.get("prompt_tokens") or estimated_prompt,
+            "completion": usage.get("completion_tokens") or estimate_tokens(completion_text),
+            # OpenAI / DashScope 放在 prompt_tokens_details，DeepSeek 用 prompt_cache_hit_tokens
+            "cached": details.get("cached_tokens") or usage.get("prompt_cache_hit_tokens") or 0,
+        }
+
+        with self._lock:
+            self.requests += 1
+            self.estimated_prompt_tokens += estimated_prompt
+            self.prompt_tokens += entry["prompt"]
+            self.completion_tokens += entry["completion"]
+            self.cached_tokens += entry["cached"]
+        self._local.last = entry
+
+        metrics.inc("llm_tokens", entry["prompt"], kind="prompt")
+        metrics.inc("llm_tokens", entry["completion"], kind="completion")
+        if entry["cached"]:
+            metrics.inc("llm_tokens", entry["cached"], kind="cached")
+        print(f"🧮 token 用量: 输入 {entry['prompt']}（缓存 {entry['cached']}）输出 {entry['completion']}")
+        return entry
+
+    def take_last(self) -> Optional[dict]:
+        """取出当前线程最近一次记录的用量（取出后清空）；期间没有请求时返回 None"""
+        entry = getattr(self._local, "last", None)
+        self._local.last = None
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_tokens": self.cached_tokens,
+                "estimated_prompt_tokens": self.estimated_prompt_tokens,
+            }
+
+
+token_ledger = TokenLedger()
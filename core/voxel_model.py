@@ -0,0 +1,232 @@
+from typing import Any, List, Optional, Tuple
+import numpy as np
+from .config_loader import CONFIG
+
+Cuboid = Tuple[int, int, int, int, int, int, int, int]
+
+# 单次 getBlocks 读取的最大方块数，过大的区域按 y 分层读取
+READ_CHUNK_BLOCKS = 65536
+# 流水线读取 data 时每批的请求数
+READ_DATA_BATCH = 4096
+
+
+def read_region(mc: Any, x0: int, y0: int, z0: int, x1: int, y1: int, z1: int) -> np.ndarray:
+    """
+    用 world.getBlocks 批量读取长方体区域的方块 ID。
+    返回形状为 (dy, dx, dz) 的 uint16 数组，与 RaspberryJuice 的 y→x→z 输出顺序一致。
+    """
+    x0, x1 = min(x0, x1), max(x0, x1)
+    y0, y1 = min(y0, y1), max(y0, y1)
+    z0, z1 = min(z0, z1), max(z0, z1)
+    dx, dz = x1 - x0 + 1, z1 - z0 + 1
+
+    layers_per_read = max(1, READ_CHUNK_BLOCKS // (dx * dz))
+    parts = []
+    for ly in range(y0, y1 + 1, layers_per_read):
+        hy = min(y1, ly + layers_per_read - 1)
+        s = mc.conn.sendReceive(b"world.getBlocks", x0, ly, z0, x1, hy, z1)
+        part = np.array(s.split(","), dtype=np.uint16)
+        parts.append(part.reshape(hy - ly + 1, dx, dz))
+
+    return np.concatenate(parts, axis=0)
+
+
+def read_block_data(mc: Any, points: np.ndarray) -> np.ndarray:
+    """
+    读取多个方块的 data 值，points 为 (n, 3) 的 x, y, z。
+    RaspberryJuice 没有批量读取 data 的命令，这里把 getBlockWithData 流水线发出，
+    每 READ_DATA_BATCH 个请求一次往返；普通 mcpi 连接只能逐个读取。
+    """
+    send_receive_many = getattr(mc.conn, "send_receive_many", None)
+    if send_receive_many is None:
+        return np.array([mc.getBlockWithData(*map(int, p)).data for p in points], dtype=np.uint8)
+
+    data = np.zeros(len(points), dtype=np.uint8)
+    for start in range(0, len(points), READ_DATA_BATCH):
+        part = points[start:start + READ_DATA_BATCH]
+        replies = send_receive_many(b"world.getBlockWithData", (tuple(map(int, p)) for p in part))
+        data[start:start + len(part)] = [int(reply.split(",")[1]) for reply in replies]
+    return data
+
+
+class VoxelRegion:
+    """
+    内存中的 NumPy 体素模型，用于在发送前“试运行”生成的代码：
+    - ids：方块 ID，-1 表示代码没有写过这个格子
+    - data：方块数据值
+    - 数组轴顺序为 (y, x, z)，区域随写入自动扩展
+    """
+
+    def __init__(self, max_volume: int):
+        self.max_volume = max_volume
+        self.origin = None
+        self.ids = np.full((0, 0, 0), -1, dtype=np.int32)
+        self.data = np.zeros((0, 0, 0), dtype=np.uint8)
+
+    @property
+    def bounds(self) -> Optional[Tuple[int, int, int, int, int, int]]:
+        """(x0, y0, z0, x1, y1, z1)，尚未写入时为 None"""
+        if self.origin is None:
+            return None
+        ox, oy, oz = self.origin
+        ny, nx, nz = self.ids.shape
+        return ox, oy, oz, ox + nx - 1, oy + ny - 1, oz + nz - 1
+
+    @property
+    def written(self) -> int:
+        return int(np.count_nonzero(self.ids >= 0))
+
+    def _ensure(self, x0, y0, z0, x1, y1, z1) -> bool:
+        """扩展区域以包含给定长方体；超过 max_volume 时返回 False"""
+        if self.origin is None:
+            if (x1 - x0 + 1) * (y1 - y0 + 1) * (z1 - z0 + 1) > self.max_volume:
+                return False
+            self.origin = (x0, y0, z0)
+            shape = (y1 - y0 + 1, x1 - x0 + 1, z1 - z0 + 1)
+            self.ids = np.full(shape, -1, dtype=np.int32)
+            self.data = np.zeros(shape, dtype=np.uint8)
+            return True
+
+        bx0, by0, bz0, bx1, by1, bz1 = self.bounds
+        if bx0 <= x0 and by0 <= y0 and bz0 <= z0 and x1 <= bx1 and y1 <= by1 and z1 <= bz1:
+            return True
+
+        # 按当前尺寸的一半预留余量，避免逐格扩展时反复拷贝
+        ny, nx, nz = self.ids.shape
+        nx0 = min(bx0, x0 - nx // 2) if x0 < bx0 else bx0
+        ny0 = min(by0, y0 - ny // 2) if y0 < by0 else by0
+        nz0 = min(bz0, z0 - nz // 2) if z0 < bz0 else bz0
+        nx1 = max(bx1, x1 + nx // 2) if x1 > bx1 else bx1
+        ny1 = max(by1, y1 + ny // 2) if y1 > by1 else by1
+        nz1 = max(bz1, z1 + nz // 2) if z1 > bz1 else bz1
+
+        if (nx1 - nx0 + 1) * (ny1 - ny0 + 1) * (nz1 - nz0 + 1) > self.max_volume:
+            # 余量放不下时退回到恰好包含的大小
+            nx0, ny0, nz0 = min(bx0, x0), min(by0, y0), min(bz0, z0)
+            nx1, ny1, nz1 = max(bx1, x1), max(by1, y1), max(bz1, z1)
+            if (nx1 - nx0 + 1) * (ny1 - ny0 + 1) * (nz1 - nz0 + 1) > self.max_volume:
+                return False
+
+        shape = (ny1 - ny0 + 1, nx1 - nx0 + 1, nz1 - nz0 + 1)
+        ids = np.full(shape, -1, dtype=np.int32)
+        data = np.zeros(shape, dtype=np.uint8)
+        sy, sx, sz = by0 - ny0, bx0 - nx0, bz0 - nz0
+        ids[sy:sy + ny, sx:sx + nx, sz:sz + nz] = self.ids
+        data[sy:sy + ny, sx:sx + nx, sz:sz + nz] = self.data
+
+        self.origin = (nx0, ny0, nz0)
+        self.ids, self.data = ids, data
+        return True
+
+    def fill(self, x0: int, y0: int, z0: int, x1: int, y1: int, z1: int,
+             block_id: int, data: int = 0) -> bool:
+        """写入一个长方体（后写覆盖先写）；区域超限时返回 False 且不做修改"""
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        z0, z1 = min(z0, z1), max(z0, z1)
+        if not self._ensure(x0, y0, z0, x1, y1, z1):
+            return False
+
+        ox, oy, oz = self.origin
+        sl = (slice(y0 - oy, y1 - oy + 1), slice(x0 - ox, x1 - ox + 1), slice(z0 - oz, z1 - oz + 1))
+        self.ids[sl] = block_id
+        self.data[sl] = data
+        return True
+
+    def fill_mask(self, x0: int, y0: int, z0: int, mask: np.ndarray,
+                  block_id: int, data: int = 0) -> bool:
+        """把形状为 (dy, dx, dz) 的布尔掩码放在 (x0, y0, z0) 处，为真的格子写入方块；区域超限时返回 False"""
+        ny, nx, nz = mask.shape
+        if not self._ensure(x0, y0, z0, x0 + nx - 1, y0 + ny - 1, z0 + nz - 1):
+            return False
+
+        ox, oy, oz = self.origin
+        sl = (slice(y0 - oy, y0 - oy + ny), slice(x0 - ox, x0 - ox + nx), slice(z0 - oz, z0 - oz + nz))
+        self.ids[sl][mask] = block_id
+        self.data[sl][mask] = data
+        return True
+
+    def get(self, x: int, y: int, z: int) -> Optional[Tuple[int, int]]:
+        """返回代码写过的 (id, data)，没写过则返回 None"""
+        if self.origin is None:
+            return None
+        ox, oy, oz = self.origin
+        iy, ix, iz = y - oy, x - ox, z - oz
+        ny, nx, nz = self.ids.shape
+        if not (0 <= iy < ny and 0 <= ix < nx and 0 <= iz < nz):
+            return None
+        block_id = int(self.ids[iy, ix, iz])
+        if block_id < 0:
+            return None
+        return block_id, int(self.data[iy, ix, iz])
+
+    def clear(self):
+        self.origin = None
+        self.ids = np.full((0, 0, 0), -1, dtype=np.int32)
+        self.data = np.zeros((0, 0, 0), dtype=np.uint8)
+
+    def diff_mask(self, mc: Any) -> np.ndarray:
+        """
+        批量读取世界中的同一区域，返回真正需要写入的格子：
+        - 代码写过，且世界中的方块 ID 不同
+        - ID 相同且属于 builder.data_block_ids（羊毛、木头等）时，用流水线补读世界的 data，不同才写入；
+          这类格子超过 builder.max_data_reads 个时不再补读，一律写入
+        - 其他方块 getBlocks 读不到 data 值，目标 data 非 0 时视为需要写入
+        """
+        world = read_region(mc, *self.bounds)
+        touched = self.ids >= 0
+        required = touched & ((self.ids != world) | (self.data != 0))
+
+        same = touched & (self.ids == world) & np.isin(self.ids, CONFIG['builder']['data_block_ids'])
+        cells = np.argwhere(same)
+        if len(cells) > CONFIG['builder']['max_data_reads']:
+            return required | same
+        if len(cells):
+            # cells 的列顺序是 (y, x, z)
+            index = tuple(cells.T)
+            world_data = read_block_data(mc, cells[:, [1, 0, 2]] + self.origin)
+            required[index] = self.data[index] != world_data
+        return required
+
+    def to_cuboids(self, required: np.ndarray = None) -> List[Cuboid]:
+        """
+        贪心 3D 合并：把需要写入的格子合并成尽量少的长方体。
+        - 只从 required 中尚未覆盖的格子起步，也只扩展到目标方块相同且尚未覆盖的格子，
+          长方体互不重叠，总体积等于需要写入的格子数
+        - 返回 (x0, y0, z0, x1, y1, z1, id, data)，空气排在最前，其余自下而上
+        """
+        if self.origin is None:
+            return []
+        if required is None:
+            required = self.ids >= 0
+
+        key = np.where(self.ids >= 0, (self.ids << 8) | self.data, -1)
+        todo = required.copy()
+        ny, nx, nz = key.shape
+        ox, oy, oz = self.origin
+        cuboids = []
+
+        for y, x, z in np.argwhere(todo):
+            if not todo[y, x, z]:
+                continue
+            value = key[y, x, z]
+
+            run = (key[y, x, z:] == value) & todo[y, x, z:]
+            z1 = z + (nz - z if run.all() else int(run.argmin())) - 1
+
+            run = ((key[y, x:, z:z1 + 1] == value) & todo[y, x:, z:z1 + 1]).all(axis=1)
+            x1 = x + (nx - x if run.all() else int(run.argmin())) - 1
+
+            block = (slice(y, None), slice(x, x1 + 1), slice(z, z1 + 1))
+            run = ((key[block] == value) & todo[block]).all(axis=(1, 2))
+            y1 = y + (ny - y if run.all() else int(run.argmin())) - 1
+
+            todo[y:y1 + 1, x:x1 + 1, z:z1 + 1] = False
+            cuboids.append((
+                int(ox + x), int(oy + y), int(oz + z),
+                int(ox + x1), int(oy + y1), int(oz + z1),
+                int(value >> 8), int(value & 0xFF),
+            ))
+
+        cuboids.sort(key=lambda c: (c[6] != 0, c[1]))
+        return cuboids
@@ -0,0 +1,161 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+from .block_writer import block_writer
+from .config_loader import CONFIG
+from .code_generator import generate_minecraft_code, plan_mode
+from .executor import execute_code_safely, execute_plan_safely
+from .metrics import metrics
+from .scheduler import BUILD, QUICK, FairScheduler, Job, classify
+from .stream_executor import stream_and_execute
+
+
+class CommandDispatcher:
+    """
+    把指令处理从聊天轮询中拆出来：
+    - 指令先进入 FairScheduler 按玩家排队，有空闲名额时按公平顺序取出开始处理
+    - 生成线程池：调用大模型生成代码（耗时最长）
+    - 执行线程池：安全检查并执行代码；只读小指令用单独的线程执行，不排在大建造后面
+    - 开启 ai.stream 时，生成线程边接收边把完整语句交给执行线程
+    """
+
+    def __init__(self):
+        self.scheduler = FairScheduler()
+        self._generate_pool = ThreadPoolExecutor(
+            max_workers=CONFIG['system']['generation_workers'],
+            thread_name_prefix="ai-generate"
+        )
+        self._execute_pool = ThreadPoolExecutor(
+            max_workers=CONFIG['system']['execution_workers'],
+            thread_name_prefix="ai-execute"
+        )
+        self._quick_pool = ThreadPoolExecutor(
+            max_workers=max(1, CONFIG['scheduler']['quick_reserved']),
+            thread_name_prefix="ai-quick"
+        )
+        self._closed = False
+
+    def busy(self) -> bool:
+        """是否还有指令在处理或排队（聊天轮询据此保持最短间隔）"""
+        return self.scheduler.running() > 0 or self.scheduler.queued() > 0
+
+    def submit(self, mc: Any, player: str, command: str) -> Optional[Job]:
+        """提交一条指令，返回任务；该玩家排队的指令已达上限时返回 None"""
+        return self._enqueue(Job(player, command, mc, classify(command)))
+
+    def submit_task(self, mc: Any, player: str, label: str, fn: Callable[..., Any]) -> Optional[Job]:
+        """提交不需要大模型的任务（如撤销），按建造排队；fn 以 (mc, player, cancel=任务的取消事件) 调用"""
+        return self._enqueue(Job(player, label, mc, BUILD, task=fn))
+
+    def cancel(self, player: str, job_id: int = None) -> List[Job]:
+        """
+        取消玩家的任务。运行中的任务的写入带着任务自己的取消事件，会在下一批之前停止；
+        不指定 job_id 时再停止该玩家所有正在进行的写入。
+        """
+        jobs = self.scheduler.cancel(player, job_id)
+        if job_id is None and any(job.started is not None for job in jobs):
+            block_writer.cancel(player)
+        return jobs
+
+    def _enqueue(self, job: Job) -> Optional[Job]:
+        if self.scheduler.enqueue(job) is None:
+            return None
+        self._pump()
+        return job
+
+    def _pump(self):
+        """把能开始的任务都交给线程池"""
+        while not self._closed:
+            job = self.scheduler.next_job()
+            if job is None:
+                return
+            metrics.observe("queue_wait", job.started - job.created)
+            self._start(job)
+
+    def _start(self, job: Job):
+        if job.task is not None:
+            job.stage = "执行中"
+            self._execute_pool.submit(self._run_task, job)
+            return
+
+        self._post(job, f"🧠 正在处理: {job.command}（任务 #{job.id}）")
+        if CONFIG['ai']['stream'] and not plan_mode():
+            # 建造计划要完整解析后才能光栅化，不走流式执行
+            job.stage = "生成并执行中"
+            self._generate_pool.submit(self._stream, job)
+        else:
+            job.stage = "生成中"
+            future = self._generate_pool.submit(self._generate, job.command)
+            future.add_done_callback(lambda f: self._on_generated(f, job))
+
+    def _run_task(self, job: Job):
+        try:
+            job.task(job.mc, job.player, cancel=job.cancel)
+        except Exception as e:
+            print(f"⚠️ 任务异常: {e}")
+        finally:
+            self._release(job)
+
+    def _stream(self, job: Job):
+        try:
+            with metrics.span("stream_and_execute"):
+                stream_and_execute(job.command, job.mc, job.player, job.cancel)
+        except Exception as e:
+            print(f"⚠️ 流式执行异常: {e}")
+        finally:
+            self._release(job)
+
+    @staticmethod
+    def _generate(command: str) -> str:
+        with metrics.span("generate"):
+            return generate_minecraft_code(command)
+
+    def _on_generated(self, future: Future, job: Job):
+        try:
+            code = future.result()
+        except Exception as e:
+            print(f"⚠️ 生成代码异常: {e}")
+            code = ""
+
+        if job.cancelled:
+            self._release(job)
+            self._post(job, f"🛑 任务 #{job.id} 已取消")
+            return
+
+        if not code:
+            self._release(job)
+            self._post(job, "未能生成有效代码，请重试。")
+            return
+
+        job.stage = "执行中"
+        pool = self._quick_pool if job.priority == QUICK else self._execute_pool
+        pool.submit(self._execute, code, job)
+
+    def _execute(self, code: str, job: Job):
+        try:
+            with metrics.span("execute"):
+                if plan_mode():
+                    execute_plan_safely(code, job.mc, job.player, job.cancel)
+                else:
+                    execute_code_safely(code, job.mc, job.player, job.cancel)
+        except Exception as e:
+            print(f"⚠️ 执行线程异常: {e}")
+        finally:
+            self._release(job)
+
+    def _release(self, job: Job):
+        self.scheduler.finish(job)
+        self._pump()
+
+    @staticmethod
+    def _post(job: Job, message: str):
+        try:
+            job.mc.postToChat(message)
+        except Exception as e:
+            print(f"⚠️ 发送聊天失败: {e}")
+
+    def shutdown(self, wait: bool = False):
+        """停止调度，排队中的任务直接丢弃"""
+        self._closed = True
+        self._generate_pool.shutdown(wait=wait)
+        self._execute_pool.shutdown(wait=wait)
+        self._quick_pool.shutdown(wait=wait)
@@ -28,21 +28,7 @@ HELP_MESSAGE = (
 )
 __author__ = "Link-Qian"
 __version__ = "1.0.0"
-def _patched_receive(self):
-    buf = b""
-    try:
-        while True:
-            char = self.socket.recv(1)
-            if char == b"\n" or not char:
-                break
-            buf += char
-        return buf.decode("utf-8").rstrip("\n")
-    except Exception as e:
-        print(f"[MCPI Patch] Receive error: {e}")
-        raise
-
-from mcpi import connection
-connection.Connection.receive = _patched_receive
+from core.rj_connection import BufferedConnection
 class CodeSafetyChecker:
     # 允许的 AST 节点类型（基本控制流和表达式）
     ALLOWED_NODES = {
@@ -262,10 +248,10 @@ def create_minecraft_connection():
         try:
             print(f"正在连接 Minecraft 服务器 {CONFIG['minecraft']['host']}:{CONFIG['minecraft']['port']}... (尝试 {attempt + 1})")
             from mcpi.minecraft import Minecraft
-            mc = Minecraft.create(
-                address=CONFIG['minecraft']['host'],
-                port=CONFIG['minecraft']['port']
-            )
+            mc = Minecraft(BufferedConnection(
+                CONFIG['minecraft']['host'],
+                CONFIG['minecraft']['port']
+            ))
             print("🟢 成功连接到 Minecraft 服务器！")
             print(f"作者: {__author__}")
             print(f"版本: {__version__}")
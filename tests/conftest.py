@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+import pytest
+
+# 让 tests 下的用例可以直接 import core
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def world():
+    """本地 RaspberryJuice 替身和连到它的 mc，返回 (server, mc)"""
+    from mcpi.minecraft import Minecraft
+    from bench.fake_rj_server import FakeRaspberryJuice
+    from core.rj_connection import BufferedConnection
+
+    server = FakeRaspberryJuice().start()
+    mc = Minecraft(BufferedConnection(*server.address))
+    mc.postToChat = lambda message: None
+    yield server, mc
+    mc.conn.close()
+    server.stop()
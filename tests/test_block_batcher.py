@@ -0,0 +1,20 @@
+import threading
+import pytest
+from core.block_batcher import BlockRecorder
+from core.block_writer import WriteCancelled
+
+
+def test_passthrough_writes_honour_job_cancel(world):
+    server, mc = world
+    cancel = threading.Event()
+    recorder = BlockRecorder(mc, max_blocks=8, player_name="tester", cancel=cancel)
+    recorder.setBlocks(0, 70, 0, 1, 70, 1, 1)
+    # 超出缓冲上限，改为直接发送
+    recorder.setBlocks(5, 70, 5, 0, 80, 0, 1)
+
+    cancel.set()
+    with pytest.raises(WriteCancelled):
+        recorder.setBlock(0, 90, 0, 1)
+    mc.getHeight(0, 0)
+    assert mc.getBlock(0, 90, 0) == 0
+    assert mc.getBlock(5, 80, 5) == 1
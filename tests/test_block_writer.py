@@ -0,0 +1,49 @@
+import threading
+import pytest
+from core.block_writer import ThrottledWriter, WriteCancelled
+
+
+class RecordingMC:
+    """只记录写入命令的假连接"""
+
+    def __init__(self):
+        self.calls = []
+
+    def setBlock(self, *args):
+        self.calls.append(("setBlock", args))
+
+    def setBlocks(self, *args):
+        self.calls.append(("setBlocks", args))
+
+    def postToChat(self, message):
+        pass
+
+
+def test_overlapping_writes_keep_program_order():
+    # 先放石头实心立方体，再挖空内部：必须按原顺序发送，否则结果是实心的
+    stone = (0, 0, 0, 4, 4, 4, 1, 0)
+    hollow = (1, 1, 1, 3, 3, 3, 0, 0)
+    mc = RecordingMC()
+    ThrottledWriter().write(mc, [stone, hollow], "tester")
+    assert [call[1][6] for call in mc.calls] == [1, 0]
+
+
+def test_disjoint_writes_send_air_first_within_chunk():
+    block = (0, 0, 0, 0, 0, 0, 1, 0)
+    air = (1, 0, 0, 1, 0, 0, 0, 0)
+    mc = RecordingMC()
+    ThrottledWriter().write(mc, [block, air], "tester", disjoint=True)
+    assert [call[1][3] for call in mc.calls] == [0, 1]
+
+
+def test_cancel_token_stops_only_its_own_write():
+    writer = ThrottledWriter()
+    cancelled, other = threading.Event(), threading.Event()
+    cancelled.set()
+    cube = [(0, 0, 0, 1, 1, 1, 1, 0)]
+    with pytest.raises(WriteCancelled):
+        writer.write(RecordingMC(), cube, "tester", cancel=cancelled)
+
+    mc = RecordingMC()
+    assert writer.write(mc, cube, "tester", cancel=other) == 1
+    assert len(mc.calls) == 1
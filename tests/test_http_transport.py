@@ -0,0 +1,25 @@
+import time
+import pytest
+import requests
+from core.http_transport import HttpTransport
+
+
+def _half_open(transport: HttpTransport):
+    transport.breaker.opened_at = time.monotonic() - transport.breaker.reset_timeout - 1
+
+
+def test_probe_failing_with_other_request_error_releases_breaker(monkeypatch):
+    transport = HttpTransport("test")
+    _half_open(transport)
+
+    def post(*args, **kwargs):
+        raise requests.exceptions.InvalidURL("bad url")
+    monkeypatch.setattr(transport.session, "post", post)
+
+    with pytest.raises(requests.exceptions.InvalidURL):
+        transport.post("http://example.invalid", {}, {})
+
+    # 探测失败后熔断器重新打开；再次超时后必须能放行下一个探测
+    assert transport.breaker.state == "open"
+    _half_open(transport)
+    assert transport.breaker.allow()
@@ -0,0 +1,33 @@
+import pytest
+from core.config_loader import CONFIG
+from core.geometry import normalize_shape, rasterize
+from core.interpreter import Interpreter
+from core.primitives import PRIMITIVES, bind_args
+
+
+class Pos:
+    x = y = z = 0.5
+
+
+def _voxels(name: str, args: tuple) -> int:
+    shape = normalize_shape(PRIMITIVES[name].to_shape(bind_args(name, args, {})))
+    return rasterize([shape], (0, 0, 0), max_volume=10 ** 7).written
+
+
+@pytest.mark.parametrize("name, args", [
+    ("fill_sphere", (0, 100, 0, 20, 1)),
+    ("hollow_sphere", (0, 100, 0, 15, 1)),
+    ("dome", (0, 100, 0, 15, 1)),
+    ("fill_cylinder", (0, 100, 0, 12, 20, 1)),
+    ("hollow_cylinder", (0, 100, 0, 8, 30, 1)),
+])
+def test_primitive_volume_matches_voxel_count(name, args):
+    interpreter = Interpreter(None, Pos())
+    interpreter.run(f"{name}{args}")
+    assert interpreter.ops.volume() == _voxels(name, args)
+
+
+def test_large_sphere_fits_block_budget():
+    interpreter = Interpreter(None, Pos())
+    interpreter.run("fill_sphere(0, 100, 0, 20, 1)")
+    assert interpreter.ops.volume() <= CONFIG['budget']['max_blocks']
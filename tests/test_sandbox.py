@@ -0,0 +1,17 @@
+from core.config_loader import CONFIG
+from core.sandbox import create_interpreter, shutdown_sandbox_pool
+
+
+def test_later_statements_see_earlier_writes_in_sandbox(world, monkeypatch):
+    server, mc = world
+    monkeypatch.setitem(CONFIG['sandbox'], 'workers', 1)
+    try:
+        session = create_interpreter(mc, mc.player.getPos())
+        session.run("mc.setBlock(0, 100, 0, 57)")
+        session.take_ops()
+        # 这一段写入没有发送到世界，只能从解释器保留的操作里读到
+        session.run("mc.setBlock(1, 100, 0, mc.getBlock(0, 100, 0))")
+        assert session.take_ops().rows()[0, 6] == 57
+        session.close()
+    finally:
+        shutdown_sandbox_pool()
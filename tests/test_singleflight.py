@@ -0,0 +1,48 @@
+import threading
+import pytest
+from core.singleflight import SingleFlight
+
+
+class UpstreamError(Exception):
+    pass
+
+
+def test_stream_followers_receive_leader_error():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def upstream():
+        yield "x = 1\n"
+        release.wait(5)
+        raise UpstreamError("connection reset")
+
+    leader, shared = flight.stream("key", upstream)
+    assert not shared
+    follower, shared = flight.stream("key", upstream)
+    assert shared
+
+    received, errors = [], []
+
+    def follow():
+        try:
+            received.extend(follower)
+        except UpstreamError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=follow)
+    thread.start()
+    with pytest.raises(UpstreamError):
+        for _ in leader:
+            release.set()
+    thread.join(5)
+
+    assert received == ["x = 1\n"]
+    assert len(errors) == 1
+
+
+def test_stream_followers_see_complete_result():
+    flight = SingleFlight()
+    leader, _ = flight.stream("key", lambda: iter(["a", "b"]))
+    follower, _ = flight.stream("key", lambda: iter([]))
+    assert list(leader) == ["a", "b"]
+    assert list(follower) == ["a", "b"]
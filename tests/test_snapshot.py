@@ -0,0 +1,15 @@
+from core.snapshot import SnapshotStore
+
+
+def test_undo_reverts_data_only_change(world, tmp_path):
+    server, mc = world
+    store = SnapshotStore()
+    store.root = tmp_path
+    mc.setBlocks(0, 70, 0, 2, 70, 2, 35, 0)
+
+    store.capture(mc, (0, 70, 0, 2, 70, 2), "tester")
+    mc.setBlocks(0, 70, 0, 2, 70, 2, 35, 1)
+
+    sent, exact = store.undo(mc, "tester")
+    assert sent == 1 and exact
+    assert [mc.getBlockWithData(x, 70, z).data for x in range(3) for z in range(3)] == [0] * 9
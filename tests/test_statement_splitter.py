@@ -0,0 +1,19 @@
+from core.stream_executor import StatementSplitter
+
+
+def _split(text: str):
+    splitter = StatementSplitter()
+    statements = []
+    for i in range(0, len(text), 7):
+        statements.extend(splitter.feed(text[i:i + 7]))
+    return statements + splitter.finish()
+
+
+def test_prose_before_fence_is_not_executed():
+    text = "好的\n下面是代码：\n```python\nx = 1\nmc.setBlock(x, 0, 0, 1)\n```\n完成"
+    assert _split(text) == ["x = 1", "mc.setBlock(x, 0, 0, 1)"]
+
+
+def test_unfenced_code_after_prose():
+    text = "好的\nfor i in range(3):\n    mc.setBlock(i, 0, 0, 1)\nmc.postToChat('ok')\n"
+    assert _split(text) == ["for i in range(3):\n    mc.setBlock(i, 0, 0, 1)", "mc.postToChat('ok')"]
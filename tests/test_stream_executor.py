@@ -0,0 +1,23 @@
+from core.config_loader import CONFIG
+from core.snapshot import snapshots
+from core.stream_executor import StreamingExecutor
+
+
+def test_streamed_statements_share_one_block_budget(world, monkeypatch):
+    server, mc = world
+    monkeypatch.setitem(CONFIG['sandbox'], 'enabled', False)
+    monkeypatch.setitem(CONFIG['budget'], 'max_blocks', 1000)
+    monkeypatch.setattr(snapshots, 'enabled', False)
+    start = server.blocks_written
+
+    runner = StreamingExecutor(mc, "tester")
+    assert runner.start()
+    # 每条 600 格，单独都在预算内，累计超出
+    for y in (80, 90, 100):
+        runner.submit(f"mc.setBlocks(0, {y}, 0, 9, {y + 5}, 9, 1)")
+
+    assert not runner.finish()
+    assert "预算" in runner.error
+    # 一次往返，确保服务器已处理完之前的写命令
+    mc.getHeight(0, 0)
+    assert server.blocks_written - start == 600
@@ -0,0 +1,46 @@
+import numpy as np
+from core.block_writer import cuboid_volume
+from core.voxel_model import VoxelRegion
+
+
+def _ball(radius: int) -> VoxelRegion:
+    d = 2 * radius + 1
+    y, x, z = np.mgrid[:d, :d, :d] - radius
+    region = VoxelRegion(10 ** 7)
+    region.fill_mask(0, 0, 0, x * x + y * y + z * z <= radius * radius, 1)
+    return region
+
+
+def _covered(region: VoxelRegion, cuboids) -> np.ndarray:
+    counts = np.zeros(region.ids.shape, dtype=np.int32)
+    ox, oy, oz = region.origin
+    for x0, y0, z0, x1, y1, z1, _, _ in cuboids:
+        counts[y0 - oy:y1 - oy + 1, x0 - ox:x1 - ox + 1, z0 - oz:z1 - oz + 1] += 1
+    return counts
+
+
+def test_sphere_cuboids_do_not_overlap():
+    region = _ball(20)
+    todo = region.ids >= 0
+    cuboids = region.to_cuboids()
+    assert sum(cuboid_volume(c) for c in cuboids) == todo.sum()
+    assert np.array_equal(_covered(region, cuboids), todo.astype(np.int32))
+
+
+def test_cuboids_cover_only_required_cells():
+    region = _ball(8)
+    rng = np.random.default_rng(0)
+    required = (region.ids >= 0) & (rng.random(region.ids.shape) < 0.5)
+    cuboids = region.to_cuboids(required)
+    assert sum(cuboid_volume(c) for c in cuboids) == required.sum()
+    assert np.array_equal(_covered(region, cuboids), required.astype(np.int32))
+
+
+def test_diff_rewrites_block_whose_data_differs(world):
+    server, mc = world
+    mc.setBlock(3, 70, 3, 35, 1)
+    mc.setBlock(4, 70, 3, 35, 0)
+    region = VoxelRegion(1000)
+    region.fill(3, 70, 3, 4, 70, 3, 35, 0)
+    # 轴顺序 (y, x, z)：x=3 的橙色羊毛要改回白色，x=4 已经是白色
+    assert region.diff_mask(mc).tolist() == [[[True], [False]]]